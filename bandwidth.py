@@ -0,0 +1,234 @@
+"""
+Process-wide bandwidth shaping for downloads (ingress) and uploads (egress)
+"""
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from config import (
+    BANDWIDTH_INGRESS_MBPS,
+    BANDWIDTH_EGRESS_MBPS,
+    BANDWIDTH_BOOST_AT,
+    BANDWIDTH_BOOST_WEIGHT,
+)
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+INGRESS = 'ingress'
+EGRESS = 'egress'
+
+
+def mbps_to_bytes(mbps: float) -> float:
+    return mbps * 125000
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    Callers reserve tokens up front and may drive the bucket into debt; the
+    returned delay is how long they must wait before the bytes are "paid for".
+    This keeps the long-run rate exact without a background refill task.
+    """
+
+    def __init__(self, rate: float, burst_seconds: float = 0.5):
+        self.rate = float(rate)
+        self.burst_seconds = burst_seconds
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def burst(self) -> float:
+        return self.rate * self.burst_seconds
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate: float) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+
+    def reserve(self, amount: float) -> float:
+        """Take amount tokens and return the seconds to wait before using them"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= amount
+            if self._tokens >= 0 or self.rate <= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class BandwidthShare:
+    """One job's weighted slice of a direction's capacity"""
+
+    def __init__(self, pool: "DirectionPool", share_id: int, weight: float, label: str):
+        self.pool = pool
+        self.share_id = share_id
+        self.weight = weight
+        self.label = label
+        self.progress = 0.0
+        self.bucket = TokenBucket(pool.capacity)
+        self.bytes_total = 0
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    @property
+    def effective_weight(self) -> float:
+        if self.progress >= self.pool.boost_at:
+            return self.weight * self.pool.boost_weight
+        return self.weight
+
+    def _reserve(self, nbytes: int) -> float:
+        self.bytes_total += nbytes
+        return max(self.bucket.reserve(nbytes), self.pool.bucket.reserve(nbytes))
+
+    def throttle(self, nbytes: int) -> None:
+        """Block the calling (worker) thread until nbytes fit in this share"""
+        wait = self._reserve(nbytes)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def throttle_async(self, nbytes: int) -> None:
+        wait = self._reserve(nbytes)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def update_progress(self, fraction: float) -> None:
+        boosted = self.progress >= self.pool.boost_at
+        self.progress = fraction
+        if not boosted and fraction >= self.pool.boost_at:
+            # Nearly finished: take a bigger slice so the job releases its worker sooner
+            self.pool.rebalance()
+
+    def progress_hook(self, d: Dict[str, Any]) -> None:
+        """yt-dlp progress hook; sleeps in the download thread to pace it"""
+        if d.get('status') != 'downloading':
+            return
+        filename = d.get('filename') or ''
+        done = d.get('downloaded_bytes') or 0
+        with self._lock:
+            delta = done - self._seen.get(filename, 0)
+            self._seen[filename] = done
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        if total:
+            self.update_progress(done / total)
+        if delta > 0:
+            self.throttle(delta)
+
+    async def pyrogram_progress(self, current: int, total: int) -> None:
+        """Pyrogram upload progress callback; awaiting it delays the next chunk"""
+        with self._lock:
+            delta = current - self._seen.get('', 0)
+            self._seen[''] = current
+        if total:
+            self.update_progress(current / total)
+        if delta > 0:
+            await self.throttle_async(delta)
+
+
+class DirectionPool:
+    """Capacity of one direction split between active shares by weight"""
+
+    def __init__(self, name: str, capacity: float, boost_at: float, boost_weight: float):
+        self.name = name
+        self.capacity = capacity
+        self.boost_at = boost_at
+        self.boost_weight = boost_weight
+        # Shared bucket: caps the sum of all shares and absorbs unpaced traffic
+        self.bucket = TokenBucket(capacity)
+        self.shares: Dict[int, BandwidthShare] = {}
+        self._lock = threading.Lock()
+
+    def rebalance(self) -> None:
+        with self._lock:
+            shares = list(self.shares.values())
+        total_weight = sum(share.effective_weight for share in shares)
+        for share in shares:
+            share.bucket.set_rate(self.capacity * share.effective_weight / total_weight)
+        metrics.set_gauge('bandwidth_active_shares', len(shares), direction=self.name)
+
+    def add(self, share: BandwidthShare) -> None:
+        with self._lock:
+            self.shares[share.share_id] = share
+        self.rebalance()
+
+    def remove(self, share: BandwidthShare) -> None:
+        with self._lock:
+            self.shares.pop(share.share_id, None)
+        self.rebalance()
+        metrics.inc('bandwidth_bytes_total', share.bytes_total, direction=self.name)
+
+
+class BandwidthManager:
+    """Token buckets for ingress and egress with weighted per-job shares.
+
+    A direction with capacity 0 is unlimited and hands out no shares.
+    """
+
+    def __init__(self, ingress_bps: float = 0.0, egress_bps: float = 0.0,
+                 boost_at: float = 0.8, boost_weight: float = 2.0):
+        self.pools: Dict[str, DirectionPool] = {}
+        if ingress_bps > 0:
+            self.pools[INGRESS] = DirectionPool(INGRESS, ingress_bps, boost_at, boost_weight)
+        if egress_bps > 0:
+            self.pools[EGRESS] = DirectionPool(EGRESS, egress_bps, boost_at, boost_weight)
+        self._ids = itertools.count(1)
+
+    def limit(self, direction: str) -> Optional[float]:
+        pool = self.pools.get(direction)
+        return pool.capacity if pool else None
+
+    def open_share(self, direction: str, weight: float = 1.0, label: str = '') -> Optional[BandwidthShare]:
+        pool = self.pools.get(direction)
+        if pool is None:
+            return None
+        share = BandwidthShare(pool, next(self._ids), weight, label)
+        pool.add(share)
+        logger.debug(f"Opened {direction} share {share.share_id} ({label}) at {share.rate:.0f} B/s")
+        return share
+
+    def close_share(self, share: Optional[BandwidthShare]) -> None:
+        if share is not None:
+            share.pool.remove(share)
+
+    @contextmanager
+    def share(self, direction: str, weight: float = 1.0, label: str = '') -> Iterator[Optional[BandwidthShare]]:
+        share = self.open_share(direction, weight, label)
+        try:
+            yield share
+        finally:
+            self.close_share(share)
+
+    async def admit(self, direction: str, nbytes: int) -> None:
+        """Account for a transfer that cannot be paced chunk by chunk (e.g. a Bot
+        API upload). Waits until earlier traffic is paid for, then books nbytes
+        as debt so paced shares slow down while it is being sent."""
+        pool = self.pools.get(direction)
+        if pool is None:
+            return
+        wait = pool.bucket.reserve(0)
+        if wait > 0:
+            metrics.observe('bandwidth_admit_wait_seconds', wait, direction=direction)
+            await asyncio.sleep(wait)
+        pool.bucket.reserve(nbytes)
+        metrics.inc('bandwidth_bytes_total', nbytes, direction=direction)
+
+bandwidth = BandwidthManager(
+    ingress_bps=mbps_to_bytes(BANDWIDTH_INGRESS_MBPS),
+    egress_bps=mbps_to_bytes(BANDWIDTH_EGRESS_MBPS),
+    boost_at=BANDWIDTH_BOOST_AT,
+    boost_weight=BANDWIDTH_BOOST_WEIGHT,
+)
@@ -0,0 +1,140 @@
+"""
+One combined status message for a batch of jobs started from a single user message,
+and in-order delivery for the batch's concurrently downloaded files
+"""
+
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Per-line states shown before the job's own text
+PENDING = '⏳'
+RUNNING = '🔄'
+DONE = '✅'
+FAILED = '❌'
+SKIPPED = '⚠️'
+
+
+class StatusLine:
+    """Stands in for a job's own status message.
+
+    Jobs call ``edit_text``/``delete`` on it exactly as on a Telegram message;
+    the text ends up as one line of the batch message, and edits are coalesced
+    so N concurrent jobs don't multiply the Bot API edit rate by N.
+    """
+
+    def __init__(self, board: 'BatchStatus', label: str):
+        self.board = board
+        self.label = label
+        self.state = PENDING
+        self.text = ''
+
+    @property
+    def chat(self):
+        return self.board.message.chat
+
+    async def edit_text(self, text: str, *args, **kwargs) -> None:
+        summary = next((line for line in text.splitlines() if line.strip()), '')
+        self.text = summary.replace('*', '').replace('`', '').strip()[:80]
+        if text.startswith('❌'):
+            self.state = FAILED
+        elif not text.startswith('⏳'):
+            self.state = RUNNING
+        await self.board.refresh()
+
+    async def delete(self, *args, **kwargs) -> None:
+        # The job delivered its file and dropped its status message
+        self.state = DONE
+        self.text = ''
+        await self.board.refresh()
+
+    def finish(self, delivered: bool) -> None:
+        if self.state not in (DONE, SKIPPED):
+            self.state = DONE if delivered else FAILED
+
+    def skip(self, reason: str) -> None:
+        self.state = SKIPPED
+        self.text = reason
+
+    def render(self, index: int) -> str:
+        line = f"{self.state} {index}. {self.label}"
+        return f"{line}\n      {self.text}" if self.text else line
+
+
+class BatchStatus:
+    """Edits one Telegram message with a line per job, at most every ``min_interval`` seconds"""
+
+    def __init__(self, message, title: str, min_interval: float = 2.0):
+        self.message = message
+        self.title = title
+        self.min_interval = min_interval
+        self.lines: List[StatusLine] = []
+        self._last_edit = 0.0
+        self._rendered: Optional[str] = None
+        self._pending: Optional[asyncio.Task] = None
+
+    def add(self, label: str) -> StatusLine:
+        line = StatusLine(self, label)
+        self.lines.append(line)
+        return line
+
+    def render(self) -> str:
+        done = sum(1 for line in self.lines if line.state == DONE)
+        body = '\n'.join(line.render(i) for i, line in enumerate(self.lines, 1))
+        return f"{self.title} ({done}/{len(self.lines)})\n\n{body}"
+
+    async def refresh(self) -> None:
+        """Schedule an edit; edits arriving within min_interval are folded into one"""
+        if self._pending is not None and not self._pending.done():
+            return
+        delay = self._last_edit + self.min_interval - time.monotonic()
+        if delay <= 0:
+            await self.flush()
+        else:
+            self._pending = asyncio.ensure_future(self._delayed_flush(delay))
+
+    async def _delayed_flush(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await self.flush()
+
+    async def flush(self) -> None:
+        text = self.render()
+        self._last_edit = time.monotonic()
+        if text == self._rendered:
+            return
+        self._rendered = text
+        try:
+            await self.message.edit_text(text)
+        except Exception as e:
+            logger.debug(f"Could not update batch status: {e}")
+
+    async def close(self) -> None:
+        if self._pending is not None and not self._pending.done():
+            self._pending.cancel()
+        await self.flush()
+
+
+class DeliveryOrder:
+    """Lets a batch's jobs download concurrently but upload in batch order.
+
+    A job calls ``wait_turn`` once its file is ready and ``finish`` when it
+    has been delivered or has failed. Jobs must be started in batch order
+    (the scheduler admits equal-cost jobs first come, first served), so every
+    job a waiting one depends on already holds a slot.
+    """
+
+    def __init__(self, count: int):
+        self._finished = [asyncio.Event() for _ in range(count)]
+
+    def is_turn(self, position: int) -> bool:
+        return all(event.is_set() for event in self._finished[:position])
+
+    async def wait_turn(self, position: int) -> None:
+        for event in self._finished[:position]:
+            await event.wait()
+
+    def finish(self, position: int) -> None:
+        self._finished[position].set()
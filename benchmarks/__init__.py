@@ -0,0 +1,5 @@
+"""
+Offline benchmark and load tools for the Telegram Video Downloader Bot
+
+Run from the repository root, e.g. ``python -m benchmarks.run_benchmarks``.
+"""
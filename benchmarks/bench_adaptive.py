@@ -0,0 +1,121 @@
+"""
+Benchmark fixed vs adaptive yt-dlp fragment concurrency
+
+The fake media server emulates a CDN that throttles each connection and a
+shared downlink. Fixed mode uses YTDLP_CONCURRENT_FRAGMENTS for every job;
+adaptive mode uses TransferTuner after one warm-up job has produced
+throughput history.
+
+Usage:
+    python -m benchmarks.bench_adaptive --concurrency 1 8 --per-connection-rate 1000000 --link-rate 40000000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.fake_media_server import FakeMediaServer
+from benchmarks.run_benchmarks import summarize, fresh_dir
+
+logger = logging.getLogger(__name__)
+
+
+async def _run_batch(downloader, url: str, concurrency: int, work_root: str, label: str) -> Dict[str, Any]:
+    async def _job(index: int):
+        out_dir = fresh_dir(work_root, f"{label}_{concurrency}_{index}")
+        started = time.perf_counter()
+        path = await downloader.download_video_format(url, out_dir, 'best')
+        return time.perf_counter() - started if path else None
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(_job(i) for i in range(concurrency)))
+    wall = time.perf_counter() - started
+    latencies: List[float] = [r for r in results if r is not None]
+    summary = summarize(latencies)
+    summary['wall_s'] = round(wall, 3)
+    summary['failures'] = concurrency - len(latencies)
+    return summary
+
+
+async def run(args) -> Dict[str, Any]:
+    from downloader import VideoDownloader
+    from transfer_tuner import TransferTuner
+    from config import YTDLP_MIN_FRAGMENTS, YTDLP_MAX_FRAGMENTS, YTDLP_TOTAL_FRAGMENTS
+
+    work_root = tempfile.mkdtemp(prefix="bench_adaptive_")
+    results: Dict[str, Any] = {'parameters': vars(args).copy(), 'runs': []}
+
+    with FakeMediaServer(duration=args.duration, bytes_per_second=args.per_connection_rate,
+                         total_bytes_per_second=args.link_rate) as media:
+        url = media.url(args.source)
+
+        fixed = VideoDownloader()
+        fixed.tuner = None
+        fixed.media_cache = None
+
+        adaptive = VideoDownloader()
+        adaptive.media_cache = None
+        adaptive.tuner = TransferTuner(
+            min_fragments=YTDLP_MIN_FRAGMENTS,
+            max_fragments=YTDLP_MAX_FRAGMENTS,
+            total_fragments=YTDLP_TOTAL_FRAGMENTS,
+            link_capacity_bps=args.link_rate or 0,
+        )
+        # Warm-up job so the tuner has per-platform throughput history
+        await _run_batch(adaptive, url, 1, work_root, "warmup")
+
+        for concurrency in args.concurrency:
+            fixed_result = await _run_batch(fixed, url, concurrency, work_root, "fixed")
+            adaptive_result = await _run_batch(adaptive, url, concurrency, work_root, "adaptive")
+            speedup = None
+            if fixed_result.get('mean_s') and adaptive_result.get('mean_s'):
+                speedup = round(fixed_result['mean_s'] / adaptive_result['mean_s'], 3)
+            results['runs'].append({
+                'concurrency': concurrency,
+                'fixed': fixed_result,
+                'adaptive': adaptive_result,
+                'mean_latency_speedup': speedup,
+            })
+
+        results['history'] = {
+            platform: {'connection_bps': round(h.connection_bps or 0), 'job_bps': round(h.job_bps or 0),
+                       'samples': h.samples}
+            for platform, h in adaptive.tuner.history.items()
+        }
+
+    shutil.rmtree(work_root, ignore_errors=True)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--source', choices=['hls', 'dash', 'mp4'], default='hls')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--duration', type=int, default=30, help="length of the synthetic video in seconds")
+    parser.add_argument('--per-connection-rate', type=int, default=1_000_000,
+                        help="bytes/s allowed per HTTP connection")
+    parser.add_argument('--link-rate', type=int, default=40_000_000,
+                        help="bytes/s shared by all connections (0 = unlimited)")
+    parser.add_argument('--output', help="write JSON results to this file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
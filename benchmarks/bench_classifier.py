@@ -0,0 +1,133 @@
+"""
+Benchmark per-message URL classification: legacy substring chain vs the compiled classifier
+
+The legacy chain reproduces the checks a message used to go through
+(handle_message keywords, is_valid_url, is_playlist_url indicators, the
+Snapchat check, the supported-domain list and detect_platform), each one
+lowercasing and scanning the URL again. Unique URLs are used so the
+classifier's LRU cache does not hide the parsing cost; a second pass over
+repeated URLs shows the cached rate.
+
+Usage:
+    python -m benchmarks.bench_classifier --messages 200000
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List
+from urllib.parse import urlparse
+
+from url_classifier import classify_url, looks_like_url
+
+_TEMPLATES = [
+    'https://www.youtube.com/watch?v={vid}&t={n}s',
+    'https://youtu.be/{vid}?si=abc{n}',
+    'https://www.youtube.com/shorts/{vid}',
+    'https://www.youtube.com/playlist?list=PL{vid}{n}',
+    'https://www.youtube.com/watch?v={vid}&list=PL{n}',
+    'https://www.youtube.com/@channel{n}',
+    'https://www.tiktok.com/@user{n}/video/{num}',
+    'https://www.instagram.com/reel/{vid}{n}/',
+    'https://www.facebook.com/watch/?v={num}',
+    'https://x.com/user{n}/status/{num}',
+    'https://www.snapchat.com/spotlight/{vid}{n}',
+    'https://example.com/video/{n}',
+    'just some text number {n}',
+]
+
+
+def make_messages(count: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    alphabet = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-'
+    messages = []
+    for n in range(count):
+        vid = ''.join(rng.choice(alphabet) for _ in range(11))
+        messages.append(rng.choice(_TEMPLATES).format(vid=vid, n=n, num=rng.randrange(10 ** 18, 10 ** 19)))
+    return messages
+
+
+def legacy_classify(text: str):
+    if not any(keyword in text.lower() for keyword in ['http', 'www', '.com', '.ly']):
+        return None
+    try:
+        result = urlparse(text)
+        if not all([result.scheme, result.netloc]):
+            return None
+    except ValueError:
+        return None
+    indicators = ['playlist?list=', 'watch?v=.*&list=', '/channel/', '/c/', '/@', '/user/',
+                  'youtube.com/playlist', 'youtube.com/channel']
+    if any(indicator in text.lower() for indicator in indicators):
+        return 'playlist'
+    if 'snapchat.com' in text.lower() or 'spotlight' in text.lower():
+        return 'snapchat'
+    if not any(domain in text.lower() for domain in ['youtube.com', 'youtu.be', 'twitter.com', 'x.com',
+                                                      'instagram.com', 'facebook.com', 'fb.watch',
+                                                      'tiktok.com']):
+        return 'unsupported'
+    url_lower = text.lower()
+    for platform, domains in (('youtube', ('youtube.com', 'youtu.be')), ('tiktok', ('tiktok.com',)),
+                              ('instagram', ('instagram.com',)), ('facebook', ('facebook.com', 'fb.watch')),
+                              ('twitter', ('twitter.com', 'x.com')), ('snapchat', ('snapchat.com',))):
+        if any(domain in url_lower for domain in domains):
+            return platform
+    return 'unknown'
+
+
+def compiled_classify(text: str):
+    if not looks_like_url(text):
+        return None
+    return classify_url(text)
+
+
+def _rate(func: Callable[[str], Any], messages: List[str]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    for message in messages:
+        func(message)
+    elapsed = time.perf_counter() - started
+    return {'seconds': round(elapsed, 4), 'messages_per_second': round(len(messages) / elapsed)}
+
+
+def run(args) -> Dict[str, Any]:
+    unique = make_messages(args.messages, args.seed)
+    repeated = make_messages(args.distinct, args.seed) * (args.messages // args.distinct or 1)
+
+    classify_url.cache_clear()
+    results: Dict[str, Any] = {
+        'parameters': vars(args).copy(),
+        'unique': {'legacy': _rate(legacy_classify, unique), 'compiled': _rate(compiled_classify, unique)},
+    }
+    classify_url.cache_clear()
+    results['repeated'] = {'legacy': _rate(legacy_classify, repeated),
+                           'compiled': _rate(compiled_classify, repeated)}
+    for section in ('unique', 'repeated'):
+        legacy = results[section]['legacy']['messages_per_second']
+        compiled = results[section]['compiled']['messages_per_second']
+        results[section]['speedup'] = round(compiled / legacy, 3) if legacy else None
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200_000)
+    parser.add_argument('--distinct', type=int, default=1_000,
+                        help="distinct URLs in the repeated-URL pass")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write JSON results to this file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    payload = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
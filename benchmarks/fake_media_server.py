@@ -0,0 +1,217 @@
+"""
+Local HTTP server serving synthetic MP4/HLS/DASH media for yt-dlp's generic extractor
+"""
+
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)')
+
+
+def _run_ffmpeg(args) -> None:
+    subprocess.run(
+        ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y'] + args,
+        check=True,
+    )
+
+
+def generate_media(root: str, duration: int = 20, size: str = "1280x720") -> Dict[str, str]:
+    """Generate a progressive MP4, an HLS playlist and a DASH manifest under root.
+
+    Returns the paths relative to root for each variant.
+    """
+    if not shutil.which('ffmpeg'):
+        raise RuntimeError("ffmpeg is required to generate benchmark media")
+
+    os.makedirs(root, exist_ok=True)
+    mp4_path = os.path.join(root, 'video.mp4')
+    if not os.path.exists(mp4_path):
+        _run_ffmpeg([
+            '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=30',
+            '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100',
+            '-t', str(duration),
+            '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac', '-b:a', '128k',
+            '-movflags', '+faststart',
+            mp4_path,
+        ])
+
+    hls_dir = os.path.join(root, 'hls')
+    if not os.path.exists(os.path.join(hls_dir, 'index.m3u8')):
+        os.makedirs(hls_dir, exist_ok=True)
+        _run_ffmpeg([
+            '-i', mp4_path, '-c', 'copy',
+            '-f', 'hls', '-hls_time', '2', '-hls_playlist_type', 'vod',
+            '-hls_segment_filename', os.path.join(hls_dir, 'seg_%03d.ts'),
+            os.path.join(hls_dir, 'index.m3u8'),
+        ])
+
+    dash_dir = os.path.join(root, 'dash')
+    if not os.path.exists(os.path.join(dash_dir, 'manifest.mpd')):
+        os.makedirs(dash_dir, exist_ok=True)
+        _run_ffmpeg([
+            '-i', mp4_path, '-map', '0:v', '-map', '0:a', '-c', 'copy',
+            '-f', 'dash', '-seg_duration', '2', '-use_template', '1', '-use_timeline', '1',
+            os.path.join(dash_dir, 'manifest.mpd'),
+        ])
+
+    return {
+        'mp4': 'video.mp4',
+        'hls': 'hls/index.m3u8',
+        'dash': 'dash/manifest.mpd',
+    }
+
+
+class SharedPacer:
+    """Pace all connections together to emulate a fixed-capacity link"""
+
+    def __init__(self, bytes_per_second: int):
+        self.bytes_per_second = bytes_per_second
+        self._lock = threading.Lock()
+        self._next_free = time.monotonic()
+
+    def consume(self, size: int) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_free)
+            self._next_free = start + size / self.bytes_per_second
+            wait = self._next_free - now
+        if wait > 0:
+            time.sleep(wait)
+
+
+class MediaRequestHandler(SimpleHTTPRequestHandler):
+    """Static file handler with HTTP Range support, optional per-connection
+    throttling and an optional shared link limit"""
+
+    bytes_per_second: Optional[int] = None
+    pacer: Optional[SharedPacer] = None
+    latency: float = 0.0
+
+    extensions_map = {
+        **SimpleHTTPRequestHandler.extensions_map,
+        '.m3u8': 'application/vnd.apple.mpegurl',
+        '.mpd': 'application/dash+xml',
+        '.ts': 'video/mp2t',
+        '.m4s': 'video/iso.segment',
+    }
+
+    def log_message(self, format, *args):
+        logger.debug("fake media server: " + format, *args)
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) or not os.path.exists(path):
+            return super().send_head()
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = _RANGE_RE.match(self.headers.get('Range', ''))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            end = min(end, size - 1)
+            if start > end:
+                self.send_error(416, "Requested Range Not Satisfiable")
+                return None
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+
+        f = open(path, 'rb')
+        f.seek(start)
+        self._remaining = end - start + 1
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Length', str(self._remaining))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        remaining = getattr(self, '_remaining', None)
+        chunk_size = 64 * 1024
+        started = time.monotonic()
+        sent = 0
+        while remaining is None or remaining > 0:
+            chunk = source.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            sent += len(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+            if self.pacer:
+                self.pacer.consume(len(chunk))
+            if self.bytes_per_second:
+                expected = sent / self.bytes_per_second
+                elapsed = time.monotonic() - started
+                if expected > elapsed:
+                    time.sleep(expected - elapsed)
+
+
+class FakeMediaServer:
+    """Serve generated media from a background thread"""
+
+    def __init__(self, root: Optional[str] = None, duration: int = 20,
+                 bytes_per_second: Optional[int] = None, latency: float = 0.0,
+                 total_bytes_per_second: Optional[int] = None):
+        self.root = root or tempfile.mkdtemp(prefix="bench_media_")
+        self.duration = duration
+        self.bytes_per_second = bytes_per_second
+        self.total_bytes_per_second = total_bytes_per_second
+        self.latency = latency
+        self.paths: Dict[str, str] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, kind: str) -> str:
+        return f"{self.base_url}/{self.paths[kind]}"
+
+    def start(self) -> "FakeMediaServer":
+        self.paths = generate_media(self.root, duration=self.duration)
+        handler = type('ThrottledMediaRequestHandler', (MediaRequestHandler,), {
+            'bytes_per_second': self.bytes_per_second,
+            'pacer': SharedPacer(self.total_bytes_per_second) if self.total_bytes_per_second else None,
+            'latency': self.latency,
+        })
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), partial(handler, directory=self.root))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Fake media server listening on {self.base_url} serving {self.root}")
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
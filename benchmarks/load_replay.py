@@ -0,0 +1,445 @@
+"""
+Load generator replaying synthetic Telegram update streams against TelegramVideoBot
+
+Builds ``Update`` objects for simulated user sessions (video URLs, playlist
+browsing, stats clicks), feeds them through a real ``Application`` whose Bot API
+calls go to the local stub, with downloader, metadata probe and uploader
+backends mocked. Reports p50/p95/p99 handler latency, queueing delay and
+event-loop lag as JSON.
+
+Usage:
+    python -m benchmarks.load_replay --rate 5 --duration 60 --zipf 1.1 --skip-animations
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from benchmarks.run_benchmarks import percentile
+from config import CONCURRENT_UPDATES
+from benchmarks.stub_bot_api import StubBotApiServer
+
+logger = logging.getLogger(__name__)
+
+# Click labels that start a download job
+DOWNLOAD_CLICKS = ('download_video', 'download_audio', 'playlist_download_selected')
+
+
+def latency_summary(values: List[float]) -> Dict[str, Any]:
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) * 1000, 2),
+        'p95_ms': round(percentile(values, 95) * 1000, 2),
+        'p99_ms': round(percentile(values, 99) * 1000, 2),
+        'max_ms': round(max(values) * 1000, 2),
+    }
+
+
+class ZipfCatalog:
+    """Synthetic URL catalog whose popularity follows a Zipf distribution"""
+
+    def __init__(self, size: int, exponent: float, rng: random.Random):
+        self.rng = rng
+        self.video_urls = [f"https://www.youtube.com/watch?v=bench{i:06d}" for i in range(size)]
+        self.playlist_urls = [f"https://www.youtube.com/playlist?list=PLbench{i:04d}" for i in range(max(1, size // 20))]
+        self._video_weights = [1 / (rank ** exponent) for rank in range(1, len(self.video_urls) + 1)]
+        self._playlist_weights = [1 / (rank ** exponent) for rank in range(1, len(self.playlist_urls) + 1)]
+
+    def video(self) -> str:
+        return self.rng.choices(self.video_urls, weights=self._video_weights)[0]
+
+    def playlist(self) -> str:
+        return self.rng.choices(self.playlist_urls, weights=self._playlist_weights)[0]
+
+
+def build_mock_backends(base_downloader_cls, file_size: int, extract_delay: float,
+                        download_mbps: float, upload_mbps: float):
+    """Create downloader/uploader stand-ins that keep the real code paths but skip the network"""
+
+    def _sleep_in_executor(seconds: float):
+        # The real downloader blocks executor threads, so mocks do too
+        return asyncio.get_event_loop().run_in_executor(None, time.sleep, seconds)
+
+    def _write_file(path: str, size: int) -> str:
+        with open(path, 'wb') as f:
+            f.truncate(size)
+        return path
+
+    _counter = itertools.count()
+
+    class MockDownloader(base_downloader_cls):
+        async def get_video_info(self, url: str) -> Optional[Dict[str, Any]]:
+            await _sleep_in_executor(extract_delay)
+            return {'title': f"Bench {url[-6:]}", 'duration': 120, 'width': 1280, 'height': 720, 'ext': 'mp4'}
+
+        async def get_available_formats(self, url: str) -> Optional[Dict[str, Any]]:
+            await _sleep_in_executor(extract_delay)
+            return {
+                'title': f"Bench {url[-6:]}",
+                'duration': 120,
+                'uploader': 'bench',
+                'audio_formats': [],
+                'video_formats': [
+                    {'format_id': str(22 + i), 'quality': f"{height}p", 'ext': 'mp4',
+                     'filesize': file_size // (i + 1), 'fps': 30, 'vcodec': 'avc1', 'acodec': 'mp4a'}
+                    for i, height in enumerate((1080, 720, 480, 360))
+                ],
+            }
+
+        async def get_playlist_info(self, url: str) -> Optional[Dict[str, Any]]:
+            await _sleep_in_executor(extract_delay)
+            entries = [
+                {'id': f"pl{i:04d}", 'title': f"Entry {i + 1}", 'duration': 60 + i,
+                 'url': f"https://www.youtube.com/watch?v=pl{i:04d}", 'thumbnail': None, 'index': i + 1}
+                for i in range(25)
+            ]
+            return {'type': 'playlist', 'title': 'Bench playlist', 'entries': entries,
+                    'total_count': len(entries), 'uploader': 'bench', 'description': ''}
+
+        async def download_video_format(self, url: str, output_dir: str, format_id: str, *args, **kwargs) -> Optional[str]:
+            await _sleep_in_executor(extract_delay + file_size / (download_mbps * 125000))
+            os.makedirs(output_dir, exist_ok=True)
+            return _write_file(os.path.join(output_dir, f"video_{next(_counter)}.mp4"), file_size)
+
+        async def download_audio(self, url: str, output_dir: str, quality: str = "best", *args, **kwargs) -> Optional[str]:
+            await _sleep_in_executor(extract_delay + (file_size // 10) / (download_mbps * 125000))
+            os.makedirs(output_dir, exist_ok=True)
+            return _write_file(os.path.join(output_dir, f"audio_{next(_counter)}.mp3"), file_size // 10)
+
+        async def download_video(self, url: str, output_dir: str, *args, **kwargs) -> Optional[str]:
+            return await self.download_video_format(url, output_dir, 'best')
+
+    class MockUploader:
+        async def start(self) -> None:
+            pass
+
+        async def stop(self) -> None:
+            pass
+
+        async def send_video(self, chat_id: int, file_path: str, *args, **kwargs) -> None:
+            await asyncio.sleep(os.path.getsize(file_path) / (upload_mbps * 125000))
+
+        async def send_document(self, chat_id: int, file_path: str, *args, **kwargs) -> None:
+            await asyncio.sleep(os.path.getsize(file_path) / (upload_mbps * 125000))
+
+    return MockDownloader, MockUploader
+
+
+def build_mock_probe(base_probe_cls, probe_delay: float):
+    """MetadataProbe whose oEmbed fetch returns canned data instead of calling the platform"""
+
+    class MockProbe(base_probe_cls):
+        def _fetch(self, endpoint: str, url: str) -> Dict[str, Any]:
+            # Runs in an executor thread like the real HTTP request
+            time.sleep(probe_delay)
+            return {'title': f"Bench {url[-6:]}", 'author_name': 'bench', 'thumbnail_url': None}
+
+    return MockProbe
+
+
+class UpdateFactory:
+    """Build Telegram ``Update`` objects for synthetic users"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1_000_000)
+
+    def _user(self, user_id: int) -> Dict[str, Any]:
+        return {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}"}
+
+    def _chat(self, user_id: int) -> Dict[str, Any]:
+        return {'id': user_id, 'type': 'private'}
+
+    def message(self, user_id: int, text: str):
+        from telegram import Update
+        data = {
+            'update_id': next(self._update_ids),
+            'message': {
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': self._chat(user_id),
+                'from': self._user(user_id),
+                'text': text,
+            },
+        }
+        return Update.de_json(data, self.bot)
+
+    def callback(self, user_id: int, callback_data: str):
+        from telegram import Update
+        data = {
+            'update_id': next(self._update_ids),
+            'callback_query': {
+                'id': str(next(self._update_ids)),
+                'from': self._user(user_id),
+                'chat_instance': str(user_id),
+                'data': callback_data,
+                'message': {
+                    'message_id': next(self._message_ids),
+                    'date': int(time.time()),
+                    'chat': self._chat(user_id),
+                    'from': {'id': 1, 'is_bot': True, 'first_name': 'Stub'},
+                    'text': 'menu',
+                },
+            },
+        }
+        return Update.de_json(data, self.bot)
+
+
+class LoopLagSampler:
+    """Measure how late a periodic sleep wakes up"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+
+
+class LoadRecorder:
+    def __init__(self):
+        self.enqueued: Dict[int, float] = {}
+        self.started: Dict[int, float] = {}
+        self.handler_latency: Dict[str, List[float]] = defaultdict(list)
+        self.queue_delay: List[float] = []
+        self.clicks: Dict[str, int] = defaultdict(int)
+        self.errors = 0
+
+    def wrap(self, handler, label_for):
+        async def _timed(update, context):
+            started = time.perf_counter()
+            enqueued = self.enqueued.pop(update.update_id, None)
+            if enqueued is not None:
+                self.queue_delay.append(started - enqueued)
+            try:
+                return await handler(update, context)
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self.handler_latency[label_for(update)].append(time.perf_counter() - started)
+        return _timed
+
+
+def _action_label(resolved) -> str:
+    """Label for a resolved (action, payload) pair, splitting downloads by format type"""
+    if resolved is None:
+        return 'expired'
+    action, payload = resolved
+    if action == 'download':
+        return f"download_{payload.get('format_type', 'unknown')}"
+    if action == 'playlist':
+        return f"playlist_{payload.get('mode', 'unknown')}"
+    return action or 'unknown'
+
+
+def callback_labeler(video_bot):
+    """Label callbacks by the action their token resolves to (callback_data itself is opaque)"""
+    def _label(update) -> str:
+        data = update.callback_query.data if update.callback_query else ''
+        return f"callback:{_action_label(video_bot.callbacks.resolve(data or ''))}"
+    return _label
+
+
+async def run(args) -> Dict[str, Any]:
+    from telegram.ext import Application
+    from telegram.request import HTTPXRequest
+    import bot as bot_module
+    from downloader import VideoDownloader
+    from journal import JobJournal
+    from metadata_probe import MetadataProbe
+
+    rng = random.Random(args.seed)
+    catalog = ZipfCatalog(args.catalog_size, args.zipf, rng)
+    recorder = LoadRecorder()
+    lag = LoopLagSampler()
+
+    MockDownloader, MockUploader = build_mock_backends(
+        VideoDownloader, args.file_size, args.extract_delay, args.download_mbps, args.upload_mbps,
+    )
+
+    with StubBotApiServer() as stub:
+        video_bot = bot_module.TelegramVideoBot()
+        video_bot.downloader = MockDownloader()
+        if video_bot.metadata_probe:
+            video_bot.metadata_probe = build_mock_probe(MetadataProbe, args.probe_delay)()
+        video_bot.uploader = MockUploader() if args.pyrogram else None
+        video_bot.temp_dir = tempfile.mkdtemp(prefix="load_replay_")
+        video_bot.journal = JobJournal(os.path.join(tempfile.mkdtemp(prefix="load_replay_journal_"), "jobs.sqlite3"))
+        if args.skip_animations:
+            @contextlib.asynccontextmanager
+            async def _no_progress(*_args, **_kwargs):
+                yield None
+            video_bot.show_download_progress = _no_progress
+
+        video_bot.handle_message = recorder.wrap(video_bot.handle_message, lambda update: 'message')
+        video_bot.button_callback = recorder.wrap(video_bot.button_callback, callback_labeler(video_bot))
+
+        request = HTTPXRequest(connection_pool_size=256, read_timeout=60, write_timeout=60)
+        builder = (
+            Application.builder()
+            .token("123456:STUB")
+            .base_url(stub.base_url)
+            .request(request)
+            .updater(None)
+        )
+        if args.concurrent_updates > 1:
+            builder = builder.concurrent_updates(args.concurrent_updates)
+        application = builder.build()
+        video_bot.register_handlers(application)
+        factory = UpdateFactory(application.bot)
+
+        async def _send(update) -> None:
+            recorder.enqueued[update.update_id] = time.perf_counter()
+            await application.update_queue.put(update)
+
+        async def _think() -> None:
+            await asyncio.sleep(rng.uniform(args.think_min, args.think_max))
+
+        async def _click(user_id: int, labels) -> bool:
+            # Wait for the bot to render a keyboard offering a button whose action matches
+            deadline = time.perf_counter() + args.drain_timeout
+            while time.perf_counter() < deadline:
+                options = []
+                for data in stub.state.last_keyboard(user_id):
+                    label = _action_label(video_bot.callbacks.resolve(data))
+                    if label in labels:
+                        options.append((label, data))
+                if options:
+                    label, data = rng.choice(options)
+                    recorder.clicks[label] += 1
+                    await _send(factory.callback(user_id, data))
+                    return True
+                await asyncio.sleep(0.2)
+            return False
+
+        async def _session(user_id: int, kind: str) -> None:
+            if kind == 'video':
+                await _send(factory.message(user_id, catalog.video()))
+                await _think()
+                await _click(user_id, ('download_video', 'download_audio'))
+            elif kind == 'playlist':
+                await _send(factory.message(user_id, catalog.playlist()))
+                await _think()
+                if await _click(user_id, ('playlist_select',)):
+                    await _think()
+                    if await _click(user_id, ('playlist_video',)):
+                        await _think()
+                        await _click(user_id, ('playlist_download_selected',))
+            else:
+                await _send(factory.callback(user_id, rng.choice(['stats', 'my_stats'])))
+
+        mix = {'video': args.mix_video, 'playlist': args.mix_playlist, 'stats': args.mix_stats}
+        kinds, weights = zip(*mix.items())
+
+        await application.initialize()
+        await application.start()
+        lag.start()
+
+        sessions = []
+        session_kinds: Dict[str, int] = defaultdict(int)
+        started = time.perf_counter()
+        user_ids = itertools.count(10_000)
+        while time.perf_counter() - started < args.duration:
+            await asyncio.sleep(rng.expovariate(args.rate))
+            kind = rng.choices(kinds, weights)[0]
+            session_kinds[kind] += 1
+            sessions.append(asyncio.create_task(_session(next(user_ids), kind)))
+        await asyncio.gather(*sessions, return_exceptions=True)
+
+        # Let queued updates drain before stopping
+        while application.update_queue.qsize() or recorder.enqueued:
+            if time.perf_counter() - started > args.duration + args.drain_timeout:
+                break
+            await asyncio.sleep(0.1)
+        elapsed = time.perf_counter() - started
+
+        lag.stop()
+        await application.stop()
+        await application.shutdown()
+
+        downloads = sum(recorder.clicks[label] for label in DOWNLOAD_CLICKS)
+        if not downloads and (session_kinds['video'] or session_kinds['playlist']):
+            raise RuntimeError(f"No download buttons were clicked (clicks: {dict(recorder.clicks)}); "
+                               "the download paths were not measured")
+
+        return {
+            'parameters': vars(args).copy(),
+            'sessions': len(sessions),
+            'elapsed_s': round(elapsed, 2),
+            'handler_latency': {label: latency_summary(values)
+                                for label, values in sorted(recorder.handler_latency.items())},
+            'all_handlers': latency_summary([v for values in recorder.handler_latency.values() for v in values]),
+            'queue_delay': latency_summary(recorder.queue_delay),
+            'event_loop_lag': latency_summary(lag.samples),
+            'clicks': dict(sorted(recorder.clicks.items())),
+            'handler_errors': recorder.errors,
+            'unprocessed_updates': len(recorder.enqueued),
+            'stub_bot_api': stub.state.snapshot(),
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rate', type=float, default=2.0, help="new user sessions per second (Poisson arrivals)")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds to generate traffic for")
+    parser.add_argument('--drain-timeout', type=float, default=120.0, help="max seconds to wait for queued updates")
+    parser.add_argument('--zipf', type=float, default=1.1, help="Zipf exponent of URL popularity")
+    parser.add_argument('--catalog-size', type=int, default=1000, help="number of distinct video URLs")
+    parser.add_argument('--mix-video', type=float, default=0.7, help="share of single-video sessions")
+    parser.add_argument('--mix-playlist', type=float, default=0.15, help="share of playlist sessions")
+    parser.add_argument('--mix-stats', type=float, default=0.15, help="share of stats clicks")
+    parser.add_argument('--think-min', type=float, default=1.0, help="min seconds before a user clicks")
+    parser.add_argument('--think-max', type=float, default=5.0, help="max seconds before a user clicks")
+    parser.add_argument('--file-size', type=int, default=8 * 1024 * 1024, help="mock download size in bytes")
+    parser.add_argument('--extract-delay', type=float, default=1.5, help="mock extractor latency in seconds")
+    parser.add_argument('--probe-delay', type=float, default=0.2, help="mock oEmbed probe latency in seconds")
+    parser.add_argument('--download-mbps', type=float, default=200.0, help="mock download speed in Mbit/s")
+    parser.add_argument('--upload-mbps', type=float, default=100.0, help="mock Pyrogram upload speed in Mbit/s")
+    parser.add_argument('--pyrogram', action='store_true', help="route video uploads through the mock uploader")
+    parser.add_argument('--concurrent-updates', type=int, default=CONCURRENT_UPDATES,
+                        help="updates processed concurrently (defaults to CONCURRENT_UPDATES, 1 = sequential)")
+    parser.add_argument('--skip-animations', action='store_true', help="skip download progress message edits")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write JSON results to this file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    payload = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
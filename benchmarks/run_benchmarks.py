@@ -0,0 +1,288 @@
+"""
+Offline benchmark suite: synthetic media server + stub Bot API
+
+Measures download, audio extraction and upload latency, end-to-end throughput
+under N concurrent users, and CPU/memory use. Results are printed (or written
+with --output) as JSON so runs can be diffed for regressions.
+
+Usage:
+    python -m benchmarks.run_benchmarks --iterations 3 --users 1 4 8 --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+from benchmarks.fake_media_server import FakeMediaServer
+from benchmarks.stub_bot_api import StubBotApiServer
+
+logger = logging.getLogger(__name__)
+
+# Format selectors per synthetic source; DASH has separate audio/video streams
+FORMAT_SELECTORS = {
+    'mp4': 'best',
+    'hls': 'best',
+    'dash': 'bestvideo+bestaudio/best',
+}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies: List[float]) -> Dict[str, Any]:
+    if not latencies:
+        return {'count': 0}
+    return {
+        'count': len(latencies),
+        'mean_s': round(statistics.mean(latencies), 4),
+        'p50_s': round(percentile(latencies, 50), 4),
+        'p95_s': round(percentile(latencies, 95), 4),
+        'max_s': round(max(latencies), 4),
+    }
+
+
+class ResourceProbe:
+    """Measure wall time, CPU time (including ffmpeg children) and memory of a block"""
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.result: Dict[str, Any] = {}
+
+    def __enter__(self):
+        self._self_start = resource.getrusage(resource.RUSAGE_SELF)
+        self._children_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self._wall_start = time.perf_counter()
+        if self.trace_memory:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._wall_start
+        self_end = resource.getrusage(resource.RUSAGE_SELF)
+        children_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.result = {
+            'wall_s': round(wall, 4),
+            'cpu_self_s': round((self_end.ru_utime - self._self_start.ru_utime)
+                                + (self_end.ru_stime - self._self_start.ru_stime), 4),
+            'cpu_children_s': round((children_end.ru_utime - self._children_start.ru_utime)
+                                    + (children_end.ru_stime - self._children_start.ru_stime), 4),
+            'max_rss_mb': round(self_end.ru_maxrss / 1024, 1),
+        }
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.result['python_peak_alloc_mb'] = round(peak / (1024 * 1024), 2)
+
+
+def fresh_dir(root: str, name: str) -> str:
+    path = os.path.join(root, name)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+
+async def bench_video_download(downloader, url: str, format_id: str, iterations: int,
+                               work_root: str, trace_memory: bool) -> Dict[str, Any]:
+    latencies, sizes, failures = [], [], 0
+    with ResourceProbe(trace_memory) as probe:
+        for i in range(iterations):
+            out_dir = fresh_dir(work_root, f"video_{i}")
+            started = time.perf_counter()
+            file_path = await downloader.download_video_format(url, out_dir, format_id)
+            if file_path and os.path.exists(file_path):
+                latencies.append(time.perf_counter() - started)
+                sizes.append(os.path.getsize(file_path))
+            else:
+                failures += 1
+    result = summarize(latencies)
+    result.update(probe.result)
+    result['failures'] = failures
+    if sizes:
+        result['bytes'] = sizes[0]
+        result['throughput_mb_s'] = round(sum(sizes) / (1024 * 1024) / max(sum(latencies), 1e-9), 2)
+    return result
+
+
+async def bench_audio_download(downloader, url: str, iterations: int,
+                               work_root: str, trace_memory: bool) -> Dict[str, Any]:
+    latencies, failures = [], 0
+    with ResourceProbe(trace_memory) as probe:
+        for i in range(iterations):
+            out_dir = fresh_dir(work_root, f"audio_{i}")
+            started = time.perf_counter()
+            file_path = await downloader.download_audio(url, out_dir, "best")
+            if file_path and os.path.exists(file_path):
+                latencies.append(time.perf_counter() - started)
+            else:
+                failures += 1
+    result = summarize(latencies)
+    result.update(probe.result)
+    result['failures'] = failures
+    return result
+
+
+async def bench_bot_api_upload(bot, file_path: str, iterations: int, trace_memory: bool) -> Dict[str, Any]:
+    latencies, failures = [], 0
+    size = os.path.getsize(file_path)
+    with ResourceProbe(trace_memory) as probe:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            try:
+                with open(file_path, 'rb') as video_file:
+                    await bot.send_video(chat_id=1, video=video_file, supports_streaming=True)
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                logger.error(f"Stub upload failed: {e}")
+                failures += 1
+    result = summarize(latencies)
+    result.update(probe.result)
+    result['failures'] = failures
+    result['bytes'] = size
+    if latencies:
+        result['throughput_mb_s'] = round(size * len(latencies) / (1024 * 1024) / sum(latencies), 2)
+    return result
+
+
+async def bench_end_to_end(downloader, bot, url: str, users: int, work_root: str,
+                           trace_memory: bool) -> Dict[str, Any]:
+    """Each simulated user downloads the same source and uploads it to the stub"""
+
+    async def _job(user_index: int) -> Optional[float]:
+        out_dir = fresh_dir(work_root, f"user_{user_index}")
+        started = time.perf_counter()
+        file_path = await downloader.download_video_format(url, out_dir, 'best')
+        if not file_path or not os.path.exists(file_path):
+            return None
+        with open(file_path, 'rb') as video_file:
+            await bot.send_video(chat_id=user_index + 1, video=video_file, supports_streaming=True)
+        return time.perf_counter() - started
+
+    with ResourceProbe(trace_memory) as probe:
+        results = await asyncio.gather(*(_job(i) for i in range(users)), return_exceptions=True)
+    latencies = [r for r in results if isinstance(r, float)]
+    result = summarize(latencies)
+    result.update(probe.result)
+    result['users'] = users
+    result['failures'] = users - len(latencies)
+    result['jobs_per_s'] = round(len(latencies) / max(probe.result['wall_s'], 1e-9), 3)
+    return result
+
+
+def _environment() -> Dict[str, Any]:
+    env = {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    try:
+        import yt_dlp
+        env['yt_dlp'] = yt_dlp.version.__version__
+    except Exception:
+        pass
+    try:
+        env['git_rev'] = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        pass
+    return env
+
+
+async def run(args) -> Dict[str, Any]:
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+    from downloader import VideoDownloader
+
+    work_root = tempfile.mkdtemp(prefix="bench_work_")
+    results: Dict[str, Any] = {'environment': _environment(), 'parameters': vars(args).copy()}
+
+    media = FakeMediaServer(duration=args.duration, bytes_per_second=args.server_rate)
+    stub = StubBotApiServer(upload_bytes_per_second=args.upload_rate)
+    with media, stub:
+        downloader = VideoDownloader()
+        # Repeated iterations must hit the network path, not the media cache
+        downloader.media_cache = None
+        request = HTTPXRequest(connection_pool_size=max(8, max(args.users) * 2),
+                               read_timeout=120, write_timeout=120)
+        bot = Bot(token="123456:STUB", base_url=stub.base_url, request=request)
+        await bot.initialize()
+
+        downloads = {}
+        for kind in args.sources:
+            downloads[kind] = await bench_video_download(
+                downloader, media.url(kind), FORMAT_SELECTORS[kind],
+                args.iterations, work_root, args.trace_memory,
+            )
+        results['download_video_format'] = downloads
+
+        results['download_audio'] = await bench_audio_download(
+            downloader, media.url('mp4'), args.iterations, work_root, args.trace_memory,
+        )
+
+        sample = os.path.join(media.root, media.paths['mp4'])
+        results['upload'] = {
+            'bot_api': await bench_bot_api_upload(bot, sample, args.iterations, args.trace_memory),
+            # Pyrogram speaks MTProto directly, which cannot be stubbed with an HTTP server
+            'pyrogram': {'skipped': 'MTProto uploads are not covered by the offline stub'},
+        }
+
+        results['end_to_end'] = [
+            await bench_end_to_end(downloader, bot, media.url('mp4'), users, work_root, args.trace_memory)
+            for users in args.users
+        ]
+        results['stub_bot_api'] = stub.state.snapshot()
+        await bot.shutdown()
+
+    shutil.rmtree(work_root, ignore_errors=True)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=3, help="repetitions per single-job benchmark")
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 4, 8],
+                        help="concurrent user counts for the end-to-end benchmark")
+    parser.add_argument('--sources', nargs='+', choices=sorted(FORMAT_SELECTORS), default=['mp4', 'hls', 'dash'])
+    parser.add_argument('--duration', type=int, default=20, help="length of the synthetic video in seconds")
+    parser.add_argument('--server-rate', type=int, default=None,
+                        help="per-connection media server rate limit in bytes/s")
+    parser.add_argument('--upload-rate', type=int, default=None,
+                        help="per-connection stub Bot API ingest rate in bytes/s")
+    parser.add_argument('--trace-memory', action='store_true', help="record Python peak allocations (slower)")
+    parser.add_argument('--output', help="write JSON results to this file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    payload = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
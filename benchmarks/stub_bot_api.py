@@ -0,0 +1,216 @@
+"""
+Stub Telegram Bot API server standing in for api.telegram.org during benchmarks
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+_METHOD_RE = re.compile(r'^/bot[^/]+/(\w+)')
+_MULTIPART_CHAT_RE = re.compile(rb'name="chat_id"\r\n\r\n(-?\d+)')
+
+# Methods answered with a Message object; everything else gets ``true``
+_MESSAGE_METHODS = {
+    'sendmessage', 'editmessagetext', 'sendvideo', 'sendaudio', 'senddocument',
+    'sendphoto', 'editmessagecaption', 'editmessagereplymarkup', 'copymessage', 'forwardmessage',
+}
+
+
+class StubBotApiState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.bytes_received: Dict[str, int] = defaultdict(int)
+        self.keyboards: Dict[int, List[str]] = {}
+        self.message_id = 0
+
+    def next_message_id(self) -> int:
+        with self.lock:
+            self.message_id += 1
+            return self.message_id
+
+    def record(self, method: str, size: int) -> None:
+        with self.lock:
+            self.calls[method] += 1
+            self.bytes_received[method] += size
+
+    def set_keyboard(self, chat_id: int, callback_data: List[str]) -> None:
+        with self.lock:
+            self.keyboards[chat_id] = callback_data
+
+    def last_keyboard(self, chat_id: int) -> List[str]:
+        """Callback data of the inline keyboard most recently sent to chat_id"""
+        with self.lock:
+            return list(self.keyboards.get(chat_id, []))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'calls': dict(self.calls),
+                'bytes_received': dict(self.bytes_received),
+            }
+
+
+class StubBotApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state: StubBotApiState = None
+    upload_bytes_per_second: Optional[int] = None
+    latency: float = 0.0
+
+    def log_message(self, format, *args):
+        logger.debug("stub bot api: " + format, *args)
+
+    def _read_body(self) -> bytes:
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip() or b'0', 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b''.join(chunks)
+
+        remaining = int(self.headers.get('Content-Length') or 0)
+        chunks = []
+        started = time.monotonic()
+        received = 0
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 64 * 1024))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            received += len(chunk)
+            remaining -= len(chunk)
+            if self.upload_bytes_per_second:
+                expected = received / self.upload_bytes_per_second
+                elapsed = time.monotonic() - started
+                if expected > elapsed:
+                    time.sleep(expected - elapsed)
+        return b''.join(chunks)
+
+    def _chat_id(self, body: bytes) -> int:
+        content_type = self.headers.get('Content-Type', '')
+        try:
+            if 'application/json' in content_type:
+                return int(json.loads(body or b'{}').get('chat_id', 1))
+            if 'multipart/form-data' in content_type:
+                match = _MULTIPART_CHAT_RE.search(body)
+                return int(match.group(1)) if match else 1
+            values = parse_qs(body.decode('utf-8', 'ignore'))
+            return int(values.get('chat_id', ['1'])[0])
+        except (ValueError, TypeError):
+            return 1
+
+    def _record_keyboard(self, chat_id: int, body: bytes) -> None:
+        """Remember inline keyboards so load generators can click real buttons"""
+        if b'reply_markup' not in body or 'multipart/form-data' in self.headers.get('Content-Type', ''):
+            return
+        try:
+            if 'application/json' in self.headers.get('Content-Type', ''):
+                markup = json.loads(body).get('reply_markup')
+            else:
+                markup = parse_qs(body.decode('utf-8', 'ignore')).get('reply_markup', [None])[0]
+            if isinstance(markup, str):
+                markup = json.loads(markup)
+            rows = (markup or {}).get('inline_keyboard', [])
+        except (ValueError, AttributeError):
+            return
+        self.state.set_keyboard(chat_id, [
+            button['callback_data'] for row in rows for button in row if button.get('callback_data')
+        ])
+
+    def _respond(self, result: Any) -> None:
+        payload = json.dumps({'ok': True, 'result': result}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _message(self, chat_id: int) -> Dict[str, Any]:
+        return {
+            'message_id': self.state.next_message_id(),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': 'ok',
+        }
+
+    def do_GET(self):
+        self.do_POST()
+
+    def do_POST(self):
+        match = _METHOD_RE.match(self.path)
+        if not match:
+            self.send_error(404)
+            return
+        method = match.group(1).lower()
+        body = self._read_body()
+        self.state.record(method, len(body))
+        if self.latency:
+            time.sleep(self.latency)
+
+        if method == 'getme':
+            self._respond({'id': 1, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub_bot',
+                           'can_join_groups': True, 'can_read_all_group_messages': False,
+                           'supports_inline_queries': False})
+        elif method == 'getupdates':
+            self._respond([])
+        elif method == 'sendmediagroup':
+            chat_id = self._chat_id(body)
+            self._respond([self._message(chat_id) for _ in range(max(1, body.count(b'"media":')))])
+        elif method in _MESSAGE_METHODS:
+            chat_id = self._chat_id(body)
+            self._record_keyboard(chat_id, body)
+            self._respond(self._message(chat_id))
+        else:
+            self._respond(True)
+
+
+class StubBotApiServer:
+    """Run the stub Bot API from a background thread"""
+
+    def __init__(self, upload_bytes_per_second: Optional[int] = None, latency: float = 0.0):
+        self.state = StubBotApiState()
+        self.upload_bytes_per_second = upload_bytes_per_second
+        self.latency = latency
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        """Value for ``Bot(base_url=...)``; the token is appended by python-telegram-bot"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self) -> "StubBotApiServer":
+        handler = type('ConfiguredStubBotApiHandler', (StubBotApiHandler,), {
+            'state': self.state,
+            'upload_bytes_per_second': self.upload_bytes_per_second,
+            'latency': self.latency,
+        })
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info(f"Stub Bot API listening on {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -4,21 +4,51 @@ Telegram Video Downloader Bot
 Downloads videos from YouTube, Twitter, Instagram, Facebook, and TikTok
 """
 
+import itertools
 import logging
 import os
-import tempfile
+import shutil
+import time
+
+# Startup timings are measured from here, before the telegram and bot modules are imported
+STARTED_AT = time.monotonic()
+
 import asyncio
-import requests
+from contextlib import asynccontextmanager
 from datetime import datetime
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
+from typing import Any, Dict
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaVideo
+from telegram.ext import Application, CallbackContext, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler, TypeHandler
 from telegram.constants import ChatAction
 from downloader import VideoDownloader
-from utils import is_valid_url, format_file_size, cleanup_temp_files
-from config import BOT_TOKEN, SUPPORTED_PLATFORMS, MAX_FILE_SIZE, USE_PYROGRAM_UPLOAD, PYROGRAM_API_ID, PYROGRAM_API_HASH, PYROGRAM_WORKERS
+from utils import format_file_size, extract_urls_from_text
+from config import BOT_TOKEN, SUPPORTED_PLATFORMS, MAX_FILE_SIZE, USE_PYROGRAM_UPLOAD, PYROGRAM_API_ID, PYROGRAM_API_HASH, PYROGRAM_WORKERS, ADMIN_USER_IDS
+from config import LOOP_MONITOR_INTERVAL, LOOP_MONITOR_DEBUG, LOOP_BLOCK_THRESHOLD_MS
+from config import MAX_CONCURRENT_JOBS, MAX_JOBS_PER_USER, SCHEDULER_AGING_MB_PER_S, CONCURRENT_UPDATES, MAX_URLS_PER_MESSAGE
+from config import PLAYLIST_BATCH_MAX
+from config import PREFERRED_FORMATS, METADATA_PROBE, PREFETCH_ENABLED, PREFETCH_MAX_ACTIVE
+from config import WORK_DIR, JOURNAL_PATH, JOB_RESUME_MAX_AGE_HOURS, JOB_RESUME_MAX_ATTEMPTS
+from config import STATE_PATH, SESSION_TTL_HOURS
+from config import OVERSIZE_MODE, ENCODE_PRESET, ENCODE_TIME_BUDGET, SPLIT_MAX_PARTS, SPLIT_UPLOAD, SPLIT_UPLOAD_CONCURRENCY
 from uploader import PyrogramUploader
+from bandwidth import bandwidth, EGRESS
 from animated_responses import AnimatedResponses
 from stats import BotStats
+from tracing import tracer
+from metrics import metrics
+from loop_monitor import LoopMonitor
+from scheduler import JobScheduler, estimate_job_bytes
+from journal import JobJournal, RUNNING, DONE, FAILED
+from url_canon import normalize_url, detect_platform as detect_url_platform
+from url_classifier import VIDEO, classify_url, looks_like_url
+from batch_status import BatchStatus, DeliveryOrder
+from metadata_probe import MetadataProbe, quick_fallback_quality, resolve_quick_format
+from prefetch import ChoicePredictor, Prefetcher, choice_label
+from postprocess import fit_to_size, prepare_for_streaming, split_to_parts, thumbnail_for
+from media_probe import probe_media
+from session_store import SessionStore, SQLitePersistence
+from callback_tokens import CallbackTokens
+from user_stats import UserStatsManager
 
 # Configure logging
 logging.basicConfig(
@@ -27,15 +57,57 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Format used for links of a multi-link message, where there is no per-link format menu
+BATCH_VIDEO_FORMAT = '/'.join(PREFERRED_FORMATS)
+
+# Telegram albums hold at most this many items
+MEDIA_GROUP_MAX = 10
+
+PLAYLIST_PAGE_SIZE = 10
+
+# Argument-less button actions, sent as plain callback_data; anything else must be a token
+STATIC_CALLBACK_ACTIONS = (
+    'back_to_main', 'cancel', 'contact', 'contact_developer', 'developer', 'examples', 'faq',
+    'features', 'help', 'my_stats', 'platforms', 'stats', 'support',
+)
+
+# Seconds between edits of a download's progress message (Telegram rate-limits edits)
+PROGRESS_EDIT_INTERVAL = 3
+
 class TelegramVideoBot:
     def __init__(self):
         self.downloader = VideoDownloader()
-        self.temp_dir = tempfile.mkdtemp(prefix="telegram_bot_")
+        # Stable work dir: per-job subdirectories survive restarts so interrupted downloads can resume
+        self.temp_dir = WORK_DIR
+        os.makedirs(self.temp_dir, exist_ok=True)
+        self.journal = JobJournal(JOURNAL_PATH)
         self.stats = BotStats()
-        logger.info(f"Temporary directory created: {self.temp_dir}")
+        logger.info(f"Work directory: {self.temp_dir}")
         # Developer chat ID - سيتم الحصول عليه تلقائياً عند أول رسالة
         self.developer_chat_id = None
-        # Optional Pyrogram uploader for large files
+        self.loop_monitor = LoopMonitor(
+            interval=LOOP_MONITOR_INTERVAL,
+            block_threshold=LOOP_BLOCK_THRESHOLD_MS / 1000,
+            debug=LOOP_MONITOR_DEBUG,
+        )
+        # Orders download jobs by estimated size so short jobs are not stuck behind huge ones
+        self.scheduler = JobScheduler(
+            slots=MAX_CONCURRENT_JOBS,
+            per_user=MAX_JOBS_PER_USER,
+            aging_bytes_per_second=SCHEDULER_AGING_MB_PER_S * 1024 * 1024,
+        )
+        self.metadata_probe = MetadataProbe() if METADATA_PROBE else None
+        # (chat_id, message_id) of quick-probe menus nobody has pressed yet, replaced once full resolution ends
+        self.quick_menus: Dict[tuple, str] = {}
+        # Open menus, playlists and button payloads; restored from the persistence in post_init
+        self.sessions = SessionStore(ttl=SESSION_TTL_HOURS * 3600)
+        self.callbacks = CallbackTokens(STATIC_CALLBACK_ACTIONS, ttl=SESSION_TTL_HOURS * 3600)
+        self.prefetcher = None
+        if PREFETCH_ENABLED:
+            self.prefetcher = Prefetcher(self.downloader, self.scheduler, ChoicePredictor(UserStatsManager()),
+                                         self.temp_dir, max_active=PREFETCH_MAX_ACTIVE)
+        self._first_update_seen = False
+        # Optional Pyrogram uploader for large files; connects on its first upload
         self.uploader = None
         if USE_PYROGRAM_UPLOAD and PYROGRAM_API_ID and PYROGRAM_API_HASH:
             try:
@@ -91,103 +163,69 @@ class TelegramVideoBot:
                 "🔄 /start للعودة"
             )
 
-    async def show_download_progress(self, message, file_type: str, url: str) -> None:
-        """Show animated download progress with detailed information"""
-        import random
-        import time
-        
-        # Get estimated file size (simulated for demonstration)
-        estimated_sizes = {
-            "audio": random.randint(3, 8),  # 3-8 MB for audio
-            "video": random.randint(15, 120)  # 15-120 MB for video
-        }
-        
-        total_size_mb = estimated_sizes.get(file_type, 25)
-        total_size_bytes = total_size_mb * 1024 * 1024
-        
-        # Progress animation frames
-        progress_chars = ["▱▱▱▱▱▱▱▱▱▱", "▰▱▱▱▱▱▱▱▱▱", "▰▰▱▱▱▱▱▱▱▱", "▰▰▰▱▱▱▱▱▱▱", 
-                         "▰▰▰▰▱▱▱▱▱▱", "▰▰▰▰▰▱▱▱▱▱", "▰▰▰▰▰▰▱▱▱▱", "▰▰▰▰▰▰▰▱▱▱",
-                         "▰▰▰▰▰▰▰▰▱▱", "▰▰▰▰▰▰▰▰▰▱", "▰▰▰▰▰▰▰▰▰▰"]
-        
+    @asynccontextmanager
+    async def show_download_progress(self, message, file_type: str):
+        """Edit message with the download's real progress while the block runs.
+
+        Yields a yt-dlp progress hook to pass to the downloader; the message is
+        redrawn from the latest hook call every PROGRESS_EDIT_INTERVAL seconds.
+        """
+        latest: Dict[str, Any] = {}
+
+        def hook(d: Dict[str, Any]) -> None:
+            # Called from the download thread; one dict assignment, rendered by the loop
+            latest['d'] = d
+
+        task = asyncio.ensure_future(self._render_download_progress(message, file_type, latest))
+        try:
+            yield hook
+        finally:
+            task.cancel()
+
+    async def _render_download_progress(self, message, file_type: str, latest: Dict[str, Any]) -> None:
+        progress_chars = ["▱▱▱▱▱▱▱▱▱▱", "▰▱▱▱▱▱▱▱▱▱", "▰▰▱▱▱▱▱▱▱▱", "▰▰▰▱▱▱▱▱▱▱",
+                          "▰▰▰▰▱▱▱▱▱▱", "▰▰▰▰▰▱▱▱▱▱", "▰▰▰▰▰▰▱▱▱▱", "▰▰▰▰▰▰▰▱▱▱",
+                          "▰▰▰▰▰▰▰▰▱▱", "▰▰▰▰▰▰▰▰▰▱", "▰▰▰▰▰▰▰▰▰▰"]
         spinning_icons = ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"]
-        
-        start_time = time.time()
-        
-        # Phase 1: Initialization
-        for i in range(3):
-            icon = spinning_icons[i % len(spinning_icons)]
-            await message.edit_text(
-                f"{icon} **جاري البدء في التحميل...**\n\n"
-                f"📋 **تحليل الرابط والحصول على المعلومات**\n"
-                f"🔍 **البحث عن أفضل جودة متاحة**\n"
-                f"⏱ **الوقت المقدر:** ~{total_size_mb//5 + 10} ثانية\n\n"
-                f"💡 **شكراً لصبرك، جاري التحضير...**",
-                parse_mode='Markdown'
-            )
-            await asyncio.sleep(0.8)
-        
-        # Phase 2: Download progress simulation
-        for progress_step in range(len(progress_chars)):
-            icon = spinning_icons[progress_step % len(spinning_icons)]
-            percentage = (progress_step * 100) // (len(progress_chars) - 1)
-            downloaded_mb = (total_size_mb * percentage) // 100
-            elapsed_time = time.time() - start_time
-            
-            if percentage > 0:
-                speed_mbps = downloaded_mb / max(elapsed_time, 0.1)
-                remaining_mb = total_size_mb - downloaded_mb
-                eta_seconds = remaining_mb / max(speed_mbps, 0.1) if speed_mbps > 0 else 0
-            else:
-                speed_mbps = 0
-                eta_seconds = total_size_mb // 2  # rough estimate
-            
-            # Different messages for different file types
-            if file_type == "audio":
-                type_emoji = "🎵"
-                type_text = "الملف الصوتي"
-                process_text = "استخراج وتحويل الصوت"
+        if file_type == "audio":
+            type_emoji, type_text, process_text = "🎵", "الملف الصوتي", "استخراج وتحويل الصوت"
+        else:
+            type_emoji, type_text, process_text = "📹", "الفيديو", "تحميل ومعالجة الفيديو"
+
+        shown = None
+        for frame in itertools.count():
+            icon = spinning_icons[frame % len(spinning_icons)]
+            d = latest.get('d')
+            if d is None:
+                text = (
+                    f"{icon} **جاري البدء في التحميل...**\n\n"
+                    f"📋 **تحليل الرابط والحصول على المعلومات**\n"
+                    f"💡 **شكراً لصبرك، جاري التحضير...**"
+                )
+            elif d.get('status') == 'finished':
+                text = f"{icon} **{type_emoji} اكتمل التحميل**\n\n🔄 **{process_text}...**"
             else:
-                type_emoji = "📹"
-                type_text = "الفيديو"
-                process_text = "تحميل ومعالجة الفيديو"
-            
-            progress_message = (
-                f"{icon} **{type_emoji} جاري تحميل {type_text}...**\n\n"
-                f"📊 **التقدم:** {percentage}%\n"
-                f"{progress_chars[progress_step]}\n\n"
-                f"📁 **تم التحميل:** {downloaded_mb:.1f} MB من {total_size_mb} MB\n"
-                f"⚡ **السرعة:** {speed_mbps:.1f} MB/s\n"
-                f"⏱ **الوقت المتبقي:** {eta_seconds:.0f} ثانية\n\n"
-                f"🔄 **{process_text}**\n"
-                f"💫 **نقدر صبرك، قريباً سننتهي!**"
-            )
-            
-            await message.edit_text(progress_message, parse_mode='Markdown')
-            await asyncio.sleep(1.2)  # Slower for more realistic feel
-        
-        # Phase 3: Upload to Telegram
-        upload_frames = [
-            "📤 **التحميل مكتمل! جاري الرفع إلى تلجرام...**",
-            "🚀 **معالجة الملف للرفع السريع...**", 
-            "⚡ **تحسين جودة الرفع...**",
-            "✨ **اللمسات الأخيرة، تقريباً انتهينا...**"
-        ]
-        
-        for i, frame in enumerate(upload_frames):
-            icon = spinning_icons[i % len(spinning_icons)]
-            total_elapsed = time.time() - start_time
-            
-            await message.edit_text(
-                f"{icon} {frame}\n\n"
-                f"📊 **التقدم:** 100% ✅\n"
-                f"📁 **حجم الملف:** {total_size_mb} MB\n"
-                f"⏱ **وقت التحميل:** {total_elapsed:.1f} ثانية\n"
-                f"🚀 **سرعة متوسطة:** {total_size_mb/total_elapsed:.1f} MB/s\n\n"
-                f"🎯 **جاري الرفع إلى تلجرام...**",
-                parse_mode='Markdown'
-            )
-            await asyncio.sleep(1.0)
+                done = d.get('downloaded_bytes') or 0
+                total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+                percentage = min(100, int(done * 100 / total)) if total else 0
+                speed = d.get('speed') or 0
+                eta = d.get('eta')
+                text = (
+                    # Percentage in the first line: batch status lines only show that one
+                    f"{icon} **{type_emoji} جاري تحميل {type_text}... {percentage}%**\n\n"
+                    f"{progress_chars[percentage // 10]}\n\n"
+                    f"📁 **تم التحميل:** {format_file_size(done)}"
+                    + (f" من {format_file_size(total)}" if total else "") + "\n"
+                    f"⚡ **السرعة:** {format_file_size(speed)}/s\n"
+                    + (f"⏱ **الوقت المتبقي:** {int(eta)} ثانية\n" if eta is not None else "")
+                )
+            if text != shown:
+                try:
+                    await message.edit_text(text, parse_mode='Markdown')
+                    shown = text
+                except Exception as e:
+                    logger.debug(f"Could not update download progress: {e}")
+            await asyncio.sleep(PROGRESS_EDIT_INTERVAL)
 
     async def send_thank_you_message(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, url: str = None) -> None:
         """Send thank you message with enhanced options after successful download"""
@@ -195,12 +233,12 @@ class TelegramVideoBot:
         
         # Add audio download option if URL is available
         if url:
-            share_keyboard.append([InlineKeyboardButton("🎵 تحميل كصوت MP3", callback_data=f"download_audio_from_video_{url}")])
+            share_keyboard.append([InlineKeyboardButton("🎵 تحميل كصوت MP3", callback_data=self.callbacks.data("audio_from_video", url=url))])
         
         share_keyboard.extend([
             [InlineKeyboardButton("🚀 شارك البوت مع أصدقائك", url="https://t.me/share/url?url=https://t.me/your_bot_username&text=🎥 بوت تحميل الفيديوهات الأفضل! يدعم يوتيوب، تيك توك، انستقرام، تويتر وأكثر مجاناً 💯")],
             [InlineKeyboardButton("📢 انضم لقناة البوت", url="https://t.me/yedevlepver")],
-            [InlineKeyboardButton("🔄 تحميل فيديو آخر", callback_data="back_to_main")]
+            [InlineKeyboardButton("🔄 تحميل فيديو آخر", callback_data=self.callbacks.data("back_to_main"))]
         ])
         share_reply_markup = InlineKeyboardMarkup(share_keyboard)
         
@@ -243,16 +281,16 @@ class TelegramVideoBot:
         # Create transparent-style main menu keyboard
         keyboard = [
             [
-                InlineKeyboardButton("🔥 المميزات الحصرية", callback_data="features"),
-                InlineKeyboardButton("📚 دليل الاستخدام", callback_data="help")
+                InlineKeyboardButton("🔥 المميزات الحصرية", callback_data=self.callbacks.data("features")),
+                InlineKeyboardButton("📚 دليل الاستخدام", callback_data=self.callbacks.data("help"))
             ],
             [
                 InlineKeyboardButton("📢 قناة البوت", url="https://t.me/yedevlepver"),
-                InlineKeyboardButton("👨‍💻 المطور", callback_data="developer")
+                InlineKeyboardButton("👨‍💻 المطور", callback_data=self.callbacks.data("developer"))
             ],
             [
-                InlineKeyboardButton("💡 أمثلة للروابط", callback_data="examples"),
-                InlineKeyboardButton("🆘 الدعم الفني", callback_data="support")
+                InlineKeyboardButton("💡 أمثلة للروابط", callback_data=self.callbacks.data("examples")),
+                InlineKeyboardButton("🆘 الدعم الفني", callback_data=self.callbacks.data("support"))
             ]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -298,12 +336,59 @@ class TelegramVideoBot:
         
         await update.message.reply_text(help_message, parse_mode='Markdown')
 
+    def is_admin(self, update: Update) -> bool:
+        """Check whether the sender may use diagnostic commands"""
+        user = update.effective_user
+        return bool(user and user.id in ADMIN_USER_IDS)
+
+    async def trace_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handle /trace [id] - show stage timing breakdown of a job (admins only)"""
+        if not self.is_admin(update):
+            return
+
+        if not context.args:
+            recent = tracer.recent_traces(limit=10)
+            if not recent:
+                await update.message.reply_text("لا توجد عمليات مسجلة بعد")
+                return
+            lines = ["🧭 آخر العمليات:"]
+            for summary in recent:
+                lines.append(f"{summary['trace_id']}  {summary['name']}  {summary['duration']:.1f}s  ({summary['spans']} spans)")
+            lines.append("\nاستخدم /trace <id> لعرض التفاصيل")
+            await update.message.reply_text('\n'.join(lines))
+            return
+
+        rendered = tracer.format_trace(context.args[0])
+        if not rendered:
+            await update.message.reply_text("❌ لم يتم العثور على هذا المعرف")
+            return
+        await update.message.reply_text(rendered[:4000])
+
+    async def loop_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handle /loop - show event-loop lag and recent blocking calls (admins only)"""
+        if not self.is_admin(update):
+            return
+        await update.message.reply_text(self.loop_monitor.format_report()[:4000])
+
+    async def metrics_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handle /metrics - dump in-process metrics (admins only)"""
+        if not self.is_admin(update):
+            return
+        await update.message.reply_text(metrics.render_text()[:4000] or "لا توجد مقاييس بعد")
+
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle button callbacks"""
         query = update.callback_query
+        resolved = self.callbacks.resolve(query.data or '')
+        if resolved is None:
+            await query.answer("⌛ انتهت صلاحية هذا الزر، أرسل الرابط مرة أخرى", show_alert=True)
+            return
+        action, payload = resolved
         await query.answer()
+        # Any press on a quick-probe menu keeps it from being replaced under the user
+        self.quick_menus.pop((query.message.chat.id, query.message.message_id), None)
         
-        if query.data == "help":
+        if action == "help":
             help_text = (
                 "📚 *دليل استخدام البوت الشامل*\n\n"
                 "🌟 *كيفية الاستخدام:*\n"
@@ -324,7 +409,7 @@ class TelegramVideoBot:
                 "🆘 /start للعودة للقائمة"
             )
             await query.message.edit_text(help_text, parse_mode='Markdown')
-        elif query.data == "features":
+        elif action == "features":
             features_message = (
                 "🔥 *المميزات الحصرية للبوت:*\n\n"
                 "⚡ *سرعة فائقة:* تحميل فوري بدون انتظار\n"
@@ -338,7 +423,7 @@ class TelegramVideoBot:
                 "💎 *كل هذا مجاناً بلا قيود!*"
             )
             await query.message.edit_text(features_message, parse_mode='Markdown')
-        elif query.data == "contact":
+        elif action == "contact":
             contact_message = (
                 "👨‍⚕️ *عن المطور - حيدر:*\n\n"
                 "🩺 *طبيب متخصص* مع شغف كبير بعالم البرمجة\n"
@@ -355,7 +440,7 @@ class TelegramVideoBot:
                 "🙏 *شكراً لاستخدام البوت!*"
             )
             await query.message.edit_text(contact_message, parse_mode='Markdown')
-        elif query.data == "examples":
+        elif action == "examples":
             examples_message = (
                 "💡 *أمثلة للروابط المدعومة:*\n\n"
                 "🔴 *يوتيوب:*\n"
@@ -379,10 +464,10 @@ class TelegramVideoBot:
                 "📝 *فقط انسخ والصق أي رابط من هذه المنصات!*"
             )
             await query.message.edit_text(examples_message, parse_mode='Markdown')
-        elif query.data == "developer":
+        elif action == "developer":
             developer_keyboard = [
                 [InlineKeyboardButton("💬 تواصل مع المطور", url="https://t.me/docamir")],
-                [InlineKeyboardButton("🔙 العودة للقائمة الرئيسية", callback_data="back_to_main")]
+                [InlineKeyboardButton("🔙 العودة للقائمة الرئيسية", callback_data=self.callbacks.data("back_to_main"))]
             ]
             developer_reply_markup = InlineKeyboardMarkup(developer_keyboard)
             
@@ -407,11 +492,11 @@ class TelegramVideoBot:
                 "اضغط الزر أدناه للمحادثة المباشرة!"
             )
             await query.message.edit_text(developer_message, parse_mode='Markdown', reply_markup=developer_reply_markup)
-        elif query.data == "support":
+        elif action == "support":
             support_keyboard = [
-                [InlineKeyboardButton("📞 تواصل مباشر مع المطور", callback_data="contact_developer")],
-                [InlineKeyboardButton("❓ الأسئلة الشائعة", callback_data="faq")],
-                [InlineKeyboardButton("🔙 العودة للقائمة الرئيسية", callback_data="back_to_main")]
+                [InlineKeyboardButton("📞 تواصل مباشر مع المطور", callback_data=self.callbacks.data("contact_developer"))],
+                [InlineKeyboardButton("❓ الأسئلة الشائعة", callback_data=self.callbacks.data("faq"))],
+                [InlineKeyboardButton("🔙 العودة للقائمة الرئيسية", callback_data=self.callbacks.data("back_to_main"))]
             ]
             support_reply_markup = InlineKeyboardMarkup(support_keyboard)
             
@@ -424,7 +509,7 @@ class TelegramVideoBot:
                 "💡 نحن هنا لمساعدتك 24/7"
             )
             await query.message.edit_text(support_message, parse_mode='Markdown', reply_markup=support_reply_markup)
-        elif query.data == "contact_developer":
+        elif action == "contact_developer":
             contact_message = (
                 "📝 *التواصل المباشر مع المطور*\n\n"
                 "💬 اكتب رسالتك وسيتم إرسالها مباشرة للمطور\n"
@@ -439,7 +524,7 @@ class TelegramVideoBot:
             # Set user state to waiting for support message
             context.user_data['waiting_for_support_message'] = True
             await query.message.edit_text(contact_message, parse_mode='Markdown')
-        elif query.data == "faq":
+        elif action == "faq":
             faq_message = (
                 "❓ *الأسئلة الشائعة والحلول*\n\n"
                 "🔸 *الرابط لا يعمل؟*\n"
@@ -455,7 +540,7 @@ class TelegramVideoBot:
                 "🔄 العودة: /start"
             )
             await query.message.edit_text(faq_message, parse_mode='Markdown')
-        elif query.data == "stats":
+        elif action == "stats":
             # Show global bot statistics
             global_stats = self.stats.get_global_stats()
             
@@ -480,7 +565,7 @@ class TelegramVideoBot:
                 f"🎵 صوت: {global_stats['type_breakdown']['audio']:,}"
             )
             await query.message.edit_text(stats_message, parse_mode='Markdown')
-        elif query.data == "my_stats":
+        elif action == "my_stats":
             # Show user's personal statistics
             user_id = str(query.from_user.id)
             user_stats = self.stats.get_user_stats(user_id)
@@ -502,15 +587,15 @@ class TelegramVideoBot:
                     "🎉 شكراً لك على استخدام البوت!"
                 )
             await query.message.edit_text(my_stats_message, parse_mode='Markdown')
-        elif query.data == "back_to_main":
+        elif action == "back_to_main":
             # Create a proper Update object for start command
             keyboard = [
-                [InlineKeyboardButton("📚 دليل الاستخدام", callback_data="help"),
-                 InlineKeyboardButton("⚡ المميزات", callback_data="features")],
-                [InlineKeyboardButton("🌐 المنصات المدعومة", callback_data="platforms"),
-                 InlineKeyboardButton("❓ أسئلة شائعة", callback_data="faq")],
-                [InlineKeyboardButton("👨‍⚕️ نبذة عن المطور", callback_data="developer"),
-                 InlineKeyboardButton("💬 دعم فني", callback_data="support")]
+                [InlineKeyboardButton("📚 دليل الاستخدام", callback_data=self.callbacks.data("help")),
+                 InlineKeyboardButton("⚡ المميزات", callback_data=self.callbacks.data("features"))],
+                [InlineKeyboardButton("🌐 المنصات المدعومة", callback_data=self.callbacks.data("platforms")),
+                 InlineKeyboardButton("❓ أسئلة شائعة", callback_data=self.callbacks.data("faq"))],
+                [InlineKeyboardButton("👨‍⚕️ نبذة عن المطور", callback_data=self.callbacks.data("developer")),
+                 InlineKeyboardButton("💬 دعم فني", callback_data=self.callbacks.data("support"))]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
@@ -522,131 +607,314 @@ class TelegramVideoBot:
                 "🎯 *اختر من القائمة أدناه:*"
             )
             await query.message.edit_text(welcome_message, parse_mode='Markdown', reply_markup=reply_markup)
-        elif query.data == "cancel":
+        elif action == "cancel":
+            if self.prefetcher:
+                self.prefetcher.cancel(query.message.chat.id)
             await query.message.edit_text(
                 "❌ *تم إلغاء العملية*\n\n"
                 "💡 أرسل رابط فيديو جديد للمتابعة\n"
                 "🚀 أو اضغط /start للعودة للقائمة الرئيسية"
             )
-        elif query.data.startswith("download_audio_from_video_"):
+        elif action == "audio_from_video":
             # Handle audio download from video URL
-            url = query.data.replace("download_audio_from_video_", "")
+            url = payload['url']
             await query.answer("🎵 جاري تحميل الملف الصوتي...")
             
-            # Show download progress for audio
-            await self.show_download_progress(query.message, "audio", url)
+            job_id = tracer.new_trace_id()
+            logger.info(f"Audio-from-video job {job_id} started for {url}")
+            menu = self.sessions.menu(query.from_user.id)
+            formats_info = menu.formats if menu and menu.url == url else None
+            self.journal.create(job_id, query.message.chat.id, query.from_user.id, url, 'audio', 'best')
+            await self.run_job(query.message, context, job_id, query.from_user.id, url, 'audio', 'best',
+                               formats_info=formats_info, from_video=True)
+        elif action == "playlist":
+            # Handle playlist actions
+            mode = payload['mode']  # all, select, audio
+            playlist = self.sessions.playlist(payload['playlist_id'])
             
-            # Download audio
-            file_path = await self.downloader.download_audio(url, self.temp_dir, "best")
-            if file_path and os.path.exists(file_path):
-                file_size = os.path.getsize(file_path)
-                
-                # Get video info for title
-                video_info = await self.downloader.get_video_info(url)
-                title = video_info.get('title', 'ملف صوتي') if video_info else 'ملف صوتي'
-                duration = video_info.get('duration') if video_info else None
-                
-                # Final success message for audio
-                success_message = (
-                    f"✅ **تم تحويل الفيديو لصوت بنجاح!**\n\n"
-                    f"🎵 **ملف MP3 عالي الجودة جاهز**\n"
-                    f"📁 **حجم الملف:** {format_file_size(file_size)}\n"
-                    f"🎶 **جودة الصوت:** 192kbps\n\n"
-                    f"🎉 **استمتع بملفك الصوتي!**"
+            if not playlist:
+                await query.message.edit_text("❌ انتهت صلاحية قائمة التشغيل، يرجى إرسال الرابط مرة أخرى")
+            elif mode == "all":
+                await self.run_playlist_batch(context, query, playlist, playlist.entries, 'video', BATCH_VIDEO_FORMAT)
+            elif mode == "select":
+                # Show video selection
+                await self.show_video_selection(query, playlist)
+            elif mode == "audio":
+                await self.run_playlist_batch(context, query, playlist, playlist.entries, 'audio', 'best')
+        elif action.startswith("playlist_"):
+            # Playlist selection pages; the selection lives in the playlist session
+            playlist = self.sessions.playlist(payload['playlist_id'])
+            if not playlist:
+                await query.message.edit_text("❌ انتهت صلاحية قائمة التشغيل، يرجى إرسال الرابط مرة أخرى")
+            elif action == "playlist_video":
+                playlist.toggle(payload['index'])
+                self.sessions.save_playlist(playlist)
+                await self.show_video_page(query.message, playlist, payload['page'])
+            elif action == "playlist_page":
+                await self.show_video_page(query.message, playlist, payload['page'])
+            elif action == "playlist_clear_selection":
+                if playlist.selected:
+                    playlist.clear_selection()
+                    self.sessions.save_playlist(playlist)
+                    await self.show_video_page(query.message, playlist, payload['page'])
+            elif action == "playlist_back":
+                await self.show_playlist_menu(query.message, playlist)
+            elif action == "playlist_download_selected":
+                entries = playlist.selected_entries()
+                if not entries:
+                    await self.show_video_page(query.message, playlist, 0, notice="⚠️ *لم تحدد أي فيديو بعد*")
+                    return
+                playlist.clear_selection()
+                self.sessions.save_playlist(playlist)
+                await self.run_playlist_batch(context, query, playlist, entries, 'video', BATCH_VIDEO_FORMAT)
+        elif action == "download":
+            # Handle download format selection
+            url = payload['url']
+            format_type = payload['format_type']  # video or audio
+            format_id = payload['format_id']
+            menu = self.sessions.menu(query.from_user.id)
+            formats_info = menu.formats if menu and menu.url == url else None
+            if self.prefetcher:
+                label = choice_label(format_type, format_id, formats_info)
+                self.prefetcher.predictor.record(query.from_user.id, label)
+                # Same choice as the running prefetch: download exactly what it is downloading
+                format_id = self.prefetcher.match(query.message.chat.id, url, format_type, format_id) or format_id
+            if format_type == "video":
+                # Quick-menu choices map to a real format once full resolution has finished
+                fallback = quick_fallback_quality(format_id, formats_info)
+                format_id = resolve_quick_format(format_id, formats_info)
+                if fallback:
+                    await query.message.reply_text(f"ℹ️ الجودة المختارة غير متاحة لهذا الفيديو، سيتم التحميل بجودة {fallback}")
+            job_id = tracer.new_trace_id()
+            logger.info(f"Download job {job_id} started: {format_type} {format_id} for {url}")
+            self.journal.create(job_id, query.message.chat.id, query.from_user.id, url, format_type, format_id)
+            await self.run_job(query.message, context, job_id, query.from_user.id, url, format_type, format_id,
+                               formats_info=formats_info)
+
+    async def run_job(self, message, context, job_id: str, user_id: int, url: str, format_type: str,
+                      format_id: str, formats_info=None, from_video: bool = False, announce: bool = True,
+                      before_upload=None) -> bool:
+        """Run one journaled download job in its own work directory.
+
+        If the process dies mid-job the journal entry stays active and the work
+        directory (with yt-dlp's .part files) is kept for resume_interrupted_jobs.
+        """
+        work_dir = os.path.join(self.temp_dir, job_id)
+        cost = estimate_job_bytes(formats_info, format_type, format_id)
+        span_name = 'audio_from_video_job' if from_video else 'download_job'
+        try:
+            with tracer.span(span_name, trace_id=job_id, url=url, format_type=format_type, format_id=format_id):
+                async with self.job_slot(message, user_id, cost, job_id):
+                    self.journal.transition(job_id, RUNNING)
+                    if from_video:
+                        delivered = await self.download_audio_from_video(message, context, url, work_dir, formats_info)
+                    else:
+                        delivered = await self.download_with_format(message, context, url, format_type, format_id,
+                                                                     work_dir, announce=announce,
+                                                                     formats_info=formats_info,
+                                                                     before_upload=before_upload)
+        except Exception as e:
+            self.journal.transition(job_id, FAILED, str(e))
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+        self.journal.transition(job_id, DONE if delivered else FAILED)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return delivered
+
+    async def resume_interrupted_jobs(self, application: Application) -> None:
+        """Restart jobs a crash or redeploy interrupted and deliver them to the original chat.
+
+        Each job reuses its work directory, so yt-dlp continues from the .part
+        files (continuedl) instead of starting over.
+        """
+        cutoff = time.time() - JOB_RESUME_MAX_AGE_HOURS * 3600
+        resumable = []
+        for job in self.journal.active_jobs():
+            if job['updated'] < cutoff or job['attempts'] >= JOB_RESUME_MAX_ATTEMPTS:
+                self.journal.transition(job['job_id'], FAILED, 'not resumed after restart')
+                continue
+            self.journal.requeue(job['job_id'])
+            resumable.append(job)
+
+        self.cleanup_work_dir(keep={job['job_id'] for job in resumable})
+        self.journal.prune(time.time() - 7 * 24 * 3600)
+
+        for job in resumable:
+            try:
+                message = await application.bot.send_message(
+                    chat_id=job['chat_id'],
+                    text="🔄 تمت إعادة تشغيل البوت، جاري استئناف طلبك من حيث توقف...",
                 )
-                
-                await query.message.edit_text(success_message, parse_mode='Markdown')
-                await asyncio.sleep(2)
-                
-                with open(file_path, 'rb') as audio_file:
-                    await context.bot.send_audio(
-                        chat_id=query.message.chat.id,
-                        audio=audio_file,
-                        title=title[:50],
-                        duration=duration,
-                        caption=f"🎵 *{title[:50]}*\n\n"
-                               f"📊 الجودة: عالية (192kbps)\n"
-                               f"📦 الحجم: {format_file_size(file_size)}",
-                        parse_mode='Markdown'
-                    )
-                await query.message.delete()
-                os.remove(file_path)
+            except Exception as e:
+                logger.warning(f"Could not notify chat {job['chat_id']} about resumed job {job['job_id']}: {e}")
+                self.journal.transition(job['job_id'], FAILED, str(e))
+                shutil.rmtree(os.path.join(self.temp_dir, job['job_id']), ignore_errors=True)
+                continue
+            logger.info(f"Resuming job {job['job_id']} (attempt {job['attempts'] + 1}) for {job['url']}")
+            context = CallbackContext(application, chat_id=job['chat_id'], user_id=job['user_id'])
+            application.create_task(self.run_job(
+                message, context, job['job_id'], job['user_id'], job['url'], job['format_type'], job['format_id'],
+            ))
+
+    def cleanup_work_dir(self, keep=None) -> None:
+        """Remove work directories of finished jobs, keeping active (resumable) ones"""
+        if keep is None:
+            keep = {job['job_id'] for job in self.journal.active_jobs()}
+        try:
+            entries = os.listdir(self.temp_dir)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry in keep:
+                continue
+            path = os.path.join(self.temp_dir, entry)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
             else:
-                await query.message.edit_text("❌ فشل في تحميل الملف الصوتي\n💡 جرب مرة أخرى لاحقاً")
-        elif query.data.startswith("pl_"):
-            # Handle playlist actions
-            parts = query.data.split("_")
-            if len(parts) >= 3:
-                action = parts[1]  # all, select, audio
-                playlist_id = parts[2]
-                url = context.user_data.get(f'pl_{playlist_id}')
-                playlist_info = context.user_data.get(f'playlist_{playlist_id}')
-                
-                if url and playlist_info:
-                    if action == "all":
-                        # Download all videos
-                        await query.message.edit_text("🔄 بدء تحميل جميع الفيديوهات...")
-                        # TODO: Implement bulk download
-                        await query.message.edit_text("⚠️ ميزة تحميل الكل قيد التطوير\n💡 استخدم 'اختيار فيديوهات محددة' حالياً")
-                    elif action == "select":
-                        # Show video selection
-                        await self.show_video_selection(query, url, context)
-                    elif action == "audio":
-                        # Download all as audio
-                        await query.message.edit_text("🔄 بدء تحميل جميع الأصوات...")
-                        # TODO: Implement bulk audio download
-                        await query.message.edit_text("⚠️ ميزة تحميل الكل كصوت قيد التطوير\n💡 استخدم 'اختيار فيديوهات محددة' حالياً")
-        elif query.data.startswith("vid_"):
-            # Handle individual video selection from playlist
-            parts = query.data.split("_")
-            if len(parts) >= 3:
-                video_index = parts[1]
-                playlist_id = parts[2]
-                
-                # Get playlist info and individual video URL
-                playlist_info = context.user_data.get(f'playlist_{playlist_id}')
-                if playlist_info:
-                    entries = playlist_info.get('entries', [])
-                    video_entry = next((e for e in entries if str(e.get('index')) == video_index), None)
-                    
-                    if video_entry:
-                        video_url = video_entry.get('url') or video_entry.get('webpage_url')
-                        if video_url:
-                            # Store current URL and show format selection
-                            context.user_data['current_url'] = video_url
-                            await query.message.edit_text("🔄 جاري جلب معلومات الفيديو...")
-                            
-                            # Get video info and show format selection
-                            formats_info = await self.downloader.get_available_formats(video_url)
-                            if formats_info:
-                                await self.show_format_selection(query.message, formats_info)
-                            else:
-                                await query.message.edit_text("❌ فشل في جلب معلومات الفيديو")
-                        else:
-                            await query.message.edit_text("❌ لم يتم العثور على رابط الفيديو")
-                    else:
-                        await query.message.edit_text("❌ لم يتم العثور على الفيديو المحدد")
-                else:
-                    await query.message.edit_text("❌ انتهت صلاحية قائمة التشغيل")
-        elif query.data.startswith("download_"):
-            # Handle download format selection
-            parts = query.data.split("_", 2)
-            if len(parts) >= 3:
-                format_type = parts[1]  # video or audio
-                format_id = parts[2]
-                url = context.user_data.get('current_url')
-                
-                if url:
-                    await self.download_with_format(query, context, url, format_type, format_id)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    @asynccontextmanager
+    async def job_slot(self, message, user_id: int, cost: int, label: str):
+        """Hold a scheduler slot for one download job, showing the queue position while waiting"""
+        acquire = asyncio.ensure_future(self.scheduler.acquire(cost, user_id, label))
+        await asyncio.sleep(0)  # let the job enter the queue
+        position = self.scheduler.position(label)
+        if position:
+            try:
+                await message.edit_text(
+                    f"⏳ طلبك في قائمة الانتظار (الترتيب {position})\n"
+                    f"💡 الملفات الصغيرة تُعالج أولاً، وسيبدأ طلبك تلقائياً"
+                )
+            except Exception as e:
+                logger.debug(f"Could not show queue position: {e}")
+        with tracer.span('queue_wait', position=position, cost_bytes=cost):
+            await acquire
+        try:
+            yield
+        finally:
+            self.scheduler.release(user_id)
+
+    def job_title(self, url: str, formats_info, default: str) -> str:
+        """Title from the job's format lookup, else from any earlier extraction of the URL"""
+        return (formats_info or {}).get('title') or self.downloader.title_for(url) or default
+
+    async def send_video_parts(self, context, chat_id: int, title: str, parts) -> None:
+        """Upload the parts of a split video as one album when possible, else as numbered messages"""
+        captions = [f"🎥 {title[:50]}\n🧩 الجزء {number}/{len(parts)}" for number in range(1, len(parts) + 1)]
+        if SPLIT_UPLOAD == 'group' and len(parts) <= MEDIA_GROUP_MAX:
+            try:
+                await self._send_album(context, chat_id, parts, captions)
+                return
+            except Exception as e:
+                logger.warning(f"Album upload of {len(parts)} parts failed, sending them one by one: {e}")
+
+        # Parts upload concurrently, so each caption carries its number
+        semaphore = asyncio.Semaphore(max(1, SPLIT_UPLOAD_CONCURRENCY))
+
+        async def _send(path, info, caption):
+            async with semaphore:
+                await self._send_part(context, chat_id, path, info, caption)
+
+        await asyncio.gather(*(_send(path, info, caption) for (path, info), caption in zip(parts, captions)))
+
+    async def _send_album(self, context, chat_id: int, parts, captions) -> None:
+        total = sum(os.path.getsize(path) for path, _ in parts)
+        if self.uploader:
+            with tracer.span('upload', via='pyrogram', bytes=total, parts=len(parts)):
+                await self.uploader.send_video_group(
+                    chat_id, [(path, caption, info) for (path, info), caption in zip(parts, captions)]
+                )
+            return
+        for path, _ in parts:
+            await bandwidth.admit(EGRESS, os.path.getsize(path))
+        files = [open(path, 'rb') for path, _ in parts]
+        try:
+            with tracer.span('upload', via='bot_api', bytes=total, parts=len(parts)):
+                await context.bot.send_media_group(
+                    chat_id=chat_id,
+                    media=[
+                        InputMediaVideo(media=video_file, caption=caption, supports_streaming=True,
+                                        duration=info.get('duration'), width=info.get('width'),
+                                        height=info.get('height'))
+                        for video_file, (_, info), caption in zip(files, parts, captions)
+                    ],
+                )
+        finally:
+            for video_file in files:
+                video_file.close()
+
+    async def _send_part(self, context, chat_id: int, path: str, info, caption: str) -> None:
+        file_size = os.path.getsize(path)
+        if self.uploader:
+            try:
+                with tracer.span('upload', via='pyrogram', bytes=file_size):
+                    await self.uploader.send_video(chat_id=chat_id, file_path=path, caption=caption,
+                                                   duration=info.get('duration'), width=info.get('width'),
+                                                   height=info.get('height'))
+                return
+            except Exception as e:
+                logger.warning(f"Pyrogram send_video failed, falling back to Bot API: {e}")
+        await bandwidth.admit(EGRESS, file_size)
+        with tracer.span('upload', via='bot_api', bytes=file_size), open(path, 'rb') as video_file:
+            await context.bot.send_video(chat_id=chat_id, video=video_file, caption=caption, supports_streaming=True,
+                                         duration=info.get('duration'), width=info.get('width'),
+                                         height=info.get('height'))
 
-    async def show_format_selection(self, message, formats_info):
+    async def download_audio_from_video(self, message, context, url, work_dir, formats_info=None) -> bool:
+        """Download the audio track of a previously downloaded video URL"""
+        # Download audio, showing its progress
+        async with self.show_download_progress(message, "audio") as progress:
+            file_path = await self.downloader.download_audio(url, work_dir, "best", progress=progress)
+        if file_path and os.path.exists(file_path):
+            file_size = os.path.getsize(file_path)
+            
+            # Title from the original extraction, duration from the file itself
+            title = self.job_title(url, formats_info, 'ملف صوتي')
+            duration = (await probe_media(file_path)).get('duration')
+            
+            # Final success message for audio
+            success_message = (
+                f"✅ **تم تحويل الفيديو لصوت بنجاح!**\n\n"
+                f"🎵 **ملف MP3 عالي الجودة جاهز**\n"
+                f"📁 **حجم الملف:** {format_file_size(file_size)}\n"
+                f"🎶 **جودة الصوت:** 192kbps\n\n"
+                f"🎉 **استمتع بملفك الصوتي!**"
+            )
+            
+            await message.edit_text(success_message, parse_mode='Markdown')
+            with tracer.span('success_pause'):
+                await asyncio.sleep(2)
+            
+            await bandwidth.admit(EGRESS, file_size)
+            with tracer.span('upload', via='bot_api', bytes=file_size), open(file_path, 'rb') as audio_file:
+                await context.bot.send_audio(
+                    chat_id=message.chat.id,
+                    audio=audio_file,
+                    title=title[:50],
+                    duration=duration,
+                    caption=f"🎵 *{title[:50]}*\n\n"
+                           f"📊 الجودة: عالية (192kbps)\n"
+                           f"📦 الحجم: {format_file_size(file_size)}",
+                    parse_mode='Markdown'
+                )
+            await message.delete()
+            os.remove(file_path)
+            return True
+        else:
+            await message.edit_text("❌ فشل في تحميل الملف الصوتي\n💡 جرب مرة أخرى لاحقاً")
+            return False
+
+    async def show_format_selection(self, message, formats_info, url: str, preview: bool = True):
         """Show format selection menu with thumbnail preview"""
         title = formats_info.get('title', 'Unknown')[:50]
         duration = formats_info.get('duration', 0)
         thumbnail = formats_info.get('thumbnail', None)
         
         # Send thumbnail if available
-        if thumbnail:
+        if thumbnail and preview:
             try:
                 await message.reply_photo(
                     photo=thumbnail,
@@ -686,50 +954,61 @@ class TelegramVideoBot:
                     emoji = "📱"
                 
                 button_text = f"{emoji} {quality} - {size_text}"
+                if fmt.get('up_to'):
+                    # Quick-probe option: the real heights aren't known yet
+                    button_text = f"{emoji} حتى {quality}"
                 
-                keyboard.append([InlineKeyboardButton(
-                    button_text, 
-                    callback_data=f"download_video_{fmt.get('format_id', '')}"
-                )])
+                callback_data = self.callbacks.data("download", url=url, format_type="video",
+                                                    format_id=fmt.get('format_id', ''))
+                keyboard.append([InlineKeyboardButton(button_text, callback_data=callback_data)])
         
         # Audio formats - always show for all platforms
         info_text += "\n*🎵 خيارات الصوت:*\n"
-        keyboard.append([InlineKeyboardButton("🎵 MP3 جودة عالية (192kbps)", callback_data="download_audio_best")])
-        keyboard.append([InlineKeyboardButton("🎵 MP3 جودة متوسطة (128kbps)", callback_data="download_audio_medium")])
+        keyboard.append([InlineKeyboardButton("🎵 MP3 جودة عالية (192kbps)", callback_data=self.callbacks.data("download", url=url, format_type="audio", format_id="best"))])
+        keyboard.append([InlineKeyboardButton("🎵 MP3 جودة متوسطة (128kbps)", callback_data=self.callbacks.data("download", url=url, format_type="audio", format_id="medium"))])
         
         # Add cancel button
-        keyboard.append([InlineKeyboardButton("❌ إلغاء", callback_data="cancel")])
+        keyboard.append([InlineKeyboardButton("❌ إلغاء", callback_data=self.callbacks.data("cancel"))])
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         await message.edit_text(info_text, parse_mode='Markdown', reply_markup=reply_markup)
 
-    async def download_with_format(self, query, context, url, format_type, format_id):
-        """Download video/audio with specific format"""
+    async def download_with_format(self, message, context, url, format_type, format_id, work_dir=None,
+                                   announce: bool = True, formats_info=None, before_upload=None) -> bool:
+        """Download video/audio with specific format; returns True once the file was delivered.
+
+        before_upload, if given, is awaited once the file is ready to send (batch delivery order).
+        """
+        work_dir = work_dir or self.temp_dir
         start_time = asyncio.get_event_loop().time()
         
         try:
             if format_type == "audio":
-                # Enhanced audio download animation with progress
-                await self.show_download_progress(query.message, "audio", url)
-                
-                # Download audio
-                file_path = await self.downloader.download_audio(url, self.temp_dir, format_id)
+                # Download audio (or take over the prefetch of this choice), showing its progress
+                async with self.show_download_progress(message, "audio") as progress:
+                    file_path = None
+                    if self.prefetcher:
+                        file_path = await self.prefetcher.take(message.chat.id, url, format_type, format_id, work_dir)
+                    file_path = file_path or await self.downloader.download_audio(url, work_dir, format_id,
+                                                                                  progress=progress)
                 if file_path and os.path.exists(file_path):
                     file_size = os.path.getsize(file_path)
                     download_time = int(asyncio.get_event_loop().time() - start_time)
                     
-                    await query.message.edit_text("📤 جاري رفع الملف الصوتي...")
+                    if before_upload:
+                        await before_upload()
+                    await message.edit_text("📤 جاري رفع الملف الصوتي...")
                     
-                    # Get video info for title
-                    video_info = await self.downloader.get_video_info(url)
-                    title = video_info.get('title', 'ملف صوتي') if video_info else 'ملف صوتي'
-                    duration = video_info.get('duration') if video_info else None
+                    # Title from the original extraction, duration from the file itself
+                    title = self.job_title(url, formats_info, 'ملف صوتي')
+                    duration = (await probe_media(file_path)).get('duration')
                     
                     quality_text = "عالية (192kbps)" if format_id == "best" else "متوسطة (128kbps)"
                     
-                    with open(file_path, 'rb') as audio_file:
+                    await bandwidth.admit(EGRESS, file_size)
+                    with tracer.span('upload', via='bot_api', bytes=file_size), open(file_path, 'rb') as audio_file:
                         await context.bot.send_audio(
-                            chat_id=query.message.chat.id,
+                            chat_id=message.chat.id,
                             audio=audio_file,
                             title=title[:50],
                             duration=duration,
@@ -739,43 +1018,85 @@ class TelegramVideoBot:
                                    f"⏱ وقت التحميل: {download_time}s",
                             parse_mode='Markdown'
                         )
-                    await query.message.delete()
+                    await message.delete()
                     os.remove(file_path)
                     
                     # Send thank you message with share button
-                    await self.send_thank_you_message(context, query.message.chat.id)
+                    if announce:
+                        await self.send_thank_you_message(context, message.chat.id)
+                    return True
                 else:
-                    await query.message.edit_text("❌ فشل تحميل الملف الصوتي\n💡 جرب رابطاً آخر أو اختر جودة مختلفة")
+                    await message.edit_text("❌ فشل تحميل الملف الصوتي\n💡 جرب رابطاً آخر أو اختر جودة مختلفة")
                     
             else:
-                # Enhanced video download animation with progress
-                await self.show_download_progress(query.message, "video", url)
-                
-                # Download video
-                file_path = await self.downloader.download_video_format(url, self.temp_dir, format_id)
+                # Download video (or take over the prefetch of this choice), showing its progress
+                async with self.show_download_progress(message, "video") as progress:
+                    file_path = None
+                    if self.prefetcher:
+                        file_path = await self.prefetcher.take(message.chat.id, url, format_type, format_id, work_dir)
+                    file_path = file_path or await self.downloader.download_video_format(url, work_dir, format_id,
+                                                                                         progress=progress)
                 if file_path and os.path.exists(file_path):
                     # Check file size
                     file_size = os.path.getsize(file_path)
+                    if file_size > MAX_FILE_SIZE and OVERSIZE_MODE == 'encode':
+                        await message.edit_text(
+                            f"🗜 حجم الفيديو {format_file_size(file_size)} أكبر من الحد، جاري ضغطه..."
+                        )
+                        with tracer.span('encode', preset=ENCODE_PRESET):
+                            fitted = await fit_to_size(file_path, MAX_FILE_SIZE, ENCODE_PRESET, ENCODE_TIME_BUDGET)
+                        if fitted:
+                            file_path = fitted
+                            file_size = os.path.getsize(file_path)
+                    if file_size > MAX_FILE_SIZE and OVERSIZE_MODE == 'split':
+                        await message.edit_text(
+                            f"✂️ حجم الفيديو {format_file_size(file_size)} أكبر من الحد، جاري تقسيمه إلى أجزاء..."
+                        )
+                        with tracer.span('split'):
+                            parts = await split_to_parts(file_path, MAX_FILE_SIZE, SPLIT_MAX_PARTS)
+                        if parts:
+                            if before_upload:
+                                await before_upload()
+                            await message.edit_text(f"📤 جاري رفع الفيديو في {len(parts)} أجزاء...")
+                            await self.send_video_parts(context, message.chat.id,
+                                                        self.job_title(url, formats_info, 'فيديو'), parts)
+                            await message.delete()
+                            for part_path, _ in parts:
+                                os.remove(part_path)
+                            os.remove(file_path)
+                            if announce:
+                                await self.send_thank_you_message(context, message.chat.id)
+                            return True
                     if file_size > MAX_FILE_SIZE:
-                        await query.message.edit_text(
+                        await message.edit_text(
                             f"❌ الملف كبير جداً!\n"
                             f"📦 حجم الملف: {format_file_size(file_size)}\n"
                             f"📏 الحد الأقصى: {format_file_size(MAX_FILE_SIZE)}\n\n"
                             f"💡 جرب جودة أقل أو حمل الصوت بدلاً من ذلك"
                         )
                         os.remove(file_path)
-                        return
+                        return False
                     
                     download_time = int(asyncio.get_event_loop().time() - start_time)
-                    await query.message.edit_text("📤 جاري رفع الفيديو...")
+                    await message.edit_text("📤 جاري رفع الفيديو...")
                     
-                    # Get video info for better metadata
-                    video_info = await self.downloader.get_video_info(url)
-                    title = video_info.get('title', 'فيديو') if video_info else 'فيديو'
-                    duration = video_info.get('duration') if video_info else None
-                    width = video_info.get('width') if video_info else None
-                    height = video_info.get('height') if video_info else None
-                    thumbnail_url = video_info.get('thumbnail') if video_info else None
+                    # Faststart MP4 for instant playback; duration/dimensions come from the file itself
+                    with tracer.span('postprocess'):
+                        file_path, media = await prepare_for_streaming(file_path)
+                    file_size = os.path.getsize(file_path)
+                    title = self.job_title(url, formats_info, 'فيديو')
+                    duration = media.get('duration')
+                    width = media.get('width')
+                    height = media.get('height')
+                    with tracer.span('thumbnail'):
+                        thumb_path = await thumbnail_for(file_path, duration, (formats_info or {}).get('thumbnail'))
+                    thumb = None
+                    if thumb_path:
+                        with open(thumb_path, 'rb') as f:
+                            thumb = f.read()
+                    if before_upload:
+                        await before_upload()
+                        await message.edit_text("📤 جاري رفع الفيديو...")
                     
                     # Create enhanced caption
                     caption = f"🎥 *{title[:50]}*\n\n"
@@ -787,74 +1108,82 @@ class TelegramVideoBot:
                     caption += f"📦 الحجم: {format_file_size(file_size)}\n"
                     caption += f"⚡ وقت التحميل: {download_time}s"
                     
-                    # Download thumbnail if available
-                    thumbnail_file = None
-                    if thumbnail_url:
-                        try:
-                            import requests
-                            thumbnail_response = requests.get(thumbnail_url, timeout=10)
-                            if thumbnail_response.status_code == 200:
-                                thumbnail_file = thumbnail_response.content
-                        except Exception as e:
-                            logger.info(f"Could not download thumbnail: {e}")
-                    
                     if self.uploader:
                         try:
-                            await self.uploader.send_video(
-                                chat_id=query.message.chat.id,
-                                file_path=file_path,
-                                caption=caption,
-                                duration=duration,
-                                width=width,
-                                height=height,
-                                parse_mode='Markdown',
-                            )
+                            with tracer.span('upload', via='pyrogram', bytes=file_size):
+                                await self.uploader.send_video(
+                                    chat_id=message.chat.id,
+                                    file_path=file_path,
+                                    caption=caption,
+                                    duration=duration,
+                                    width=width,
+                                    height=height,
+                                    parse_mode='Markdown',
+                                    thumb=thumb_path,
+                                )
                         except Exception as e:
                             logger.warning(f"Pyrogram send_video failed, falling back to Bot API: {e}")
-                            with open(file_path, 'rb') as video_file:
+                            await bandwidth.admit(EGRESS, file_size)
+                            with tracer.span('upload', via='bot_api', bytes=file_size), open(file_path, 'rb') as video_file:
                                 await context.bot.send_video(
-                                    chat_id=query.message.chat.id,
+                                    chat_id=message.chat.id,
                                     video=video_file,
                                     caption=caption,
                                     supports_streaming=True,
                                     duration=duration,
                                     width=width,
                                     height=height,
+                                    thumbnail=thumb,
                                     parse_mode='Markdown'
                                 )
                     else:
-                        with open(file_path, 'rb') as video_file:
+                        await bandwidth.admit(EGRESS, file_size)
+                        with tracer.span('upload', via='bot_api', bytes=file_size), open(file_path, 'rb') as video_file:
                             await context.bot.send_video(
-                                chat_id=query.message.chat.id,
+                                chat_id=message.chat.id,
                                 video=video_file,
                                 caption=caption,
                                 supports_streaming=True,
                                 duration=duration,
                                 width=width,
                                 height=height,
+                                thumbnail=thumb,
                                 parse_mode='Markdown'
                             )
-                    await query.message.delete()
+                    await message.delete()
                     os.remove(file_path)
                     
                     # Send thank you message with share button
-                    await self.send_thank_you_message(context, query.message.chat.id)
+                    if announce:
+                        await self.send_thank_you_message(context, message.chat.id)
+                    return True
                 else:
-                    await query.message.edit_text("❌ فشل تحميل الفيديو\n💡 جرب رابطاً آخر أو اختر جودة مختلفة")
+                    await message.edit_text("❌ فشل تحميل الفيديو\n💡 جرب رابطاً آخر أو اختر جودة مختلفة")
                     
         except Exception as e:
             logger.error(f"Error downloading {format_type}: {str(e)}")
-            await query.message.edit_text(
+            await message.edit_text(
                 f"❌ حدث خطأ أثناء التحميل\n"
                 f"💡 جرب مرة أخرى أو استخدم رابطاً مختلفاً"
             )
+        return False
 
     async def handle_url(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle video URL messages and playlists"""
-        url = update.message.text.strip()
-        
+        text = update.message.text.strip()
+        urls = extract_urls_from_text(text)
+        if len(urls) > 1:
+            await self.handle_urls(update, context, urls)
+            return
+        # A link inside other text is used on its own; text without one still gets the validation reply
+        url = urls[0] if urls else text
+
+        # One canonical form per video (short links resolved, tracking params dropped)
+        url = await normalize_url(url)
+        cls = classify_url(url)
+
         # Validate URL
-        if not is_valid_url(url):
+        if not cls.valid:
             platform_list = '\n'.join([f'• {platform}' for platform in SUPPORTED_PLATFORMS])
             await update.message.reply_text(
                 f"❌ Please send a valid video URL from one of the supported platforms:\n{platform_list}"
@@ -862,14 +1191,12 @@ class TelegramVideoBot:
             return
 
         # Check if it's a playlist URL
-        is_playlist = await self.downloader.is_playlist_url(url)
-        
-        if is_playlist:
+        if cls.kind != VIDEO:
             await self.handle_playlist_url(update, context, url)
             return
 
         # Special handling for Snapchat URLs
-        if 'snapchat.com' in url.lower() or 'spotlight' in url.lower():
+        if cls.platform == 'snapchat':
             await update.message.reply_text(
                 "👻 *رابط Snapchat مكتشف!*\n\n"
                 "⚠️ للأسف، Snapchat يحمي محتواه بحماية قوية\n"
@@ -884,9 +1211,7 @@ class TelegramVideoBot:
             return
 
         # Check if URL is from supported platform
-        if not any(platform.lower() in url.lower() for platform in 
-                  ['youtube.com', 'youtu.be', 'twitter.com', 'x.com', 'instagram.com', 
-                   'facebook.com', 'fb.watch', 'tiktok.com']):
+        if cls.platform is None:
             platform_list = '\n'.join([f'• {platform}' for platform in SUPPORTED_PLATFORMS])
             await update.message.reply_text(
                 f"❌ هذه المنصة غير مدعومة حالياً. الرجاء استخدام روابط من:\n{platform_list}"
@@ -904,26 +1229,45 @@ class TelegramVideoBot:
             "🎬 تحضير المعاينة..."
         ]
         
+        # Full format resolution starts right away; a quick probe (where available) renders the menu first
+        full_task = asyncio.ensure_future(self.downloader.get_available_formats(url))
+        quick_task = asyncio.ensure_future(
+            self.metadata_probe.probe(url, cls.platform) if self.metadata_probe else asyncio.sleep(0)
+        )
         processing_msg = await update.message.reply_text(processing_frames[0])
         
         try:
-            # Animate processing
-            for i, frame in enumerate(processing_frames[1:], 1):
-                await asyncio.sleep(0.8)
-                await processing_msg.edit_text(frame)
+            # Animate processing until the first menu can be shown
+            with tracer.span('processing_animation'):
+                for i, frame in enumerate(processing_frames[1:], 1):
+                    if quick_task.done() and (quick_task.result() or full_task.done()):
+                        break
+                    await asyncio.sleep(0.8)
+                    await processing_msg.edit_text(frame)
             
             # Get video info and available formats
-            formats_info = await self.downloader.get_available_formats(url)
+            formats_info = await quick_task
+            if formats_info:
+                metrics.inc('format_menu_quick_total')
+            else:
+                formats_info = await full_task
             
             if not formats_info:
                 await processing_msg.edit_text("❌ Could not get video information. Please check the URL and try again.")
                 return
             
-            # Store URL for callback handling
-            context.user_data['current_url'] = url
+            # Store URL and formats for callback handling and job cost estimates
+            user_id = update.effective_user.id
+            self.sessions.set_menu(user_id, url, formats_info)
             
             # Show format selection menu
-            await self.show_format_selection(processing_msg, formats_info)
+            await self.show_format_selection(processing_msg, formats_info, url)
+            if formats_info.get('partial'):
+                self.quick_menus[(processing_msg.chat.id, processing_msg.message_id)] = url
+                full_task.add_done_callback(lambda task: asyncio.ensure_future(
+                    self._replace_quick_menu(processing_msg, user_id, url, task)))
+            if self.prefetcher:
+                self.prefetcher.start_for_menu(update.effective_chat.id, update.effective_user.id, url, formats_info)
                 
         except Exception as e:
             logger.error(f"Error processing URL {url}: {str(e)}")
@@ -932,6 +1276,118 @@ class TelegramVideoBot:
                 "Please check the URL and try again."
             )
 
+    async def _replace_quick_menu(self, message, user_id: int, url: str, task: asyncio.Future) -> None:
+        """Swap the quick-probe menu for the real format ladder once background resolution finishes.
+
+        The stored formats are always updated; the message itself only while
+        nobody has pressed one of its buttons. A link without a video (a text
+        tweet, say) gets its quick menu replaced by an error.
+        """
+        formats_info = None if task.cancelled() or task.exception() else task.result()
+        if formats_info:
+            self.sessions.update_menu_formats(user_id, url, formats_info)
+        if self.quick_menus.pop((message.chat.id, message.message_id), None) is None:
+            return
+        try:
+            if formats_info and formats_info.get('video_formats'):
+                await self.show_format_selection(message, formats_info, url, preview=False)
+            else:
+                await message.edit_text("❌ لم يتم العثور على فيديو في هذا الرابط.")
+        except Exception as e:
+            logger.debug(f"Could not replace quick menu for {url}: {e}")
+
+    async def handle_urls(self, update: Update, context: ContextTypes.DEFAULT_TYPE, urls) -> None:
+        """Download every link of a multi-link message concurrently, reporting in one status message.
+
+        Each link becomes a journaled job in the preferred video format; the
+        scheduler's per-user limit decides how many of them run at once.
+        """
+        chat_id = update.effective_chat.id
+        user_id = update.effective_user.id
+        urls = list(dict.fromkeys(urls))
+        ignored = len(urls) - MAX_URLS_PER_MESSAGE
+        urls = urls[:MAX_URLS_PER_MESSAGE]
+
+        status_msg = await update.message.reply_text(f"🔄 جاري تحليل {len(urls)} روابط...")
+        title = "📥 تحميل عدة روابط"
+        if ignored > 0:
+            title += f" (تم تجاهل {ignored} روابط زائدة)"
+        board = BatchStatus(status_msg, title)
+
+        normalized = await asyncio.gather(*(normalize_url(url) for url in urls))
+        jobs = []
+        seen = set()
+        for url in normalized:
+            cls = classify_url(url)
+            line = board.add(f"{cls.platform or '?'}: {cls.video_id or url[:60]}")
+            if url in seen:
+                line.skip("رابط مكرر")
+            elif not cls.valid:
+                line.skip("رابط غير صالح")
+            elif cls.platform is None:
+                line.skip("منصة غير مدعومة")
+            elif cls.platform == 'snapchat':
+                line.skip("Snapchat غير مدعوم حالياً")
+            elif cls.kind != VIDEO:
+                line.skip("قائمة تشغيل: أرسلها في رسالة منفصلة")
+            else:
+                jobs.append((line, url, 'video', BATCH_VIDEO_FORMAT))
+            seen.add(url)
+        logger.info(f"Multi-link message from {user_id}: {len(jobs)} jobs out of {len(urls)} links")
+        await self.run_batch(context, chat_id, user_id, board, jobs)
+
+    async def run_playlist_batch(self, context, query, playlist, entries, format_type: str, format_id: str) -> None:
+        """Download playlist entries as one batch in the playlist's message, at most PLAYLIST_BATCH_MAX of them"""
+        title = f"📋 {(playlist.title or 'قائمة تشغيل')[:60]}"
+        ignored = len(entries) - PLAYLIST_BATCH_MAX
+        if ignored > 0:
+            title += f" (أول {PLAYLIST_BATCH_MAX}، تم تجاهل {ignored})"
+            entries = entries[:PLAYLIST_BATCH_MAX]
+        board = BatchStatus(query.message, title)
+        jobs = []
+        for entry in entries:
+            line = board.add(entry.title[:60])
+            if entry.url:
+                jobs.append((line, entry.url, format_type, format_id))
+            else:
+                line.skip("رابط غير متاح")
+        logger.info(f"Playlist {playlist.url}: {len(jobs)} {format_type} jobs from {query.from_user.id}")
+        await self.run_batch(context, query.message.chat.id, query.from_user.id, board, jobs)
+
+    async def run_batch(self, context, chat_id: int, user_id: int, board: BatchStatus, jobs) -> None:
+        """Run (status line, url, format type, format id) jobs concurrently, delivering files in batch order.
+
+        All jobs get the same cost estimate, so the scheduler starts them in
+        order and each one only waits for earlier jobs that are already running.
+        """
+        order = DeliveryOrder(len(jobs))
+
+        async def _run(position: int, line, url: str, format_type: str, format_id: str) -> bool:
+            async def _turn():
+                if not order.is_turn(position):
+                    await line.edit_text("⏳ تم التحميل، بانتظار إرسال ما قبله")
+                await order.wait_turn(position)
+
+            job_id = tracer.new_trace_id()
+            self.journal.create(job_id, chat_id, user_id, url, format_type, format_id)
+            try:
+                return await self.run_job(line, context, job_id, user_id, url, format_type, format_id,
+                                          announce=False, before_upload=_turn)
+            finally:
+                order.finish(position)
+
+        await board.flush()
+        results = await asyncio.gather(*(_run(position, *job) for position, job in enumerate(jobs)),
+                                       return_exceptions=True)
+        for (line, *_), result in zip(jobs, results):
+            if isinstance(result, Exception):
+                logger.error(f"Batch job failed: {result}")
+            line.finish(result is True)
+        await board.close()
+
+        if any(result is True for result in results):
+            await self.send_thank_you_message(context, chat_id)
+
     async def handle_playlist_url(self, update: Update, context: ContextTypes.DEFAULT_TYPE, url: str) -> None:
         """Handle playlist/channel URLs with video selection"""
         try:
@@ -967,35 +1423,9 @@ class TelegramVideoBot:
                 )
                 return
             
-            # Create selection interface with short callback data
-            # Store URL with a simple key
-            playlist_id = str(abs(hash(url)) % 9999)
-            context.user_data[f'pl_{playlist_id}'] = url
-            context.user_data[f'playlist_{playlist_id}'] = playlist_info
-            
-            keyboard = [
-                [InlineKeyboardButton("📥 تحميل الكل", callback_data=f"pl_all_{playlist_id}")],
-                [InlineKeyboardButton("🎯 اختيار فيديوهات محددة", callback_data=f"pl_select_{playlist_id}")],
-                [InlineKeyboardButton("🎵 تحميل الكل كصوت", callback_data=f"pl_audio_{playlist_id}")],
-                [InlineKeyboardButton("❌ إلغاء", callback_data="cancel")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            playlist_message = (
-                f"📋 **{playlist_info.get('title', 'قائمة تشغيل')}**\n\n"
-                f"👤 *القناة:* {playlist_info.get('uploader', 'غير محدد')}\n"
-                f"🎬 *عدد الفيديوهات:* {total_count}\n\n"
-                f"🎯 *اختر طريقة التحميل:*"
-            )
-            
-            await processing_message.edit_text(
-                playlist_message,
-                parse_mode='Markdown',
-                reply_markup=reply_markup
-            )
-            
-            # Store playlist info in context for later use
-            context.user_data[f'playlist_{url}'] = playlist_info
+            # Entries stay server-side; buttons only carry the playlist id
+            playlist = self.sessions.put_playlist(url, playlist_info)
+            await self.show_playlist_menu(processing_message, playlist)
             
         except Exception as e:
             logger.error(f"Error handling playlist URL {url}: {e}")
@@ -1005,38 +1435,44 @@ class TelegramVideoBot:
                 parse_mode='Markdown'
             )
 
-    async def show_video_selection(self, query, url: str, context) -> None:
+    async def show_playlist_menu(self, message, playlist) -> None:
+        """Show the download options for a stored playlist"""
+        playlist_id = playlist.playlist_id
+        keyboard = [
+            [InlineKeyboardButton("📥 تحميل الكل", callback_data=self.callbacks.data("playlist", mode="all", playlist_id=playlist_id))],
+            [InlineKeyboardButton("🎯 اختيار فيديوهات محددة", callback_data=self.callbacks.data("playlist", mode="select", playlist_id=playlist_id))],
+            [InlineKeyboardButton("🎵 تحميل الكل كصوت", callback_data=self.callbacks.data("playlist", mode="audio", playlist_id=playlist_id))],
+            [InlineKeyboardButton("❌ إلغاء", callback_data=self.callbacks.data("cancel"))]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        playlist_message = (
+            f"📋 **{playlist.title or 'قائمة تشغيل'}**\n\n"
+            f"👤 *القناة:* {playlist.uploader or 'غير محدد'}\n"
+            f"🎬 *عدد الفيديوهات:* {len(playlist.entries)}\n\n"
+            f"🎯 *اختر طريقة التحميل:*"
+        )
+        
+        await message.edit_text(
+            playlist_message,
+            parse_mode='Markdown',
+            reply_markup=reply_markup
+        )
+
+    async def show_video_selection(self, query, playlist) -> None:
         """Show video selection interface for playlist"""
         try:
-            # Find playlist_id from stored data
-            playlist_id = None
-            for key in context.user_data:
-                if key.startswith('pl_') and context.user_data[key] == url:
-                    playlist_id = key.replace('pl_', '')
-                    break
-            
-            if not playlist_id:
-                await query.message.edit_text("❌ انتهت صلاحية قائمة التشغيل، يرجى إرسال الرابط مرة أخرى")
-                return
-                
-            playlist_info = context.user_data.get(f'playlist_{playlist_id}')
-            if not playlist_info:
-                await query.message.edit_text("❌ انتهت صلاحية قائمة التشغيل، يرجى إرسال الرابط مرة أخرى")
-                return
-            
-            entries = playlist_info.get('entries', [])
-            page = 0
-            videos_per_page = 10
-            
             # Show first page of videos
-            await self.show_video_page(query.message, entries, page, videos_per_page, playlist_id)
+            await self.show_video_page(query.message, playlist, 0)
             
         except Exception as e:
             logger.error(f"Error showing video selection: {e}")
             await query.message.edit_text("❌ خطأ في عرض الفيديوهات")
 
-    async def show_video_page(self, message, entries, page, videos_per_page, url):
+    async def show_video_page(self, message, playlist, page, videos_per_page=PLAYLIST_PAGE_SIZE, notice: str = ''):
         """Show a page of videos for selection"""
+        entries = playlist.entries
+        playlist_id = playlist.playlist_id
         start_idx = page * videos_per_page
         end_idx = min(start_idx + videos_per_page, len(entries))
         page_entries = entries[start_idx:end_idx]
@@ -1045,61 +1481,49 @@ class TelegramVideoBot:
         
         # Video selection buttons
         for entry in page_entries:
-            title = entry.get('title', 'فيديو')[:40]
-            duration = entry.get('duration')
-            duration_text = f" ({duration//60}:{duration%60:02d})" if duration else ""
+            title = entry.title[:40]
+            duration = entry.duration
+            duration_text = f" ({int(duration)//60}:{int(duration)%60:02d})" if duration else ""
             
-            button_text = f"📹 {entry['index']}. {title}{duration_text}"
+            mark = "✅" if playlist.is_selected(entry.index) else "📹"
+            button_text = f"{mark} {entry.index}. {title}{duration_text}"
             keyboard.append([InlineKeyboardButton(
                 button_text, 
-                callback_data=f"vid_{entry['index']}_{url[-4:]}"
+                callback_data=self.callbacks.data("playlist_video", playlist_id=playlist_id, index=entry.index, page=page)
             )])
         
         # Navigation buttons
         nav_buttons = []
         if page > 0:
-            nav_buttons.append(InlineKeyboardButton("⬅️ السابق", callback_data=f"page_{page-1}_{url}"))
+            nav_buttons.append(InlineKeyboardButton("⬅️ السابق", callback_data=self.callbacks.data("playlist_page", playlist_id=playlist_id, page=page - 1)))
         if end_idx < len(entries):
-            nav_buttons.append(InlineKeyboardButton("التالي ➡️", callback_data=f"page_{page+1}_{url}"))
+            nav_buttons.append(InlineKeyboardButton("التالي ➡️", callback_data=self.callbacks.data("playlist_page", playlist_id=playlist_id, page=page + 1)))
         
         if nav_buttons:
             keyboard.append(nav_buttons)
         
         # Action buttons
         keyboard.append([
-            InlineKeyboardButton("✅ تحميل المحددة", callback_data=f"download_selected_{url}"),
-            InlineKeyboardButton("🔄 إلغاء التحديد", callback_data=f"clear_selection_{url}")
+            InlineKeyboardButton("✅ تحميل المحددة", callback_data=self.callbacks.data("playlist_download_selected", playlist_id=playlist_id)),
+            InlineKeyboardButton("🔄 إلغاء التحديد", callback_data=self.callbacks.data("playlist_clear_selection", playlist_id=playlist_id, page=page))
         ])
-        keyboard.append([InlineKeyboardButton("🔙 العودة", callback_data=f"back_to_playlist_{url}")])
+        keyboard.append([InlineKeyboardButton("🔙 العودة", callback_data=self.callbacks.data("playlist_back", playlist_id=playlist_id))])
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         info_text = (
             f"🎯 *اختر الفيديوهات للتحميل*\n\n"
             f"📄 *الصفحة {page + 1} من {(len(entries) - 1) // videos_per_page + 1}*\n"
-            f"🎬 *الفيديوهات {start_idx + 1}-{end_idx} من {len(entries)}*\n\n"
-            f"💡 *اضغط على الفيديوهات لتحديدها*"
+            f"🎬 *الفيديوهات {start_idx + 1}-{end_idx} من {len(entries)}*\n"
+            f"✅ *المحددة:* {len(playlist.selected_entries())}\n\n"
+            f"{notice or '💡 *اضغط على الفيديوهات لتحديدها*'}"
         )
         
         await message.edit_text(info_text, parse_mode='Markdown', reply_markup=reply_markup)
 
     def detect_platform(self, url: str) -> str:
         """Detect platform from URL"""
-        url_lower = url.lower()
-        if 'youtube.com' in url_lower or 'youtu.be' in url_lower:
-            return 'youtube'
-        elif 'tiktok.com' in url_lower:
-            return 'tiktok'
-        elif 'instagram.com' in url_lower:
-            return 'instagram'
-        elif 'facebook.com' in url_lower or 'fb.watch' in url_lower:
-            return 'facebook'
-        elif 'twitter.com' in url_lower or 'x.com' in url_lower:
-            return 'twitter'
-        elif 'snapchat.com' in url_lower:
-            return 'snapchat'
-        else:
-            return 'unknown'
+        return detect_url_platform(url)
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle non-URL messages"""
@@ -1113,15 +1537,16 @@ class TelegramVideoBot:
             await self.forward_support_message(update, context, text)
             return
         
-        if text and any(keyword in text.lower() for keyword in ['http', 'www', '.com', '.ly']):
+        if looks_like_url(text):
             # Looks like a URL, handle it
-            await self.handle_url(update, context)
+            with tracer.span('handle_url', trace_id=tracer.new_trace_id()):
+                await self.handle_url(update, context)
         else:
             # Send interactive help message
             help_keyboard = [
-                [InlineKeyboardButton("📚 كيفية الاستخدام", callback_data="help")],
-                [InlineKeyboardButton("🌐 المنصات المدعومة", callback_data="features")],
-                [InlineKeyboardButton("💡 أمثلة للروابط", callback_data="examples")]
+                [InlineKeyboardButton("📚 كيفية الاستخدام", callback_data=self.callbacks.data("help"))],
+                [InlineKeyboardButton("🌐 المنصات المدعومة", callback_data=self.callbacks.data("features"))],
+                [InlineKeyboardButton("💡 أمثلة للروابط", callback_data=self.callbacks.data("examples"))]
             ]
             reply_markup = InlineKeyboardMarkup(help_keyboard)
             
@@ -1138,22 +1563,23 @@ class TelegramVideoBot:
     
 
 
-    def run(self):
-        """Run the bot"""
-        # Create application with post init/shutdown to manage Pyrogram client
-        async def _post_init(app: Application):
-            if self.uploader:
-                await self.uploader.start()
-
-        async def _post_shutdown(app: Application):
-            if self.uploader:
-                await self.uploader.stop()
+    async def log_first_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Report time-to-first-update once; cold start matters when containers get rescheduled"""
+        if self._first_update_seen:
+            return
+        self._first_update_seen = True
+        elapsed = time.monotonic() - STARTED_AT
+        metrics.set_gauge('startup_first_update_seconds', elapsed)
+        logger.info(f"First update received {elapsed:.2f}s after start")
 
-        application = Application.builder().token(BOT_TOKEN).post_init(_post_init).post_shutdown(_post_shutdown).build()
-        
-        # Add handlers
+    def register_handlers(self, application: Application) -> None:
+        """Attach command, callback, message and error handlers to an application"""
+        application.add_handler(TypeHandler(Update, self.log_first_update), group=-1)
         application.add_handler(CommandHandler("start", self.start_command))
         application.add_handler(CommandHandler("help", self.help_command))
+        application.add_handler(CommandHandler("trace", self.trace_command))
+        application.add_handler(CommandHandler("loop", self.loop_command))
+        application.add_handler(CommandHandler("metrics", self.metrics_command))
         application.add_handler(CallbackQueryHandler(self.button_callback))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
         
@@ -1167,10 +1593,47 @@ class TelegramVideoBot:
                 )
         
         application.add_error_handler(error_handler)
+
+    def run(self):
+        """Run the bot"""
+        # Create application with post init/shutdown to manage Pyrogram client
+        async def _post_init(app: Application):
+            self.loop_monitor.start()
+            # Menus, playlists and button tokens survive restarts as per-key rows; loaded before the first update
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.sessions.restore, app.persistence)
+            await loop.run_in_executor(None, self.callbacks.restore, app.persistence)
+            # Heavy initialization runs in the background instead of delaying the first update:
+            # yt-dlp is imported by the warm-up (or the first extraction), stats files are read
+            # in a thread and Pyrogram connects on its first upload
+            app.create_task(self.downloader.warm_up())
+            loop.run_in_executor(None, self.stats.preload)
+            if self.prefetcher:
+                loop.run_in_executor(None, self.prefetcher.predictor.user_stats.preload)
+            await self.resume_interrupted_jobs(app)
+            ready = time.monotonic() - STARTED_AT
+            metrics.set_gauge('startup_ready_seconds', ready)
+            logger.info(f"Ready to receive updates {ready:.2f}s after start")
+
+        async def _post_shutdown(app: Application):
+            await self.loop_monitor.stop()
+            if self.prefetcher:
+                await self.prefetcher.predictor.flush()
+            if self.uploader:
+                await self.uploader.stop()
+
+        builder = Application.builder().token(BOT_TOKEN).post_init(_post_init).post_shutdown(_post_shutdown)
+        builder = builder.persistence(SQLitePersistence(STATE_PATH))
+        if CONCURRENT_UPDATES > 1:
+            # Long downloads must not block other users' updates; JobScheduler bounds the heavy work
+            builder = builder.concurrent_updates(CONCURRENT_UPDATES)
+        application = builder.build()
+        self.register_handlers(application)
         
-        # Cleanup temp files on shutdown
+        # Cleanup finished jobs' files on shutdown; interrupted ones are resumed on next start
         def cleanup_on_shutdown():
-            cleanup_temp_files(self.temp_dir)
+            self.cleanup_work_dir()
+            self.journal.close()
         
         # Start the bot
         logger.info("Starting bot...")
@@ -0,0 +1,104 @@
+"""
+Compact callback_data for inline buttons: short tokens mapped to server-side action payloads
+"""
+
+import base64
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from metrics import metrics
+
+# Telegram rejects callback_data longer than this many bytes
+CALLBACK_DATA_MAX = 64
+
+# callback_data starting with this is a token; anything else is a plain action name
+TOKEN_PREFIX = '~'
+TOKEN_BYTES = 6  # 8 base64 characters
+
+
+class _Entry:
+    __slots__ = ('action', 'payload', 'expires')
+
+    def __init__(self, action: str, payload: Dict[str, Any], expires: float):
+        self.action = action
+        self.payload = payload
+        self.expires = expires
+
+
+class CallbackTokens:
+    """Registry of inline-button actions.
+
+    Buttons without arguments use the action name itself as callback_data,
+    so static menus keep working indefinitely. Only names listed in
+    ``static_actions`` are accepted that way; any other plain callback_data
+    (stale or foreign buttons) resolves to None like an expired token.
+    Buttons with arguments get a random 8-character token whose payload
+    (URLs, format ids, playlist ids) stays on the server, so callback_data
+    never exceeds Telegram's 64 bytes and is never parsed. Tokens expire after ``ttl`` seconds; a freshly drawn
+    token that is already registered is redrawn. After ``restore`` each token
+    is also queued as its own row in ``SQLitePersistence`` so buttons survive
+    restarts.
+    """
+
+    def __init__(self, static_actions: Iterable[str] = (), ttl: float = 6 * 3600, max_entries: int = 200000):
+        self.static_actions = frozenset(static_actions)
+        for action in self.static_actions:
+            if action.startswith(TOKEN_PREFIX) or len(action.encode()) > CALLBACK_DATA_MAX:
+                raise ValueError(f"Invalid callback action {action!r}")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._rows = None
+
+    def restore(self, persistence) -> None:
+        """Load the unexpired tokens from a SQLitePersistence and queue new ones to it"""
+        now = time.time()
+        for token, (action, payload), expires in persistence.load_sessions('token', now):
+            self._entries[token] = _Entry(action, payload, expires)
+        self._rows = persistence
+        self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        while self._entries:
+            token, entry = next(iter(self._entries.items()))
+            if entry.expires > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[token]
+            if self._rows:
+                self._rows.delete('token', token)
+
+    def data(self, action: str, **payload) -> str:
+        """callback_data for a button running action with payload"""
+        if not payload:
+            if action not in self.static_actions:
+                raise ValueError(f"Callback action {action!r} takes a payload or is not a static action")
+            return action
+        now = time.time()
+        self._evict(now)
+        while True:
+            token = base64.urlsafe_b64encode(secrets.token_bytes(TOKEN_BYTES)).decode()
+            if token not in self._entries:
+                break
+            metrics.inc('callback_token_collisions_total')
+        entry = self._entries[token] = _Entry(action, payload, now + self.ttl)
+        if self._rows:
+            self._rows.put('token', token, (action, payload), entry.expires)
+        return TOKEN_PREFIX + token
+
+    def resolve(self, data: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """(action, payload) for a button's callback_data, or None if its token has expired or it is unknown"""
+        if not data.startswith(TOKEN_PREFIX):
+            if data in self.static_actions:
+                return data, {}
+            metrics.inc('callback_unknown_data_total')
+            return None
+        entry = self._entries.get(data[len(TOKEN_PREFIX):])
+        if entry is None or entry.expires <= time.time():
+            metrics.inc('callback_token_misses_total')
+            return None
+        return entry.action, entry.payload
+
+    def __len__(self) -> int:
+        return len(self._entries)
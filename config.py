@@ -33,12 +33,58 @@ SUPPORTED_PLATFORMS: List[str] = [
 DOWNLOAD_TIMEOUT = 300  # 5 minutes
 MAX_RETRIES = 3
 
+# Admin users allowed to run diagnostic commands (comma-separated Telegram user IDs)
+ADMIN_USER_IDS: List[int] = [
+    int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip().isdigit()
+]
+
 # Logging Configuration
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Tracing: per-job spans kept in memory for /trace, optionally appended as JSON lines
+TRACE_FILE = os.getenv("TRACE_FILE")  # e.g. "/app/data/traces.jsonl" or empty
+TRACE_MAX_TRACES = int(os.getenv("TRACE_MAX_TRACES", "200"))
+
+# Event-loop health monitor
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.25"))  # seconds between lag samples
+# Debug mode captures stack traces of callbacks blocking the loop longer than the threshold
+LOOP_MONITOR_DEBUG = os.getenv("LOOP_MONITOR_DEBUG", "false").lower() == "true"
+LOOP_BLOCK_THRESHOLD_MS = int(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "200"))
+
 # yt-dlp concurrency tuning
 YTDLP_CONCURRENT_FRAGMENTS = int(os.getenv("YTDLP_CONCURRENT_FRAGMENTS", "4"))
 YTDLP_BUFFERSIZE = int(os.getenv("YTDLP_BUFFERSIZE", "1048576"))  # 1 MiB
 YTDLP_HTTP_CHUNK_SIZE = os.getenv("YTDLP_HTTP_CHUNK_SIZE")  # e.g. "10M" or empty
+# Adaptive tuning picks fragments/chunk size per job from measured per-platform throughput;
+# the fixed values above are used when disabled and as defaults before history exists
+YTDLP_ADAPTIVE = os.getenv("YTDLP_ADAPTIVE", "true").lower() == "true"
+YTDLP_MIN_FRAGMENTS = int(os.getenv("YTDLP_MIN_FRAGMENTS", "1"))
+YTDLP_MAX_FRAGMENTS = int(os.getenv("YTDLP_MAX_FRAGMENTS", "16"))
+YTDLP_TOTAL_FRAGMENTS = int(os.getenv("YTDLP_TOTAL_FRAGMENTS", "32"))  # shared by all active downloads
+LINK_CAPACITY_MBPS = float(os.getenv("LINK_CAPACITY_MBPS", "0"))  # downlink capacity in Mbit/s, 0 = unknown
+
+# Bandwidth shaping (Mbit/s, 0 = unlimited); capacity is split between active jobs
+# by weight, and jobs past BANDWIDTH_BOOST_AT progress get BANDWIDTH_BOOST_WEIGHT times more
+BANDWIDTH_INGRESS_MBPS = float(os.getenv("BANDWIDTH_INGRESS_MBPS", "0"))
+BANDWIDTH_EGRESS_MBPS = float(os.getenv("BANDWIDTH_EGRESS_MBPS", "0"))
+BANDWIDTH_BOOST_AT = float(os.getenv("BANDWIDTH_BOOST_AT", "0.8"))
+BANDWIDTH_BOOST_WEIGHT = float(os.getenv("BANDWIDTH_BOOST_WEIGHT", "2.0"))
+
+# Job scheduling: updates are handled concurrently, downloads run in a bounded number of
+# slots ordered by estimated size (shortest first); waiting jobs gain priority over time
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "32"))  # 1 = sequential
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "3"))
+MAX_JOBS_PER_USER = int(os.getenv("MAX_JOBS_PER_USER", "2"))
+SCHEDULER_AGING_MB_PER_S = float(os.getenv("SCHEDULER_AGING_MB_PER_S", "2"))
+# Show the format menu from a quick oEmbed probe while full format resolution runs in the background
+METADATA_PROBE = os.getenv("METADATA_PROBE", "true").lower() == "true"
+# Opt-in: start downloading the format a user most likely picks while the menu is open
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "false").lower() == "true"
+PREFETCH_MAX_ACTIVE = int(os.getenv("PREFETCH_MAX_ACTIVE", "1"))
+# Links beyond this many in one message are ignored
+MAX_URLS_PER_MESSAGE = int(os.getenv("MAX_URLS_PER_MESSAGE", "10"))
+# Videos downloaded by a playlist's "download all" (video or audio); the rest are skipped
+PLAYLIST_BATCH_MAX = int(os.getenv("PLAYLIST_BATCH_MAX", "20"))
 
 
 # Cookies / Authentication Configuration
@@ -66,6 +112,35 @@ PREFERRED_FORMATS = [
 
 # Temporary Directory Settings
 TEMP_DIR_PREFIX = "telegram_video_bot_"
+
+# Persistent data (mounted as a volume in docker-compose) and per-job work directories
+DATA_DIR = os.getenv("DATA_DIR", "data")
+WORK_DIR = os.getenv("WORK_DIR", os.path.join(DATA_DIR, "work"))
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", os.path.join(DATA_DIR, "jobs.sqlite3"))
+# Open format menus and playlists (SQLite rows in STATE_PATH) and how long they stay usable
+STATE_PATH = os.getenv("STATE_PATH", os.path.join(DATA_DIR, "state.sqlite3"))
+SESSION_TTL_HOURS = float(os.getenv("SESSION_TTL_HOURS", "6"))
+# Interrupted jobs are resumed on startup unless older than this or retried too often
+JOB_RESUME_MAX_AGE_HOURS = float(os.getenv("JOB_RESUME_MAX_AGE_HOURS", "24"))
+JOB_RESUME_MAX_ATTEMPTS = int(os.getenv("JOB_RESUME_MAX_ATTEMPTS", "3"))
+
+# Threads for ffmpeg/ffprobe post-processing (faststart remux, media probing)
+POSTPROCESS_WORKERS = int(os.getenv("POSTPROCESS_WORKERS", "2"))
+# Videos above MAX_FILE_SIZE: "reject" asks for a lower quality, "encode" re-encodes with
+# x264 to fit (CPU heavy; check encode_speed_x_realtime in /metrics before enabling),
+# "split" stream-copies the video into keyframe-aligned parts (almost no CPU)
+OVERSIZE_MODE = os.getenv("OVERSIZE_MODE", "reject").lower()
+ENCODE_PRESET = os.getenv("ENCODE_PRESET", "veryfast")
+ENCODE_TIME_BUDGET = float(os.getenv("ENCODE_TIME_BUDGET", "600"))  # seconds per encode
+SPLIT_MAX_PARTS = int(os.getenv("SPLIT_MAX_PARTS", "10"))
+# "group" sends the parts as one album (up to 10), "messages" as separate numbered messages
+SPLIT_UPLOAD = os.getenv("SPLIT_UPLOAD", "group").lower()
+SPLIT_UPLOAD_CONCURRENCY = int(os.getenv("SPLIT_UPLOAD_CONCURRENCY", "3"))
+
+# Cross-user media cache keyed by (extractor, video id, format); 0 disables it.
+# Keep it on the same filesystem as WORK_DIR so files are handed to jobs as hardlinks.
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", os.path.join(DATA_DIR, "cache"))
+MEDIA_CACHE_MAX_GB = float(os.getenv("MEDIA_CACHE_MAX_GB", "5"))
 CLEANUP_INTERVAL = 3600  # 1 hour in seconds
 
 # Rate Limiting (if needed in future)
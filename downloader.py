@@ -3,14 +3,42 @@ Video downloader module using yt-dlp
 """
 
 import os
+import time
 import asyncio
-import yt_dlp
+import subprocess
+import threading
 import logging
 import base64
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple, Callable
+from tracing import tracer, traced, Span
+from transfer_tuner import TransferTuner, TransferJob
+from bandwidth import bandwidth, BandwidthShare, INGRESS
+from media_cache import build_media_cache
+from url_canon import match_id
+from url_classifier import VIDEO, classify_url
+from format_selector import build_ladder
+from metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+_yt_dlp = None
+_yt_dlp_lock = threading.Lock()
+
+
+def load_yt_dlp():
+    """yt_dlp, imported on first use: the import (extractor registry included) dominates cold start"""
+    global _yt_dlp
+    if _yt_dlp is None:
+        with _yt_dlp_lock:
+            if _yt_dlp is None:
+                started = time.perf_counter()
+                import yt_dlp
+                metrics.set_gauge('startup_import_seconds', time.perf_counter() - started, module='yt_dlp')
+                _yt_dlp = yt_dlp
+    return _yt_dlp
+
+
 class VideoDownloader:
     def __init__(self):
         # Configure yt-dlp options
@@ -18,6 +46,11 @@ class VideoDownloader:
             YTDLP_CONCURRENT_FRAGMENTS,
             YTDLP_BUFFERSIZE,
             YTDLP_HTTP_CHUNK_SIZE,
+            YTDLP_ADAPTIVE,
+            YTDLP_MIN_FRAGMENTS,
+            YTDLP_MAX_FRAGMENTS,
+            YTDLP_TOTAL_FRAGMENTS,
+            LINK_CAPACITY_MBPS,
         )
 
         self.ydl_opts = {
@@ -34,12 +67,31 @@ class VideoDownloader:
             'ignoreerrors': False,
             'socket_timeout': 30,
             'retries': 3,
+            'continuedl': True,
             'concurrent_fragment_downloads': YTDLP_CONCURRENT_FRAGMENTS,
             'buffersize': YTDLP_BUFFERSIZE,
         }
         if YTDLP_HTTP_CHUNK_SIZE:
             self.ydl_opts['http_chunk_size'] = YTDLP_HTTP_CHUNK_SIZE
+
+        # Per-job transfer tuning from measured throughput
+        self.tuner: Optional[TransferTuner] = None
+        if YTDLP_ADAPTIVE:
+            self.tuner = TransferTuner(
+                min_fragments=YTDLP_MIN_FRAGMENTS,
+                max_fragments=YTDLP_MAX_FRAGMENTS,
+                total_fragments=YTDLP_TOTAL_FRAGMENTS,
+                link_capacity_bps=LINK_CAPACITY_MBPS * 125000,
+                default_buffersize=YTDLP_BUFFERSIZE,
+                default_chunk_size=YTDLP_HTTP_CHUNK_SIZE,
+            )
         
+        # Shared on-disk cache of finished downloads
+        self.media_cache = build_media_cache()
+        # URL -> title from any extraction, so captions don't need another network round-trip
+        self._titles: "OrderedDict[str, str]" = OrderedDict()
+        self._titles_lock = threading.Lock()
+
         # Options for playlist extraction
         self.playlist_opts = {
             'quiet': True,
@@ -64,14 +116,24 @@ class VideoDownloader:
         self.cookies_file_path: Optional[str] = None
         self.cookies_raw: Optional[str] = None
 
+        self._cookie_sources = (COOKIES_FILE_PATH, COOKIES_B64, COOKIES_RAW)
+        self._cookies_loaded = False
+        self._warm_up: Optional[asyncio.Future] = None
+
+    def _load_cookies(self) -> None:
+        """Resolve the cookie source (decoding COOKIES_B64 to a file) on first use instead of at startup"""
+        if self._cookies_loaded:
+            return
+        self._cookies_loaded = True
+        file_path, b64, raw = self._cookie_sources
         if self.cookies_enabled:
             try:
-                if COOKIES_FILE_PATH and os.path.exists(COOKIES_FILE_PATH):
+                if file_path and os.path.exists(file_path):
                     self.cookies_mode = 'file'
-                    self.cookies_file_path = COOKIES_FILE_PATH
+                    self.cookies_file_path = file_path
                     logger.info("Cookies enabled: using COOKIES_FILE_PATH")
-                elif COOKIES_B64:
-                    decoded = base64.b64decode(COOKIES_B64)
+                elif b64:
+                    decoded = base64.b64decode(b64)
                     temp_path = os.path.join('/tmp', 'ytdlp_cookies_env.txt')
                     with open(temp_path, 'wb') as f:
                         f.write(decoded)
@@ -82,24 +144,37 @@ class VideoDownloader:
                     self.cookies_mode = 'file'
                     self.cookies_file_path = temp_path
                     logger.info("Cookies enabled: using COOKIES_B64 written to temp file")
-                elif COOKIES_RAW:
+                elif raw:
                     self.cookies_mode = 'raw'
-                    self.cookies_raw = COOKIES_RAW
+                    self.cookies_raw = raw
                     logger.info("Cookies enabled: using COOKIES_RAW header")
                 else:
                     logger.info("Cookies enabled but no source provided (FILE/B64/RAW).")
             except Exception as e:
                 logger.error(f"Failed to initialize cookies from env: {e}")
 
-        # If cookies should always apply, merge into default opts now
+        # If cookies should always apply, merge into the default opts
         if self.cookies_enabled and not self.cookies_apply_on_failure_only:
             self.ydl_opts = self._merge_cookie_opts(self.ydl_opts)
             self.playlist_opts = self._merge_cookie_opts(self.playlist_opts)
 
+    def _prepare(self) -> None:
+        started = time.perf_counter()
+        load_yt_dlp()
+        self._load_cookies()
+        logger.info(f"yt-dlp ready in {time.perf_counter() - started:.2f}s")
+
+    async def warm_up(self) -> None:
+        """Import yt-dlp and set up cookies off the event loop; every caller waits on the first run"""
+        if self._warm_up is None:
+            self._warm_up = asyncio.get_running_loop().run_in_executor(None, self._prepare)
+        await asyncio.shield(self._warm_up)
+
     def _merge_cookie_opts(self, opts: Dict[str, Any]) -> Dict[str, Any]:
         """Merge cookie configuration into yt-dlp options if configured."""
         if not self.cookies_enabled:
             return opts
+        self._load_cookies()
         merged = opts.copy()
         if self.cookies_mode == 'file' and self.cookies_file_path:
             merged['cookiefile'] = self.cookies_file_path
@@ -116,14 +191,189 @@ class VideoDownloader:
         if use_cookies:
             opts = self._merge_cookie_opts(opts)
         return opts
+
+    def _start_transfer(self, url: str, weight: float = 1.0) -> Tuple[Optional[TransferJob], Optional[BandwidthShare]]:
+        """Begin throughput tuning and bandwidth shaping for one download"""
+        job = self.tuner.start_job(url) if self.tuner else None
+        share = bandwidth.open_share(INGRESS, weight=weight, label=url)
+        return job, share
+
+    def _transfer_opts(self, job: Optional[TransferJob], share: Optional[BandwidthShare],
+                       cancel: Optional[threading.Event] = None,
+                       progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """yt-dlp options and progress hooks for a tuned/shaped (and optionally cancellable) download"""
+        opts: Dict[str, Any] = {}
+        hooks = []
+        if progress is not None:
+            hooks.append(progress)
+        if cancel is not None:
+            def _cancel_hook(d: Dict[str, Any]):
+                if cancel.is_set():
+                    raise load_yt_dlp().utils.DownloadCancelled('download cancelled')
+            hooks.append(_cancel_hook)
+        if job:
+            opts.update(job.overrides)
+            hooks.append(job.progress_hook)
+        if share:
+            # yt-dlp's limiter caps bursts at the link rate; the hook paces the job to its share
+            opts['ratelimit'] = share.pool.capacity
+            hooks.append(share.progress_hook)
+        if hooks:
+            opts['progress_hooks'] = hooks
+        return opts
+
+    def _finish_transfer(self, job: Optional[TransferJob], share: Optional[BandwidthShare], success: bool) -> None:
+        if job:
+            self.tuner.finish_job(job, success=success)
+        bandwidth.close_share(share)
+
+    def _cached_download(self, ydl, url: str, variant: str, output_dir: str, temp_name: str,
+                         locate: Callable[[], Optional[str]], parent: Optional[Span],
+                         derive: Optional[Callable[[Tuple[str, str]], Optional[str]]] = None) -> Optional[str]:
+        """Download url through the media cache (runs in a worker thread).
+
+        A hit is hardlinked into output_dir as temp_name. On a miss, derive
+        may build the file from other cached variants of the same source;
+        otherwise the extracted info is reused for the download. The result
+        is stored either way.
+        """
+        if not self.media_cache:
+            ydl.download([url])
+            return locate()
+
+        started = time.time()
+        info = None
+        # Learned from an earlier extraction, else the extractor's URL pattern
+        source = self.media_cache.source_for(url) or match_id(url)
+        if source is None:
+            info = ydl.extract_info(url, download=False)
+            if not info:
+                return None
+            source = self._remember_source(url, info)
+
+        key = self.media_cache.make_key(*source, variant)
+        cached = self.media_cache.checkout(key, output_dir, temp_name)
+        if cached:
+            tracer.record_span(parent, 'media_cache_hit', started, time.time(), variant=variant)
+            logger.info(f"Media cache hit for {url} ({variant})")
+            return cached
+
+        if derive:
+            derived = derive(source)
+            if derived:
+                self.media_cache.store(key, derived)
+                return derived
+
+        if info is None:
+            info = ydl.extract_info(url, download=False)
+            if not info:
+                return None
+            extracted = self._remember_source(url, info)
+            if extracted != source:
+                # URL pattern id differs from the extractor's; key the download by the latter
+                key = self.media_cache.make_key(*extracted, variant)
+        ydl.process_ie_result(info, download=True)
+        result = locate()
+        if result:
+            self.media_cache.store(key, result)
+        return result
+
+    def _remember_source(self, url: str, info: Dict[str, Any]) -> Tuple[str, str]:
+        source = (info.get('extractor_key') or info.get('extractor') or 'generic', str(info.get('id')))
+        self.media_cache.remember_source(url, *source)
+        self.remember_title(url, info)
+        return source
+
+    def remember_title(self, url: str, info: Dict[str, Any], max_entries: int = 5000) -> None:
+        if not info.get('title'):
+            return
+        with self._titles_lock:
+            self._titles[url] = info['title']
+            self._titles.move_to_end(url)
+            while len(self._titles) > max_entries:
+                self._titles.popitem(last=False)
+
+    def title_for(self, url: str) -> Optional[str]:
+        with self._titles_lock:
+            return self._titles.get(url)
+
+    def _audio_from_cached_video(self, source: Tuple[str, str], output_dir: str, temp_name: str,
+                                 bitrate: str, parent: Optional[Span]) -> Optional[str]:
+        """Extract MP3 locally from a cached video of the same source instead of fetching audio again"""
+        for fmt, _ in self.media_cache.variants(*source):
+            if fmt.startswith('mp3-'):
+                continue
+            # Hardlink first so eviction can't remove the source while ffmpeg reads it
+            video_path = self.media_cache.checkout(self.media_cache.make_key(*source, fmt), output_dir, 'source')
+            if not video_path:
+                continue
+            audio_path = os.path.join(output_dir, f'{temp_name}.mp3')
+            started = time.time()
+            try:
+                subprocess.run(
+                    ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', video_path,
+                     '-vn', '-map', '0:a:0', '-c:a', 'libmp3lame', '-b:a', f'{bitrate}k', '-ar', '44100', audio_path],
+                    check=True, capture_output=True, timeout=600,
+                )
+            except (OSError, subprocess.SubprocessError) as e:
+                # e.g. a video-only DASH format; try the next variant
+                logger.info(f"Local audio extraction from {fmt} failed: {e}")
+                if os.path.exists(audio_path):
+                    os.remove(audio_path)
+                continue
+            finally:
+                os.remove(video_path)
+            tracer.record_span(parent, 'ffmpeg:local_audio', started, time.time(), source_format=fmt)
+            logger.info(f"Derived audio from cached {source[0]} {source[1]} ({fmt}) without downloading")
+            return audio_path
+        return None
+
+    def _add_trace_hooks(self, opts: Dict[str, Any], parent: Optional[Span]) -> Dict[str, Any]:
+        """Return a copy of opts with yt-dlp hooks recording extract/download/postprocess spans"""
+        traced_opts = opts.copy()
+        if parent is None:
+            return traced_opts
+        state = {'started': time.time(), 'extracted': False, 'downloads': {}, 'postprocessors': {}}
+
+        def _progress_hook(d: Dict[str, Any]):
+            now = time.time()
+            if not state['extracted']:
+                state['extracted'] = True
+                tracer.record_span(parent, 'extract', state['started'], now)
+            filename = d.get('filename') or ''
+            if d.get('status') == 'downloading':
+                state['downloads'].setdefault(filename, now)
+            elif d.get('status') in ('finished', 'error'):
+                start = state['downloads'].pop(filename, now)
+                tracer.record_span(
+                    parent, 'download', start, now,
+                    file=os.path.basename(filename),
+                    bytes=d.get('total_bytes') or d.get('downloaded_bytes'),
+                    status=d.get('status'),
+                )
+
+        def _postprocessor_hook(d: Dict[str, Any]):
+            now = time.time()
+            name = d.get('postprocessor') or 'unknown'
+            if d.get('status') == 'started':
+                state['postprocessors'][name] = now
+            elif d.get('status') == 'finished':
+                start = state['postprocessors'].pop(name, now)
+                tracer.record_span(parent, f'ffmpeg:{name}', start, now)
+
+        traced_opts['progress_hooks'] = list(opts.get('progress_hooks', [])) + [_progress_hook]
+        traced_opts['postprocessor_hooks'] = list(opts.get('postprocessor_hooks', [])) + [_postprocessor_hook]
+        return traced_opts
     
+    @traced()
     async def get_video_info(self, url: str) -> Optional[Dict[str, Any]]:
         """Get video information without downloading"""
+        await self.warm_up()
         try:
             loop = asyncio.get_event_loop()
             
             def _get_info(opts: Dict[str, Any]):
-                with yt_dlp.YoutubeDL(opts) as ydl:
+                with load_yt_dlp().YoutubeDL(opts) as ydl:
                     return ydl.extract_info(url, download=False)
             
             info = None
@@ -156,13 +406,15 @@ class VideoDownloader:
             
         return None
 
+    @traced()
     async def get_available_formats(self, url: str) -> Optional[Dict[str, Any]]:
         """Get available video and audio formats"""
+        await self.warm_up()
         try:
             loop = asyncio.get_event_loop()
             
             def _get_formats(opts: Dict[str, Any]):
-                with yt_dlp.YoutubeDL(opts) as ydl:
+                with load_yt_dlp().YoutubeDL(opts) as ydl:
                     return ydl.extract_info(url, download=False)
             
             info = None
@@ -177,37 +429,18 @@ class VideoDownloader:
                     raise
             
             if info:
-                video_formats = []
+                self.remember_title(url, info)
+                # One option per height, video-only streams paired with audio
+                video_formats = build_ladder(info.get('formats', []), info.get('duration'))
                 audio_formats = []
                 
-                formats = info.get('formats', [])
-                
-                # Process video formats
-                for fmt in formats:
-                    if fmt.get('vcodec') != 'none' and fmt.get('height'):
-                        quality = f"{fmt.get('height', 'Unknown')}p"
-                        ext = fmt.get('ext', 'mp4')
-                        filesize = fmt.get('filesize') or fmt.get('filesize_approx', 0)
-                        
-                        video_formats.append({
-                            'format_id': fmt.get('format_id'),
-                            'quality': quality,
-                            'ext': ext,
-                            'filesize': filesize,
-                            'fps': fmt.get('fps'),
-                            'vcodec': fmt.get('vcodec'),
-                            'acodec': fmt.get('acodec')
-                        })
-                
-                # Sort by quality (height)
-                video_formats.sort(key=lambda x: int(x.get('quality', '0p')[:-1]) if x.get('quality', '0p')[:-1].isdigit() else 0, reverse=True)
-                
                 return {
                     'title': info.get('title', 'Unknown Title'),
                     'duration': info.get('duration'),
-                    'video_formats': video_formats[:6],  # Top 6 qualities
+                    'video_formats': video_formats,
                     'audio_formats': audio_formats,
-                    'uploader': info.get('uploader')
+                    'uploader': info.get('uploader'),
+                    'thumbnail': info.get('thumbnail'),
                 }
                 
         except Exception as e:
@@ -215,44 +448,50 @@ class VideoDownloader:
             
         return None
     
-    async def download_video_format(self, url: str, output_dir: str, format_id: str) -> Optional[str]:
-        """Download video with specific format"""
+    @traced()
+    async def download_video_format(self, url: str, output_dir: str, format_id: str,
+                                    cancel: Optional[threading.Event] = None, weight: float = 1.0,
+                                    progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Optional[str]:
+        """Download video with specific format; setting cancel aborts it at the next progress update.
+
+        progress, if given, receives yt-dlp's progress dicts (from a worker thread).
+        """
+        await self.warm_up()
+        job, share = self._start_transfer(url, weight)
+        result = None
         try:
             os.makedirs(output_dir, exist_ok=True)
             
             overrides = {
                 'format': format_id,
-                'outtmpl': os.path.join(output_dir, 'temp_video.%(ext)s'),
+                # video+audio pairs from the format ladder are merged into MP4
+                'merge_output_format': 'mp4',
             }
+            overrides.update(self._transfer_opts(job, share, cancel, progress))
             download_opts = self._build_opts(self.ydl_opts, overrides=overrides, use_cookies=(self.cookies_enabled and not self.cookies_apply_on_failure_only))
             
             loop = asyncio.get_event_loop()
+            parent_span = tracer.current_span()
             
             def _download(opts: Dict[str, Any]):
-                import time
-                import shutil
-                
-                # Create simple filename first
-                timestamp = int(time.time())
-                temp_name = f"video_{timestamp}"
-                opts = opts.copy()
+                # Stable name per output dir so a restarted job continues from its .part file
+                temp_name = "video"
+                opts = self._add_trace_hooks(opts, parent_span)
                 opts['outtmpl'] = os.path.join(output_dir, f'{temp_name}.%(ext)s')
                 
-                with yt_dlp.YoutubeDL(opts) as ydl:
-                    ydl.download([url])
-                    
-                    # Find the downloaded file with our timestamp
+                def _locate():
                     for file in os.listdir(output_dir):
                         if temp_name in file and file.endswith(('mp4', 'webm', 'mkv', 'avi')):
                             return os.path.join(output_dir, file)
-                    
                     return None
+
+                with load_yt_dlp().YoutubeDL(opts) as ydl:
+                    return self._cached_download(ydl, url, format_id, output_dir, temp_name, _locate, parent_span)
             
-            result = None
             try:
                 result = await loop.run_in_executor(None, _download, download_opts)
             except Exception as e:
-                if self.cookies_enabled and self.cookies_apply_on_failure_only:
+                if self.cookies_enabled and self.cookies_apply_on_failure_only and not (cancel and cancel.is_set()):
                     cookie_opts = self._build_opts(self.ydl_opts, overrides=overrides, use_cookies=True)
                     logger.warning(f"Format download failed, retrying with cookies: {e}")
                     result = await loop.run_in_executor(None, _download, cookie_opts)
@@ -263,54 +502,66 @@ class VideoDownloader:
         except Exception as e:
             logger.error(f"Error downloading video format {format_id} from {url}: {str(e)}")
             return None
+        finally:
+            self._finish_transfer(job, share, success=bool(result))
 
-    async def download_audio(self, url: str, output_dir: str, quality: str = "best") -> Optional[str]:
-        """Download audio and convert to MP3"""
+    @traced()
+    async def download_audio(self, url: str, output_dir: str, quality: str = "best",
+                             cancel: Optional[threading.Event] = None, weight: float = 1.0,
+                             progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Optional[str]:
+        """Download audio and convert to MP3; setting cancel aborts it at the next progress update.
+
+        progress, if given, receives yt-dlp's progress dicts (from a worker thread).
+        """
+        await self.warm_up()
+        bitrate = '192' if quality == "best" else '128'
+        job, share = self._start_transfer(url, weight)
+        result = None
         try:
             os.makedirs(output_dir, exist_ok=True)
             
             base_opts = {
                 'format': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best' if quality == "best" else 'worstaudio/worst',
-                'outtmpl': os.path.join(output_dir, 'temp_audio.%(ext)s'),
                 'quiet': True,
                 'no_warnings': True,
                 'postprocessors': [{
                     'key': 'FFmpegExtractAudio',
                     'preferredcodec': 'mp3',
-                    'preferredquality': '192' if quality == "best" else '128',
+                    'preferredquality': bitrate,
                 }],
                 'postprocessor_args': [
                     '-ar', '44100'
                 ],
             }
+            base_opts.update(self._transfer_opts(job, share, cancel, progress))
             download_opts = self._build_opts(base_opts, use_cookies=(self.cookies_enabled and not self.cookies_apply_on_failure_only))
             
             loop = asyncio.get_event_loop()
+            parent_span = tracer.current_span()
             
             def _download(opts: Dict[str, Any]):
-                import time
-                
-                # Create simple filename
-                timestamp = int(time.time())
-                temp_name = f"audio_{timestamp}"
-                opts = opts.copy()
+                # Stable name per output dir so a restarted job continues from its .part file
+                temp_name = "audio"
+                opts = self._add_trace_hooks(opts, parent_span)
                 opts['outtmpl'] = os.path.join(output_dir, f'{temp_name}.%(ext)s')
                 
-                with yt_dlp.YoutubeDL(opts) as ydl:
-                    ydl.download([url])
-                    
-                    # Find the downloaded MP3 file
+                def _locate():
                     for file in os.listdir(output_dir):
                         if temp_name in file and file.endswith('.mp3'):
                             return os.path.join(output_dir, file)
-                    
                     return None
+
+                def _derive(source):
+                    return self._audio_from_cached_video(source, output_dir, temp_name, bitrate, parent_span)
+
+                with load_yt_dlp().YoutubeDL(opts) as ydl:
+                    return self._cached_download(ydl, url, f"mp3-{quality}", output_dir, temp_name, _locate,
+                                                 parent_span, derive=_derive)
             
-            result = None
             try:
                 result = await loop.run_in_executor(None, _download, download_opts)
             except Exception as e:
-                if self.cookies_enabled and self.cookies_apply_on_failure_only:
+                if self.cookies_enabled and self.cookies_apply_on_failure_only and not (cancel and cancel.is_set()):
                     cookie_opts = self._build_opts(base_opts, use_cookies=True)
                     logger.warning(f"Audio download failed, retrying with cookies: {e}")
                     result = await loop.run_in_executor(None, _download, cookie_opts)
@@ -321,9 +572,15 @@ class VideoDownloader:
         except Exception as e:
             logger.error(f"Error downloading audio from {url}: {str(e)}")
             return None
+        finally:
+            self._finish_transfer(job, share, success=bool(result))
 
+    @traced()
     async def download_video(self, url: str, output_dir: str) -> Optional[str]:
         """Download video and return the file path"""
+        await self.warm_up()
+        job, share = self._start_transfer(url)
+        result = None
         try:
             # Create output directory if it doesn't exist
             os.makedirs(output_dir, exist_ok=True)
@@ -332,12 +589,15 @@ class VideoDownloader:
             overrides = {
                 'outtmpl': os.path.join(output_dir, '%(title)s.%(ext)s')
             }
+            overrides.update(self._transfer_opts(job, share))
             base_opts = self._build_opts(self.ydl_opts, overrides=overrides, use_cookies=(self.cookies_enabled and not self.cookies_apply_on_failure_only))
             
             loop = asyncio.get_event_loop()
+            parent_span = tracer.current_span()
             
             def _download(opts: Dict[str, Any]):
-                with yt_dlp.YoutubeDL(opts) as ydl:
+                opts = self._add_trace_hooks(opts, parent_span)
+                with load_yt_dlp().YoutubeDL(opts) as ydl:
                     # Get info first to determine filename
                     info = ydl.extract_info(url, download=False)
                     if not info:
@@ -364,7 +624,6 @@ class VideoDownloader:
                     
                     return output_path if os.path.exists(output_path) else None
             
-            result = None
             try:
                 result = await loop.run_in_executor(None, _download, base_opts)
             except Exception as e:
@@ -385,23 +644,27 @@ class VideoDownloader:
         except Exception as e:
             logger.error(f"Error downloading video from {url}: {str(e)}")
             return None
+        finally:
+            self._finish_transfer(job, share, success=bool(result))
     
     def get_supported_sites(self) -> list:
         """Get list of supported sites"""
         try:
-            with yt_dlp.YoutubeDL() as ydl:
+            with load_yt_dlp().YoutubeDL() as ydl:
                 extractors = ydl.list_extractors()
                 return [extractor.IE_NAME for extractor in extractors]
         except:
             return ['youtube', 'twitter', 'instagram', 'facebook', 'tiktok']
 
+    @traced()
     async def get_playlist_info(self, url: str) -> Optional[Dict[str, Any]]:
         """Get playlist/channel information and videos list"""
+        await self.warm_up()
         try:
             loop = asyncio.get_event_loop()
             
             def _get_playlist(opts: Dict[str, Any]):
-                with yt_dlp.YoutubeDL(opts) as ydl:
+                with load_yt_dlp().YoutubeDL(opts) as ydl:
                     return ydl.extract_info(url, download=False)
             
             info = None
@@ -449,15 +712,4 @@ class VideoDownloader:
 
     async def is_playlist_url(self, url: str) -> bool:
         """Check if URL is a playlist or channel"""
-        playlist_indicators = [
-            'playlist?list=',
-            'watch?v=.*&list=',
-            '/channel/',
-            '/c/',
-            '/@',
-            '/user/',
-            'youtube.com/playlist',
-            'youtube.com/channel'
-        ]
-        
-        return any(indicator in url.lower() for indicator in playlist_indicators)
+        return classify_url(url).kind != VIDEO
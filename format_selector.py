@@ -0,0 +1,114 @@
+"""
+Format ladder for the quality menu: one merge-aware, size-efficient option per height
+"""
+
+from typing import Any, Dict, List, Optional
+
+# Video codecs by how well Telegram clients stream them inside MP4 (lower is better)
+VIDEO_CODEC_RANK = (('avc1', 0), ('h264', 0), ('hev1', 1), ('hvc1', 1), ('h265', 1),
+                    ('vp09', 2), ('vp9', 2), ('av01', 3))
+UNKNOWN_CODEC_RANK = 2
+
+# Audio codecs that go into MP4 without re-encoding (lower is better)
+AUDIO_CODEC_RANK = (('mp4a', 0), ('aac', 0), ('mp3', 1), ('opus', 2), ('vorbis', 3))
+
+
+def _rank(codec: Optional[str], table) -> int:
+    codec = (codec or '').lower()
+    for prefix, rank in table:
+        if codec.startswith(prefix):
+            return rank
+    return UNKNOWN_CODEC_RANK
+
+
+def has_video(fmt: Dict[str, Any]) -> bool:
+    return fmt.get('vcodec') != 'none' and bool(fmt.get('height'))
+
+
+def has_audio(fmt: Dict[str, Any]) -> bool:
+    # yt-dlp leaves acodec unset for some progressive formats; treat those as having audio
+    return fmt.get('acodec') != 'none'
+
+
+def quality_label(fmt: Dict[str, Any]) -> str:
+    """'720p' from the short side, so a 720x1280 portrait video is 720p rather than 1280p"""
+    height = fmt['height']
+    width = fmt.get('width')
+    return f"{min(width, height) if width else height}p"
+
+
+def estimated_size(fmt: Dict[str, Any], duration: Optional[float]) -> Optional[float]:
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return float(size)
+    if fmt.get('tbr') and duration:
+        return fmt['tbr'] * 1000 / 8 * duration
+    return None
+
+
+def best_audio(formats: List[Dict[str, Any]], duration: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Audio-only format to pair with video-only streams: MP4-compatible codec first, then bitrate"""
+    audio = [f for f in formats if f.get('vcodec') == 'none' and has_audio(f) and f.get('acodec')]
+    if not audio:
+        return None
+    return min(audio, key=lambda f: (_rank(f.get('acodec'), AUDIO_CODEC_RANK),
+                                     -(f.get('abr') or f.get('tbr') or 0),
+                                     estimated_size(f, duration) or 0))
+
+
+def build_ladder(formats: List[Dict[str, Any]], duration: Optional[float] = None,
+                 max_options: int = 6) -> List[Dict[str, Any]]:
+    """One menu option per height, highest first, labelled by the short side (see quality_label).
+
+    Video-only streams are paired with the best MP4-compatible audio as
+    ``video_id+audio_id`` (merged into MP4 by yt-dlp). Within a height the
+    option with the best-streaming codec wins, then the smaller file, so a
+    progressive H.264 MP4 beats an equally sized VP9 + audio merge.
+    """
+    audio = best_audio(formats, duration)
+    audio_size = estimated_size(audio, duration) if audio else None
+
+    by_height: Dict[int, Dict[str, Any]] = {}
+    for fmt in formats:
+        if not has_video(fmt):
+            continue
+        progressive = has_audio(fmt)
+        if not progressive and audio is None:
+            continue  # video-only with nothing to merge it with
+        size = estimated_size(fmt, duration)
+        tbr = fmt.get('tbr')
+        if progressive:
+            format_id = fmt['format_id']
+            acodec = fmt.get('acodec')
+            ext = fmt.get('ext') or 'mp4'
+        else:
+            format_id = f"{fmt['format_id']}+{audio['format_id']}"
+            acodec = audio.get('acodec')
+            ext = 'mp4'
+            if size is not None and audio_size is not None:
+                size += audio_size
+            if tbr:
+                tbr += audio.get('tbr') or audio.get('abr') or 0
+
+        option = {
+            'format_id': format_id,
+            'quality': quality_label(fmt),
+            'height': fmt['height'],
+            'ext': ext,
+            'filesize': int(size) if size else 0,
+            'tbr': tbr,
+            'fps': fmt.get('fps'),
+            'vcodec': fmt.get('vcodec'),
+            'acodec': acodec,
+        }
+        key = (_rank(fmt.get('vcodec'), VIDEO_CODEC_RANK), size if size is not None else float('inf'),
+               -(fmt.get('fps') or 0))
+        current = by_height.get(fmt['height'])
+        if current is None or key < current['_key']:
+            option['_key'] = key
+            by_height[fmt['height']] = option
+
+    ladder = sorted(by_height.values(), key=lambda option: option['height'], reverse=True)[:max_options]
+    for option in ladder:
+        del option['_key']
+    return ladder
@@ -0,0 +1,131 @@
+"""
+Durable job journal (SQLite) for crash recovery of download jobs
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Job states; QUEUED/RUNNING jobs found at startup were interrupted by a restart
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    format_type TEXT NOT NULL,
+    format_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    at REAL NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id);
+"""
+
+
+class JobJournal:
+    """Record job state transitions so interrupted jobs can be resumed.
+
+    Writes are single-row statements in WAL mode, cheap enough to run inline
+    from handlers.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _event(self, job_id: str, state: str, now: float, detail: Optional[str]) -> None:
+        self._conn.execute(
+            "INSERT INTO job_events (job_id, state, at, detail) VALUES (?, ?, ?, ?)",
+            (job_id, state, now, detail),
+        )
+
+    def create(self, job_id: str, chat_id: int, user_id: int, url: str,
+               format_type: str, format_id: str) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, chat_id, user_id, url, format_type, format_id, state, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, chat_id, user_id, url, format_type, format_id, QUEUED, now, now),
+            )
+            self._event(job_id, QUEUED, now, None)
+
+    def transition(self, job_id: str, state: str, error: Optional[str] = None) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated = ? WHERE job_id = ?",
+                (state, error, now, job_id),
+            )
+            self._event(job_id, state, now, error)
+
+    def requeue(self, job_id: str) -> None:
+        """Mark an interrupted job as queued again for another attempt"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, updated = ? WHERE job_id = ?",
+                (QUEUED, now, job_id),
+            )
+            self._event(job_id, QUEUED, now, 'resumed after restart')
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def active_jobs(self) -> List[Dict[str, Any]]:
+        placeholders = ','.join('?' for _ in ACTIVE_STATES)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE state IN ({placeholders}) ORDER BY created", ACTIVE_STATES,
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def prune(self, older_than: float) -> int:
+        """Delete finished jobs (and their events) last updated before the given timestamp"""
+        placeholders = ','.join('?' for _ in ACTIVE_STATES)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"DELETE FROM job_events WHERE job_id IN (SELECT job_id FROM jobs "
+                f"WHERE updated < ? AND state NOT IN ({placeholders}))",
+                (older_than, *ACTIVE_STATES),
+            )
+            cursor = self._conn.execute(
+                f"DELETE FROM jobs WHERE updated < ? AND state NOT IN ({placeholders})",
+                (older_than, *ACTIVE_STATES),
+            )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,146 @@
+"""
+Event-loop health monitor: scheduling lag and blocking-call detection
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """Measure event-loop lag continuously and, in debug mode, capture the
+    stack of whatever blocks the loop longer than a threshold.
+
+    Lag is sampled by a task that sleeps for a fixed interval and records how
+    late it wakes up. Blocking detection runs in a watchdog thread which pings
+    the loop with ``call_soon_threadsafe``; if the ping is not serviced within
+    the threshold, the loop thread's current stack is captured.
+    """
+
+    def __init__(self, interval: float = 0.25, block_threshold: float = 0.2,
+                 debug: bool = False, max_reports: int = 20):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.debug = debug
+        self.blocking_reports: deque = deque(maxlen=max_reports)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Start monitoring the running loop (call from within the loop)"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._task = self._loop.create_task(self._sample_lag())
+        if self.debug:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+        logger.info(f"Event-loop monitor started (interval={self.interval}s, debug={self.debug})")
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sample_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            metrics.observe('event_loop_lag_seconds', lag)
+            metrics.set_gauge('event_loop_lag_current_seconds', lag)
+            metrics.set_gauge('event_loop_tasks', len(asyncio.all_tasks(loop)))
+
+    def _watch(self) -> None:
+        while not self._stop.is_set():
+            serviced = threading.Event()
+            sent = time.monotonic()
+            try:
+                self._loop.call_soon_threadsafe(serviced.set)
+            except RuntimeError:
+                return  # loop closed
+
+            if not serviced.wait(self.block_threshold):
+                stack = self._capture_stack()
+                while not serviced.wait(0.5):
+                    if self._stop.is_set():
+                        return
+                blocked_for = time.monotonic() - sent
+                self._record_block(blocked_for, stack)
+
+            self._stop.wait(self.interval)
+
+    def _capture_stack(self) -> List[str]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return []
+        return traceback.format_stack(frame)
+
+    def _record_block(self, blocked_for: float, stack: List[str]) -> None:
+        metrics.inc('event_loop_blocked_total')
+        metrics.observe('event_loop_blocked_seconds', blocked_for)
+        self.blocking_reports.append({
+            'time': time.time(),
+            'duration': blocked_for,
+            'stack': stack,
+        })
+        location = stack[-1].strip().splitlines()[0] if stack else 'unknown'
+        logger.warning(f"Event loop blocked for {blocked_for * 1000:.0f} ms at {location}")
+
+    def summary(self) -> Dict[str, Any]:
+        lag = metrics.get_summary('event_loop_lag_seconds')
+        blocked = metrics.get_summary('event_loop_blocked_seconds')
+        return {
+            'lag': lag.to_dict() if lag else None,
+            'blocked': blocked.to_dict() if blocked else None,
+            'debug': self.debug,
+            'block_threshold': self.block_threshold,
+            'reports': list(self.blocking_reports),
+        }
+
+    def format_report(self, max_reports: int = 3, frames_per_report: int = 6) -> str:
+        """Human-readable loop health report for the admin command"""
+        data = self.summary()
+        lines = ["🩺 Event loop health"]
+        if data['lag']:
+            lag = data['lag']
+            lines.append(
+                f"lag: p50={lag['p50'] * 1000:.1f}ms p95={lag['p95'] * 1000:.1f}ms "
+                f"p99={lag['p99'] * 1000:.1f}ms max={lag['max'] * 1000:.1f}ms (n={lag['count']})"
+            )
+        else:
+            lines.append("lag: no samples yet")
+
+        if not self.debug:
+            lines.append("blocking detector: off (set LOOP_MONITOR_DEBUG=true)")
+            return '\n'.join(lines)
+
+        blocked = data['blocked']
+        lines.append(
+            f"blocking calls > {self.block_threshold * 1000:.0f}ms: "
+            f"{blocked['count'] if blocked else 0}"
+        )
+        for report in list(self.blocking_reports)[-max_reports:][::-1]:
+            when = time.strftime('%H:%M:%S', time.localtime(report['time']))
+            lines.append(f"\n⛔ {when} blocked {report['duration'] * 1000:.0f}ms")
+            for frame in report['stack'][-frames_per_report:]:
+                lines.append(frame.rstrip())
+        return '\n'.join(lines)
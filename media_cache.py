@@ -0,0 +1,184 @@
+"""
+On-disk media cache shared across users, keyed by (extractor, video id, format)
+"""
+
+import logging
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str, str]
+
+_UNSAFE_RE = re.compile(r'[^A-Za-z0-9._-]')
+
+
+def _safe(component: str) -> str:
+    return _UNSAFE_RE.sub('_', component)[:100] or '_'
+
+
+class _Entry:
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+
+
+class MediaCache:
+    """Byte-budgeted LRU cache of downloaded media files.
+
+    Files live at ``root/<extractor>/<video id>/<format><ext>``. Jobs get
+    hardlinks rather than the cached file itself, so evicting an entry never
+    breaks an in-flight upload and deleting a job's work dir leaves the cache
+    intact. Recency is kept in file mtimes so LRU order survives restarts.
+    """
+
+    def __init__(self, root: str, max_bytes: int, max_sources: int = 10000):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_sources = max_sources
+        self.total_bytes = 0
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        # URL -> (extractor, video id) learned from extract_info, so repeat URLs skip extraction
+        self._sources: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._scan()
+
+    def _scan(self) -> None:
+        found = []
+        for extractor in os.listdir(self.root):
+            extractor_dir = os.path.join(self.root, extractor)
+            if not os.path.isdir(extractor_dir):
+                continue
+            for video_id in os.listdir(extractor_dir):
+                video_dir = os.path.join(extractor_dir, video_id)
+                if not os.path.isdir(video_dir):
+                    continue
+                for name in os.listdir(video_dir):
+                    path = os.path.join(video_dir, name)
+                    stat = os.stat(path)
+                    fmt = os.path.splitext(name)[0]
+                    found.append((stat.st_mtime, (extractor, video_id, fmt), _Entry(path, stat.st_size)))
+        for _, key, entry in sorted(found, key=lambda item: item[0]):
+            self._entries[key] = entry
+            self.total_bytes += entry.size
+        self._evict()
+        logger.info(f"Media cache: {len(self._entries)} files, {self.total_bytes / (1024 * 1024):.1f} MiB in {self.root}")
+
+    @staticmethod
+    def make_key(extractor: str, video_id: str, fmt: str) -> CacheKey:
+        return (_safe(extractor.lower()), _safe(video_id), _safe(fmt))
+
+    def remember_source(self, url: str, extractor: str, video_id: str) -> None:
+        with self._lock:
+            self._sources[url] = (extractor, video_id)
+            self._sources.move_to_end(url)
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+
+    def source_for(self, url: str) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            return self._sources.get(url)
+
+    def variants(self, extractor: str, video_id: str) -> List[Tuple[str, str]]:
+        """(format, path) pairs cached for one video, most recently used first"""
+        prefix = self.make_key(extractor, video_id, '')[:2]
+        with self._lock:
+            return [(key[2], entry.path) for key, entry in reversed(self._entries.items()) if key[:2] == prefix]
+
+    def lookup(self, key: CacheKey) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not os.path.exists(entry.path):
+                if entry is not None:
+                    self._drop(key)
+                metrics.inc('media_cache_misses_total')
+                return None
+            self._entries.move_to_end(key)
+        try:
+            os.utime(entry.path)
+        except OSError:
+            pass
+        metrics.inc('media_cache_hits_total')
+        return entry.path
+
+    def checkout(self, key: CacheKey, dest_dir: str, name: str) -> Optional[str]:
+        """Hardlink a cached file into dest_dir as name + original extension"""
+        path = self.lookup(key)
+        if path is None:
+            return None
+        dest = os.path.join(dest_dir, name + os.path.splitext(path)[1])
+        try:
+            _link_or_copy(path, dest)
+        except OSError as e:
+            logger.warning(f"Media cache checkout failed for {key}: {e}")
+            return None
+        return dest
+
+    def store(self, key: CacheKey, src: str) -> None:
+        """Add a finished download to the cache (hardlinked, so no extra disk use until eviction)"""
+        try:
+            size = os.path.getsize(src)
+        except OSError:
+            return
+        if size > self.max_bytes:
+            return
+        dest_dir = os.path.join(self.root, key[0], key[1])
+        dest = os.path.join(dest_dir, key[2] + os.path.splitext(src)[1])
+        try:
+            os.makedirs(dest_dir, exist_ok=True)
+            _link_or_copy(src, dest)
+        except OSError as e:
+            logger.warning(f"Could not cache {src}: {e}")
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old.size
+            self._entries[key] = _Entry(dest, size)
+            self.total_bytes += size
+            self._evict()
+
+    def _drop(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.size
+        try:
+            os.remove(entry.path)
+            os.rmdir(os.path.dirname(entry.path))
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._drop(key)
+            metrics.inc('media_cache_evictions_total')
+        metrics.set_gauge('media_cache_bytes', self.total_bytes)
+        metrics.set_gauge('media_cache_files', len(self._entries))
+
+
+def _link_or_copy(src: str, dest: str) -> None:
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        # Different filesystem or no hardlink support
+        shutil.copy2(src, dest)
+
+
+def build_media_cache() -> Optional[MediaCache]:
+    from config import MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_GB
+    if MEDIA_CACHE_MAX_GB <= 0:
+        return None
+    try:
+        return MediaCache(MEDIA_CACHE_DIR, int(MEDIA_CACHE_MAX_GB * 1024 ** 3))
+    except OSError as e:
+        logger.error(f"Media cache disabled: {e}")
+        return None
@@ -0,0 +1,102 @@
+"""
+Local media metadata (duration, dimensions, codecs) from ffprobe, cached per file
+"""
+
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+# (path, size, mtime_ns) -> media info; a rewritten file gets a new key
+_cache: "OrderedDict[Tuple[str, int, int], Dict[str, Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+_CACHE_SIZE = 512
+
+
+def tool_executor() -> ThreadPoolExecutor:
+    """Small dedicated pool for ffmpeg/ffprobe runs so they can't starve the default executor"""
+    global _executor
+    if _executor is None:
+        from config import POSTPROCESS_WORKERS
+        _executor = ThreadPoolExecutor(max_workers=max(1, POSTPROCESS_WORKERS), thread_name_prefix='ffmpeg')
+    return _executor
+
+
+def ffprobe(path: str) -> Dict[str, Any]:
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_format', '-show_streams', '-of', 'json', path],
+        check=True, capture_output=True, timeout=60,
+    )
+    return json.loads(result.stdout or b'{}')
+
+
+def media_info(probe: Dict[str, Any]) -> Dict[str, Any]:
+    """Duration, display dimensions and codecs from ffprobe output"""
+    streams = probe.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'
+                  and not s.get('disposition', {}).get('attached_pic')), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    duration = probe.get('format', {}).get('duration') or (video or audio or {}).get('duration')
+    width = video.get('width') if video else None
+    height = video.get('height') if video else None
+    if video and width and height:
+        rotation = video.get('tags', {}).get('rotate')
+        for side_data in video.get('side_data_list', []):
+            rotation = side_data.get('rotation', rotation)
+        if rotation is not None and abs(int(float(rotation))) % 180 == 90:
+            # Phones store portrait video as rotated landscape
+            width, height = height, width
+    return {
+        'duration': int(float(duration)) if duration else None,
+        'width': width,
+        'height': height,
+        'vcodec': video.get('codec_name') if video else None,
+        'acodec': audio.get('codec_name') if audio else None,
+        'format_name': probe.get('format', {}).get('format_name', ''),
+    }
+
+
+def _key(path: str) -> Tuple[str, int, int]:
+    stat = os.stat(path)
+    return os.path.realpath(path), stat.st_size, stat.st_mtime_ns
+
+
+def probe_file(path: str) -> Dict[str, Any]:
+    """Media info for path, running ffprobe only once per file version"""
+    key = _key(path)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached
+    info = media_info(ffprobe(path))
+    remember(path, info, key)
+    return info
+
+
+def remember(path: str, info: Dict[str, Any], key: Optional[Tuple[str, int, int]] = None) -> None:
+    """Record info for a file produced from an already probed one (e.g. a stream-copy remux)"""
+    key = key or _key(path)
+    with _cache_lock:
+        _cache[key] = info
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+async def probe_media(path: str) -> Dict[str, Any]:
+    """probe_file off the event loop; empty info if ffprobe is unavailable or fails"""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(tool_executor(), probe_file, path)
+    except (OSError, subprocess.SubprocessError, ValueError) as e:
+        logger.warning(f"Could not probe {path}: {e}")
+        return {}
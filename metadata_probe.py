@@ -0,0 +1,135 @@
+"""
+Fast metadata probe (oEmbed) for the first format menu, before full yt-dlp extraction
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Public oEmbed endpoints that need no API key
+OEMBED_ENDPOINTS = {
+    'youtube': 'https://www.youtube.com/oembed',
+    'tiktok': 'https://www.tiktok.com/oembed',
+    'twitter': 'https://publish.twitter.com/oembed',
+}
+
+# Heights offered (as 'up to Np') on the quick menu until the real format list replaces it
+QUICK_HEIGHTS = {
+    'youtube': (1080, 720, 480, 360),
+}
+DEFAULT_QUICK_HEIGHTS = (720, 480)
+
+QUICK_FORMAT_PREFIX = 'h'
+
+
+def quick_format_selector(height: int) -> str:
+    """yt-dlp selector for 'best up to this height', used when the real formats aren't known yet"""
+    return f"bv*[height<={height}]+ba/b[height<={height}]/b"
+
+
+def _height(fmt: Dict[str, Any]) -> int:
+    quality = fmt.get('quality') or ''
+    return int(quality[:-1]) if quality[:-1].isdigit() else 0
+
+
+def _quick_height(format_id: str) -> Optional[int]:
+    if not format_id.startswith(QUICK_FORMAT_PREFIX) or not format_id[1:].isdigit():
+        return None
+    return int(format_id[1:])
+
+
+def _pick(height: int, formats_info: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Highest ladder entry up to height (the lowest one if all are higher), once the full list is known"""
+    if not formats_info or formats_info.get('partial'):
+        return None
+    ladder = [f for f in formats_info.get('video_formats', []) if _height(f)]
+    if not ladder:
+        return None
+    below = [f for f in ladder if _height(f) <= height]
+    return max(below, key=_height) if below else min(ladder, key=_height)
+
+
+def resolve_quick_format(format_id: str, formats_info: Optional[Dict[str, Any]]) -> str:
+    """Turn a quick-menu choice ('h720') into a concrete format id once the full
+    format list has arrived, or into a height-capped selector if it hasn't"""
+    height = _quick_height(format_id)
+    if height is None:
+        return format_id
+    fmt = _pick(height, formats_info)
+    return fmt['format_id'] if fmt else quick_format_selector(height)
+
+
+def quick_fallback_quality(format_id: str, formats_info: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Quality resolve_quick_format actually picks when the video lacks the chosen height, else None"""
+    height = _quick_height(format_id)
+    fmt = _pick(height, formats_info) if height is not None else None
+    return fmt['quality'] if fmt and _height(fmt) != height else None
+
+
+class MetadataProbe:
+    """Title/uploader for the format menu from a platform's oEmbed endpoint.
+
+    A single small JSON request instead of a full extract_info (for YouTube
+    that means skipping the player JS and signature work). Results are cached
+    with a TTL; platforms without a keyless endpoint return None and callers
+    fall back to the full extraction.
+    """
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 5000, timeout: float = 3.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._cache: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+
+    def _fetch(self, endpoint: str, url: str) -> Dict[str, Any]:
+        response = requests.get(endpoint, params={'url': url, 'format': 'json'}, timeout=self.timeout,
+                                headers={'User-Agent': 'Mozilla/5.0'})
+        response.raise_for_status()
+        return response.json()
+
+    async def probe(self, url: str, platform: Optional[str]) -> Optional[Dict[str, Any]]:
+        endpoint = OEMBED_ENDPOINTS.get(platform)
+        if endpoint is None:
+            return None
+        cached = self._cache.get(url)
+        if cached and cached[1] > time.monotonic():
+            self._cache.move_to_end(url)
+            metrics.inc('metadata_probe_cache_hits_total')
+            return cached[0]
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            data = await loop.run_in_executor(None, self._fetch, endpoint, url)
+        except Exception as e:
+            logger.info(f"oEmbed probe failed for {url}: {e}")
+            metrics.inc('metadata_probe_failures_total')
+            return None
+        metrics.observe('metadata_probe_seconds', time.perf_counter() - started)
+
+        heights = QUICK_HEIGHTS.get(platform, DEFAULT_QUICK_HEIGHTS)
+        info = {
+            'title': data.get('title') or data.get('author_name') or 'Unknown Title',
+            'duration': None,
+            'uploader': data.get('author_name'),
+            'thumbnail': data.get('thumbnail_url'),
+            'video_formats': [
+                {'format_id': f"{QUICK_FORMAT_PREFIX}{height}", 'quality': f"{height}p", 'ext': 'mp4', 'filesize': 0,
+                 'up_to': True}
+                for height in heights
+            ],
+            'audio_formats': [],
+            'partial': True,
+        }
+        self._cache[url] = (info, time.monotonic() + self.ttl)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return info
@@ -0,0 +1,102 @@
+"""
+In-process metrics registry (counters, gauges and summaries)
+"""
+
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+
+def _key(name: str, labels: Optional[Dict[str, Any]]) -> str:
+    if not labels:
+        return name
+    rendered = ','.join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+class Summary:
+    """Count/sum/max plus a window of recent samples for percentiles"""
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: deque = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(pct / 100 * len(ordered)))
+        return ordered[index]
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'sum': round(self.total, 6),
+            'max': round(self.max, 6),
+            'p50': round(self.percentile(50), 6),
+            'p95': round(self.percentile(95), 6),
+            'p99': round(self.percentile(99), 6),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.summaries: Dict[str, Summary] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            summary = self.summaries.get(key)
+            if summary is None:
+                summary = self.summaries[key] = Summary()
+            summary.observe(value)
+
+    def get_summary(self, name: str, **labels) -> Optional[Summary]:
+        with self._lock:
+            return self.summaries.get(_key(name, labels))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'summaries': {key: summary.to_dict() for key, summary in self.summaries.items()},
+            }
+
+    def render_text(self) -> str:
+        """Plain-text exposition, one metric per line"""
+        snapshot = self.snapshot()
+        lines = []
+        for key, value in sorted(snapshot['counters'].items()):
+            lines.append(f"{key} {value:g}")
+        for key, value in sorted(snapshot['gauges'].items()):
+            lines.append(f"{key} {value:g}")
+        for key, summary in sorted(snapshot['summaries'].items()):
+            lines.append(
+                f"{key} count={summary['count']} p50={summary['p50']:.4g} "
+                f"p95={summary['p95']:.4g} p99={summary['p99']:.4g} max={summary['max']:.4g}"
+            )
+        return '\n'.join(lines)
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,318 @@
+"""
+Post-download processing: faststart remux, video thumbnails, size-targeted re-encodes and splitting
+"""
+
+import asyncio
+import logging
+import os
+import struct
+import subprocess
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from media_probe import probe_file, remember, tool_executor
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Codecs that can be copied into MP4 as-is; anything else is sent unchanged rather than re-encoded
+MP4_VIDEO_CODECS = {'h264', 'hevc', 'mpeg4', 'vp9', 'av1'}
+MP4_AUDIO_CODECS = {'aac', 'mp3', 'opus', 'ac3', 'eac3', 'flac', 'alac'}
+
+# Telegram thumbnails: JPEG, at most 320px on either side and under 200 kB
+THUMB_SIZE = 320
+THUMB_MAX_BYTES = 200 * 1024
+THUMB_FILTER = f"scale={THUMB_SIZE}:{THUMB_SIZE}:force_original_aspect_ratio=decrease"
+
+# Size-targeted x264 encode: headroom for the MP4 container and VBV overshoot,
+# and the lowest video bitrate still worth sending
+ENCODE_SIZE_MARGIN = 0.92
+ENCODE_MIN_VIDEO_KBPS = 150
+# Shorter side of the output for a given video bitrate (kbit/s)
+ENCODE_HEIGHT_FOR_KBPS = ((2500, 1080), (1200, 720), (600, 480), (0, 360))
+
+# Parts are aimed below the limit because segments can only end on a keyframe
+SPLIT_SIZE_MARGIN = 0.85
+SPLIT_ATTEMPTS = 3
+
+
+def is_faststart(path: str) -> bool:
+    """True if the MP4's moov atom comes before mdat, so playback can start before the download ends"""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    return False
+                size, kind = struct.unpack('>I4s', header)
+                if kind == b'moov':
+                    return True
+                if kind == b'mdat':
+                    return False
+                if size == 1:
+                    size = struct.unpack('>Q', f.read(8))[0]
+                    f.seek(size - 16, os.SEEK_CUR)
+                elif size == 0:
+                    return False
+                else:
+                    f.seek(size - 8, os.SEEK_CUR)
+    except (OSError, struct.error):
+        return False
+
+
+def remux_faststart(path: str, info: Dict[str, Any]) -> str:
+    """Stream-copy path into a faststart MP4 next to it; returns the new path"""
+    stem = os.path.splitext(path)[0]
+    tmp_path = f"{stem}.faststart.mp4"
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', path,
+               '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy', '-movflags', '+faststart']
+    if info.get('vcodec') == 'hevc':
+        # Apple/Telegram players need the hvc1 tag for HEVC in MP4
+        command += ['-tag:v', 'hvc1']
+    subprocess.run(command + [tmp_path], check=True, capture_output=True, timeout=600)
+    out_path = f"{stem}.mp4"
+    os.replace(tmp_path, out_path)
+    if out_path != path:
+        os.remove(path)
+    return out_path
+
+
+def prepare_video(path: str) -> Tuple[str, Dict[str, Any]]:
+    """Make path a faststart MP4 when codecs allow a stream copy; returns (path, media info)"""
+    info = probe_file(path)
+    is_mp4 = 'mp4' in info['format_name'] or 'mov' in info['format_name']
+    copyable = (info['vcodec'] in MP4_VIDEO_CODECS
+                and (info['acodec'] is None or info['acodec'] in MP4_AUDIO_CODECS))
+    if is_mp4 and path.endswith('.mp4') and is_faststart(path):
+        return path, info
+    if not copyable:
+        logger.info(f"Not remuxing {os.path.basename(path)}: {info['vcodec']}/{info['acodec']} can't be copied into MP4")
+        return path, info
+    started = time.perf_counter()
+    try:
+        path = remux_faststart(path, info)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"Faststart remux failed for {path}: {e}")
+        return path, info
+    # Stream copy keeps duration and dimensions
+    info = dict(info, format_name='mov,mp4,m4a,3gp,3g2,mj2')
+    remember(path, info)
+    metrics.observe('faststart_remux_seconds', time.perf_counter() - started)
+    return path, info
+
+
+async def prepare_for_streaming(path: str) -> Tuple[str, Dict[str, Any]]:
+    """Faststart remux and local metadata for an uploaded video, off the event loop.
+
+    Falls back to the unchanged file and empty metadata if ffprobe is unavailable.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(tool_executor(), prepare_video, path)
+    except (OSError, subprocess.SubprocessError, ValueError) as e:
+        logger.warning(f"Could not probe {path}: {e}")
+        return path, {}
+
+
+def make_thumbnail(path: str, duration: Optional[int] = None) -> Optional[str]:
+    """JPEG thumbnail from a keyframe near 10% into the video, cached next to it as <name>.thumb.jpg"""
+    thumb = f"{os.path.splitext(path)[0]}.thumb.jpg"
+    if os.path.exists(thumb) and os.path.getmtime(thumb) >= os.path.getmtime(path):
+        return thumb
+    # Seeking with keyframes only decodes a single frame; the first seconds are often black
+    for seek in ([min(duration * 0.1, 30), 0] if duration else [0]):
+        subprocess.run(
+            ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-skip_frame', 'nokey', '-noaccurate_seek',
+             '-ss', f"{seek:.2f}", '-i', path, '-frames:v', '1',
+             '-vf', THUMB_FILTER, '-q:v', '5', thumb],
+            capture_output=True, timeout=60,
+        )
+        if os.path.exists(thumb) and 0 < os.path.getsize(thumb) <= THUMB_MAX_BYTES:
+            return thumb
+    return None
+
+
+def fetch_thumbnail(url: str, dest: str) -> Optional[str]:
+    """Platform thumbnail re-encoded like make_thumbnail, since Telegram wants a JPEG within 320px and 200KB"""
+    response = requests.get(url, timeout=10)
+    response.raise_for_status()
+    # Platforms serve 480x360 (or larger) JPEGs and WebPs; scale whatever came back
+    source = f"{dest}.src"
+    with open(source, 'wb') as f:
+        f.write(response.content)
+    try:
+        subprocess.run(
+            ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', source, '-frames:v', '1',
+             '-vf', THUMB_FILTER, '-q:v', '5', dest],
+            capture_output=True, timeout=60,
+        )
+    finally:
+        os.remove(source)
+    if os.path.exists(dest) and 0 < os.path.getsize(dest) <= THUMB_MAX_BYTES:
+        return dest
+    return None
+
+
+async def thumbnail_for(path: str, duration: Optional[int] = None, fallback_url: Optional[str] = None) -> Optional[str]:
+    """Local keyframe thumbnail for an upload, or the platform's thumbnail if extraction fails"""
+    loop = asyncio.get_running_loop()
+    try:
+        thumb = await loop.run_in_executor(tool_executor(), make_thumbnail, path, duration)
+        if thumb:
+            return thumb
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.info(f"Local thumbnail failed for {path}: {e}")
+    if not fallback_url:
+        return None
+    try:
+        return await loop.run_in_executor(tool_executor(), fetch_thumbnail, fallback_url,
+                                          f"{os.path.splitext(path)[0]}.thumb.jpg")
+    except Exception as e:
+        logger.info(f"Could not download thumbnail {fallback_url}: {e}")
+        return None
+
+
+def encode_bitrates(limit: int, duration: float) -> Tuple[int, int]:
+    """(video, audio) kbit/s that keep a duration-second encode under limit bytes"""
+    total_kbps = limit * 8 * ENCODE_SIZE_MARGIN / duration / 1000
+    audio_kbps = 96 if total_kbps >= 600 else 64
+    return int(total_kbps - audio_kbps), audio_kbps
+
+
+def encode_to_size(path: str, info: Dict[str, Any], limit: int, preset: str, time_budget: float) -> Optional[str]:
+    """CRF-capped x264 encode of path that fits in limit bytes; returns the new path, or None if it won't fit.
+
+    CRF keeps easy content small and maxrate/bufsize cap the average at the
+    target bitrate, so one pass is enough. The resolution is lowered to match
+    the bitrate. Encodes predicted (from past speed) or running longer than
+    time_budget seconds are abandoned.
+    """
+    duration = info.get('duration')
+    if not duration:
+        metrics.inc('encode_rejected_total', reason='no_duration')
+        return None
+    video_kbps, audio_kbps = encode_bitrates(limit, duration)
+    if video_kbps < ENCODE_MIN_VIDEO_KBPS:
+        metrics.inc('encode_rejected_total', reason='bitrate')
+        logger.info(f"Not encoding {os.path.basename(path)}: {video_kbps} kbit/s would be unwatchable")
+        return None
+    speed = metrics.get_summary('encode_speed_x_realtime', preset=preset)
+    if speed and speed.count and duration / max(speed.percentile(50), 0.01) > time_budget:
+        metrics.inc('encode_rejected_total', reason='time_budget')
+        logger.info(f"Not encoding {os.path.basename(path)}: {duration}s at {speed.percentile(50):.2f}x "
+                    f"realtime exceeds the {time_budget:.0f}s budget")
+        return None
+
+    height = next(h for kbps, h in ENCODE_HEIGHT_FOR_KBPS if video_kbps >= kbps)
+    # Cap the shorter side so portrait videos are scaled the same way as landscape ones
+    scale = (f"scale='if(gte(iw,ih),-2,min(iw,{height}))':'if(gte(iw,ih),min(ih,{height}),-2)'")
+    out_path = f"{os.path.splitext(path)[0]}.fit.mp4"
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', path,
+               '-map', '0:v:0', '-map', '0:a:0?', '-vf', scale, '-pix_fmt', 'yuv420p',
+               '-c:v', 'libx264', '-preset', preset, '-crf', '23',
+               '-maxrate', f"{video_kbps}k", '-bufsize', f"{video_kbps * 2}k",
+               '-c:a', 'aac', '-b:a', f"{audio_kbps}k", '-movflags', '+faststart', out_path]
+    started = time.perf_counter()
+    try:
+        subprocess.run(command, check=True, capture_output=True, timeout=time_budget)
+    except subprocess.TimeoutExpired:
+        metrics.inc('encode_rejected_total', reason='timeout')
+        logger.warning(f"Encode of {os.path.basename(path)} exceeded the {time_budget:.0f}s budget")
+        _remove(out_path)
+        return None
+    except (OSError, subprocess.SubprocessError) as e:
+        metrics.inc('encode_failed_total')
+        logger.warning(f"Encode failed for {path}: {e}")
+        _remove(out_path)
+        return None
+
+    elapsed = time.perf_counter() - started
+    metrics.observe('encode_seconds', elapsed, preset=preset)
+    metrics.observe('encode_speed_x_realtime', duration / elapsed, preset=preset)
+    size = os.path.getsize(out_path)
+    if size > limit:
+        metrics.inc('encode_rejected_total', reason='too_large')
+        logger.warning(f"Encode of {os.path.basename(path)} still too large ({size} bytes)")
+        _remove(out_path)
+        return None
+    logger.info(f"Encoded {os.path.basename(path)} to {size} bytes at {video_kbps} kbit/s, "
+                f"{duration / elapsed:.2f}x realtime ({preset})")
+    os.remove(path)
+    return out_path
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def fit_to_size(path: str, limit: int, preset: str, time_budget: float) -> Optional[str]:
+    """Re-encode an oversized video to fit limit bytes on the ffmpeg pool; None if it can't be done"""
+    loop = asyncio.get_running_loop()
+    try:
+        info = await loop.run_in_executor(tool_executor(), probe_file, path)
+    except (OSError, subprocess.SubprocessError, ValueError) as e:
+        logger.warning(f"Could not probe {path}: {e}")
+        return None
+    return await loop.run_in_executor(tool_executor(), encode_to_size, path, info, limit, preset, time_budget)
+
+
+def _segment(path: str, segment_time: float) -> List[str]:
+    stem = os.path.splitext(path)[0]
+    subprocess.run(
+        ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', path,
+         '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy', '-f', 'segment',
+         '-segment_time', f"{segment_time:.2f}", '-reset_timestamps', '1',
+         '-segment_format', 'mp4', '-segment_format_options', 'movflags=+faststart',
+         f"{stem}.part%03d.mp4"],
+        check=True, capture_output=True, timeout=600,
+    )
+    directory, prefix = os.path.split(f"{stem}.part")
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory or '.')
+                  if name.startswith(prefix) and name.endswith('.mp4'))
+
+
+def split_video(path: str, info: Dict[str, Any], limit: int, max_parts: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """Stream-copy path into keyframe-aligned MP4 parts of at most limit bytes.
+
+    The segment length comes from the file's average bitrate; if a part still
+    overshoots (long GOPs, bitrate peaks) the split is redone with shorter
+    segments. Returns [(part path, media info)] in order, or [] if the video
+    would need more than max_parts parts.
+    """
+    duration = info.get('duration')
+    size = os.path.getsize(path)
+    if not duration:
+        metrics.inc('split_rejected_total', reason='no_duration')
+        return []
+    segment_time = limit * SPLIT_SIZE_MARGIN / (size / duration)
+    for _ in range(SPLIT_ATTEMPTS):
+        if duration / segment_time > max_parts:
+            break
+        started = time.perf_counter()
+        parts = _segment(path, segment_time)
+        metrics.observe('split_seconds', time.perf_counter() - started)
+        if parts and all(os.path.getsize(part) <= limit for part in parts) and len(parts) <= max_parts:
+            return [(part, probe_file(part)) for part in parts]
+        for part in parts:
+            _remove(part)
+        segment_time *= 0.75
+    metrics.inc('split_rejected_total', reason='too_many_parts')
+    logger.info(f"Not splitting {os.path.basename(path)}: needs more than {max_parts} parts")
+    return []
+
+
+async def split_to_parts(path: str, limit: int, max_parts: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """split_video on the ffmpeg pool; [] if the file can't be split into few enough parts"""
+    loop = asyncio.get_running_loop()
+    try:
+        info = await loop.run_in_executor(tool_executor(), probe_file, path)
+        return await loop.run_in_executor(tool_executor(), split_video, path, info, limit, max_parts)
+    except (OSError, subprocess.SubprocessError, ValueError) as e:
+        metrics.inc('split_failed_total')
+        logger.warning(f"Split failed for {path}: {e}")
+        return []
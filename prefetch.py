@@ -0,0 +1,226 @@
+"""
+Speculative prefetch of the format a user is most likely to pick from the format menu
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import shutil
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+from metadata_probe import resolve_quick_format
+from metrics import metrics
+from scheduler import estimate_job_bytes
+
+logger = logging.getLogger(__name__)
+
+
+def choice_label(format_type: str, format_id: str, formats_info: Optional[Dict[str, Any]]) -> str:
+    """Key a menu choice is counted under in UserStatsManager.quality_preferences ('720p', 'mp3-best')"""
+    if format_type == 'audio':
+        return f"mp3-{format_id}"
+    for fmt in (formats_info or {}).get('video_formats', []):
+        if fmt.get('format_id') == format_id:
+            return fmt.get('quality') or 'unknown'
+    if format_id.startswith('h') and format_id[1:].isdigit():
+        return f"{format_id[1:]}p"
+    return 'unknown'
+
+
+def menu_options(formats_info: Dict[str, Any]) -> Dict[str, Tuple[str, str]]:
+    """label -> (format_type, menu format id) for the buttons show_format_selection renders"""
+    options: Dict[str, Tuple[str, str]] = {}
+    for fmt in formats_info.get('video_formats', [])[:6]:
+        options.setdefault(fmt.get('quality') or 'unknown', ('video', fmt.get('format_id', '')))
+    options['mp3-best'] = ('audio', 'best')
+    options['mp3-medium'] = ('audio', 'medium')
+    return options
+
+
+class ChoicePredictor:
+    """Predict a user's menu choice from their own quality_preferences, falling
+    back to everyone's choices for users with little history"""
+
+    def __init__(self, user_stats, min_user_choices: int = 3, min_confidence: float = 0.5,
+                 save_delay: float = 30):
+        self.user_stats = user_stats
+        self.min_user_choices = min_user_choices
+        self.min_confidence = min_confidence
+        self.save_delay = save_delay
+        self._global_counts: Optional[Counter] = None
+        self._save_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def global_counts(self) -> Counter:
+        # Built on first prediction rather than at startup, when user stats may still be loading
+        if self._global_counts is None:
+            self._global_counts = Counter()
+            for stats in self.user_stats.stats.values():
+                self._global_counts.update(stats.get('quality_preferences', {}))
+        return self._global_counts
+
+    def record(self, user_id: int, label: str) -> None:
+        """Count a menu click as a preference; clicks are saved in batches off the event loop"""
+        self.user_stats.record_quality_preference(str(user_id), label)
+        self.global_counts[label] += 1
+        if self._save_handle is None:
+            self._save_handle = asyncio.get_running_loop().call_later(self.save_delay, self._save)
+
+    def _save(self) -> None:
+        self._save_handle = None
+        asyncio.get_running_loop().run_in_executor(None, self.user_stats.save_if_dirty)
+
+    async def flush(self) -> None:
+        """Save pending preferences now; called on shutdown"""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        await asyncio.get_running_loop().run_in_executor(None, self.user_stats.save_if_dirty)
+
+    def predict(self, user_id: int, formats_info: Dict[str, Any]) -> Optional[Tuple[str, str, float]]:
+        """(format_type, menu format id, confidence) of the most likely choice, or None if unsure"""
+        options = menu_options(formats_info)
+        user_prefs = self.user_stats.stats.get(str(user_id), {}).get('quality_preferences', {})
+        counts = {label: user_prefs.get(label, 0) for label in options}
+        if sum(counts.values()) < self.min_user_choices:
+            counts = {label: self.global_counts.get(label, 0) for label in options}
+        total = sum(counts.values())
+        if not total:
+            return None
+        best = max(counts, key=counts.get)
+        confidence = counts[best] / total
+        if confidence < self.min_confidence:
+            return None
+        return (*options[best], confidence)
+
+
+class _Prefetch:
+    def __init__(self, url: str, format_type: str, choice: str, format_id: str, work_dir: str):
+        self.url = url
+        self.format_type = format_type
+        self.choice = choice  # format id on the menu button
+        self.format_id = format_id  # resolved id actually downloaded
+        self.work_dir = work_dir
+        self.cancel = threading.Event()
+        self.started = False
+        self.claimed = False
+        self.task: Optional[asyncio.Task] = None
+        self.expiry: Optional[asyncio.Handle] = None
+
+
+class Prefetcher:
+    """Start downloading the predicted format while the menu is open.
+
+    At most one prefetch per chat and ``max_active`` overall. A prefetch only
+    starts when the scheduler has a free slot for the user, holds that slot
+    like any other job and gets a reduced bandwidth weight. Picking the same
+    format hands the (possibly still running) download to the real job;
+    picking anything else, cancelling or opening a new menu aborts it.
+    """
+
+    def __init__(self, downloader, scheduler, predictor: ChoicePredictor, work_root: str,
+                 max_active: int = 1, weight: float = 0.25, ttl: float = 600):
+        self.downloader = downloader
+        self.scheduler = scheduler
+        self.predictor = predictor
+        self.work_root = work_root
+        self.max_active = max_active
+        self.weight = weight
+        self.ttl = ttl
+        self._entries: Dict[int, _Prefetch] = {}
+        self._ids = itertools.count(1)
+
+    def start_for_menu(self, chat_id: int, user_id: int, url: str, formats_info: Dict[str, Any]) -> None:
+        self.cancel(chat_id)
+        prediction = self.predictor.predict(user_id, formats_info)
+        if prediction is None:
+            return
+        format_type, choice, confidence = prediction
+        active = sum(1 for entry in self._entries.values() if entry.task and not entry.task.done())
+        if active >= self.max_active or self.scheduler.would_wait(user_id):
+            metrics.inc('prefetch_skipped_total')
+            return
+
+        format_id = resolve_quick_format(choice, formats_info) if format_type == 'video' else choice
+        work_dir = os.path.join(self.work_root, f"prefetch-{chat_id}-{next(self._ids)}")
+        entry = _Prefetch(url, format_type, choice, format_id, work_dir)
+        cost = estimate_job_bytes(formats_info, format_type, format_id)
+        entry.task = asyncio.ensure_future(self._run(entry, user_id, cost))
+        entry.task.add_done_callback(lambda _: self._finished(chat_id, entry))
+        self._entries[chat_id] = entry
+        metrics.inc('prefetch_started_total')
+        logger.info(f"Prefetching {format_type} {choice} for chat {chat_id} (confidence {confidence:.2f})")
+
+    async def _run(self, entry: _Prefetch, user_id: int, cost: int) -> Optional[str]:
+        async with self.scheduler.slot(cost, user_id, label=f"prefetch:{entry.url}"):
+            if entry.cancel.is_set():
+                return None
+            entry.started = True
+            if entry.format_type == 'audio':
+                return await self.downloader.download_audio(entry.url, entry.work_dir, entry.format_id,
+                                                            cancel=entry.cancel, weight=self.weight)
+            return await self.downloader.download_video_format(entry.url, entry.work_dir, entry.format_id,
+                                                               cancel=entry.cancel, weight=self.weight)
+
+    def _finished(self, chat_id: int, entry: _Prefetch) -> None:
+        if entry.claimed:
+            return
+        if entry.cancel.is_set():
+            self._discard(chat_id, entry)
+        else:
+            # Keep the file for a late click, then drop it
+            entry.expiry = asyncio.get_running_loop().call_later(self.ttl, self._discard, chat_id, entry)
+
+    def _discard(self, chat_id: int, entry: _Prefetch) -> None:
+        if self._entries.get(chat_id) is entry:
+            del self._entries[chat_id]
+        if entry.expiry:
+            entry.expiry.cancel()
+        shutil.rmtree(entry.work_dir, ignore_errors=True)
+
+    def cancel(self, chat_id: int) -> None:
+        entry = self._entries.get(chat_id)
+        if entry is None:
+            return
+        entry.cancel.set()
+        if entry.task.done():
+            self._discard(chat_id, entry)
+        elif not entry.started:
+            # Still waiting for a scheduler slot
+            entry.task.cancel()
+        metrics.inc('prefetch_cancelled_total')
+
+    def match(self, chat_id: int, url: str, format_type: str, choice: str) -> Optional[str]:
+        """Format id the prefetch for this menu choice is downloading, cancelling any other prefetch"""
+        entry = self._entries.get(chat_id)
+        if entry is None:
+            return None
+        if (entry.url, entry.format_type, entry.choice) == (url, format_type, choice) and not entry.cancel.is_set():
+            return entry.format_id
+        self.cancel(chat_id)
+        return None
+
+    async def take(self, chat_id: int, url: str, format_type: str, format_id: str, work_dir: str) -> Optional[str]:
+        """Move the prefetched file for this job into work_dir, waiting for a running prefetch to finish"""
+        entry = self._entries.get(chat_id)
+        if entry is None or (entry.url, entry.format_type, entry.format_id) != (url, format_type, format_id):
+            return None
+        if not entry.started:
+            self.cancel(chat_id)
+            return None
+        entry.claimed = True
+        try:
+            path = await asyncio.shield(entry.task)
+        except (asyncio.CancelledError, Exception):
+            path = None
+        dest = None
+        if path and os.path.exists(path):
+            os.makedirs(work_dir, exist_ok=True)
+            dest = os.path.join(work_dir, os.path.basename(path))
+            os.replace(path, dest)
+            metrics.inc('prefetch_hits_total')
+        self._discard(chat_id, entry)
+        return dest
@@ -0,0 +1,151 @@
+"""
+Download job scheduler: shortest-job-first with aging
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MIB = 1024 * 1024
+
+# Used when neither filesize nor duration is known
+DEFAULT_JOB_BYTES = 50 * MIB
+
+# Rough bitrates (bits/s) for estimating size from duration
+AUDIO_BITRATES = {'best': 192_000, 'medium': 128_000}
+VIDEO_BITRATES_BY_HEIGHT = [(2160, 20_000_000), (1440, 10_000_000), (1080, 5_000_000),
+                            (720, 2_500_000), (480, 1_200_000), (360, 700_000), (0, 400_000)]
+
+
+def _video_bitrate(quality: Optional[str]) -> int:
+    height = int(quality[:-1]) if quality and quality[:-1].isdigit() else 720
+    for min_height, bitrate in VIDEO_BITRATES_BY_HEIGHT:
+        if height >= min_height:
+            return bitrate
+    return VIDEO_BITRATES_BY_HEIGHT[-1][1]
+
+
+def estimate_job_bytes(formats_info: Optional[Dict[str, Any]], format_type: str, format_id: str) -> int:
+    """Estimate download size for a job from the info get_available_formats returned"""
+    if not formats_info:
+        return DEFAULT_JOB_BYTES
+    duration = formats_info.get('duration') or 0
+
+    if format_type == 'audio':
+        if duration:
+            return int(duration * AUDIO_BITRATES.get(format_id, AUDIO_BITRATES['best']) / 8)
+        return DEFAULT_JOB_BYTES // 10
+
+    fmt = next((f for f in formats_info.get('video_formats', []) if f.get('format_id') == format_id), None)
+    if fmt:
+        if fmt.get('filesize'):
+            return int(fmt['filesize'])
+        if fmt.get('tbr') and duration:
+            return int(duration * fmt['tbr'] * 1000 / 8)
+    if duration:
+        return int(duration * _video_bitrate(fmt.get('quality') if fmt else None) / 8)
+    return DEFAULT_JOB_BYTES
+
+
+class _Waiter:
+    def __init__(self, cost: float, user_id: int, label: str, future: asyncio.Future):
+        self.cost = cost
+        self.user_id = user_id
+        self.label = label
+        self.future = future
+        self.enqueued = time.monotonic()
+
+
+class JobScheduler:
+    """Admit download jobs into a fixed number of slots, cheapest first.
+
+    A waiting job's priority is its estimated cost minus how long it has
+    waited times ``aging_bytes_per_second``, so large jobs move forward over
+    time and cannot starve. Each user is also limited to ``per_user`` running
+    jobs so one user's batch does not fill every slot.
+    """
+
+    def __init__(self, slots: int = 3, per_user: int = 2, aging_bytes_per_second: float = 2 * MIB):
+        self.slots = slots
+        self.per_user = per_user
+        self.aging_bytes_per_second = aging_bytes_per_second
+        self.running = 0
+        self.running_per_user: Dict[int, int] = {}
+        self.waiting: List[_Waiter] = []
+
+    def _priority(self, waiter: _Waiter, now: float) -> float:
+        return waiter.cost - self.aging_bytes_per_second * (now - waiter.enqueued)
+
+    def _can_run(self, user_id: int) -> bool:
+        return self.running_per_user.get(user_id, 0) < self.per_user
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        # A waiter cancelled before its task woke up can't take a slot
+        self.waiting = [w for w in self.waiting if not w.future.done()]
+        while self.running < self.slots:
+            candidates = [w for w in self.waiting if self._can_run(w.user_id)]
+            if not candidates:
+                break
+            best = min(candidates, key=lambda w: (self._priority(w, now), w.enqueued))
+            self.waiting.remove(best)
+            best.future.set_result(None)
+            self.running += 1
+            self.running_per_user[best.user_id] = self.running_per_user.get(best.user_id, 0) + 1
+        metrics.set_gauge('scheduler_running_jobs', self.running)
+        metrics.set_gauge('scheduler_waiting_jobs', len(self.waiting))
+
+    def would_wait(self, user_id: int) -> bool:
+        return self.running >= self.slots or bool(self.waiting) or not self._can_run(user_id)
+
+    def position(self, label: str) -> int:
+        """1-based queue position of the waiting job acquired with this label, 0 if it isn't waiting"""
+        now = time.monotonic()
+        ordered = sorted(self.waiting, key=lambda w: (self._priority(w, now), w.enqueued))
+        for index, waiter in enumerate(ordered, 1):
+            if waiter.label == label:
+                return index
+        return 0
+
+    async def acquire(self, cost: float, user_id: int, label: str = '') -> None:
+        waiter = _Waiter(cost, user_id, label, asyncio.get_running_loop().create_future())
+        self.waiting.append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Slot was granted just as we were cancelled; hand it to the next job
+                self.release(user_id)
+            else:
+                if waiter in self.waiting:
+                    self.waiting.remove(waiter)
+                self._dispatch()
+            raise
+        waited = time.monotonic() - waiter.enqueued
+        metrics.observe('scheduler_wait_seconds', waited)
+        if waited > 1:
+            logger.info(f"Job {label or '?'} ({cost / MIB:.1f} MiB) started after waiting {waited:.1f}s")
+
+    def release(self, user_id: int) -> None:
+        self.running -= 1
+        remaining = self.running_per_user.get(user_id, 1) - 1
+        if remaining > 0:
+            self.running_per_user[user_id] = remaining
+        else:
+            self.running_per_user.pop(user_id, None)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, cost: float, user_id: int, label: str = ''):
+        await self.acquire(cost, user_id, label)
+        try:
+            yield
+        finally:
+            self.release(user_id)
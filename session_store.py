@@ -0,0 +1,368 @@
+"""
+Conversation state (format menus, playlists) with TTL eviction, persisted as per-key SQLite rows
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+
+class PlaylistEntry:
+    """The four fields the playlist pages use, instead of yt-dlp's entry dict"""
+
+    __slots__ = ('index', 'title', 'duration', 'url')
+
+    def __init__(self, index: int, title: str, duration: Optional[int], url: Optional[str]):
+        self.index = index
+        self.title = title
+        self.duration = duration
+        self.url = url
+
+
+class PlaylistSession:
+    __slots__ = ('playlist_id', 'url', 'title', 'uploader', 'entries', 'expires', 'selected')
+
+    def __init__(self, playlist_id: str, url: str, title: str, uploader: Optional[str],
+                 entries: List[PlaylistEntry], expires: float):
+        self.playlist_id = playlist_id
+        self.url = url
+        self.title = title
+        self.uploader = uploader
+        self.entries = entries
+        self.expires = expires
+        self.selected = 0  # bit i set = entry with index i selected
+
+    def toggle(self, index: int) -> None:
+        self.selected ^= 1 << index
+
+    def is_selected(self, index: int) -> bool:
+        return bool(self.selected >> index & 1)
+
+    def selected_entries(self) -> List[PlaylistEntry]:
+        return [entry for entry in self.entries if self.is_selected(entry.index)]
+
+    def clear_selection(self) -> None:
+        self.selected = 0
+
+    def entry(self, index: int) -> Optional[PlaylistEntry]:
+        # Entries are numbered from 1 in order
+        if 1 <= index <= len(self.entries) and self.entries[index - 1].index == index:
+            return self.entries[index - 1]
+        return next((entry for entry in self.entries if entry.index == index), None)
+
+
+class MenuSession:
+    """The URL a user's open format menu is for, and its formats once known"""
+
+    __slots__ = ('url', 'formats', 'expires')
+
+    def __init__(self, url: str, formats: Optional[Dict[str, Any]], expires: float):
+        self.url = url
+        self.formats = formats
+        self.expires = expires
+
+
+class SessionStore:
+    """Per-user menus and per-playlist state with O(1) lookups and TTL eviction.
+
+    Both tables are OrderedDicts in expiry order (every write moves the record
+    to the end with a fresh expiry), so eviction only ever looks at the front.
+    After ``restore`` every change is queued as a per-key row write in
+    ``SQLitePersistence``, so state survives restarts without copying it all.
+    """
+
+    def __init__(self, ttl: float = 6 * 3600, max_playlists: int = 2000, max_menus: int = 10000):
+        self.ttl = ttl
+        self.max_playlists = max_playlists
+        self.max_menus = max_menus
+        self._playlists: "OrderedDict[str, PlaylistSession]" = OrderedDict()
+        self._playlist_ids: Dict[str, str] = {}  # playlist url -> id
+        self._menus: "OrderedDict[int, MenuSession]" = OrderedDict()
+        self._rows: "Optional[SQLitePersistence]" = None
+
+    def restore(self, persistence: "SQLitePersistence") -> None:
+        """Load the unexpired sessions from persistence and queue later changes to it"""
+        now = time.time()
+        for playlist_id, session, _ in persistence.load_sessions('playlist', now):
+            self._playlists[playlist_id] = session
+            self._playlist_ids[session.url] = playlist_id
+        for user_id, menu, _ in persistence.load_sessions('menu', now):
+            self._menus[int(user_id)] = menu
+        self._rows = persistence
+        self._evict(now)
+        logger.info(f"Restored {len(self._playlists)} playlists and {len(self._menus)} menus")
+
+    def _evict(self, now: float) -> None:
+        while self._playlists:
+            session = next(iter(self._playlists.values()))
+            if session.expires > now and len(self._playlists) <= self.max_playlists:
+                break
+            self._drop_playlist(session.playlist_id)
+        while self._menus:
+            user_id, menu = next(iter(self._menus.items()))
+            if menu.expires > now and len(self._menus) <= self.max_menus:
+                break
+            del self._menus[user_id]
+            if self._rows:
+                self._rows.delete('menu', str(user_id))
+
+    def _drop_playlist(self, playlist_id: str) -> None:
+        session = self._playlists.pop(playlist_id)
+        if self._playlist_ids.get(session.url) == playlist_id:
+            del self._playlist_ids[session.url]
+        if self._rows:
+            self._rows.delete('playlist', playlist_id)
+
+    def _save_menu(self, user_id: int, menu: MenuSession) -> None:
+        if self._rows:
+            self._rows.put('menu', str(user_id), menu, menu.expires)
+
+    def save_playlist(self, session: PlaylistSession) -> None:
+        """Queue a playlist's row again after changing it in place (e.g. its selection)"""
+        if self._rows and session.playlist_id in self._playlists:
+            self._rows.put('playlist', session.playlist_id, session, session.expires)
+
+    def _new_playlist_id(self) -> str:
+        while True:
+            playlist_id = secrets.token_urlsafe(6)
+            if playlist_id not in self._playlists:
+                return playlist_id
+
+    def put_playlist(self, url: str, info: Dict[str, Any]) -> PlaylistSession:
+        """Store a playlist under a fresh random id, replacing an earlier copy of the same URL"""
+        now = time.time()
+        entries = [
+            PlaylistEntry(entry.get('index', number), entry.get('title') or 'فيديو', entry.get('duration'),
+                          entry.get('url') or entry.get('webpage_url'))
+            for number, entry in enumerate(info.get('entries', []), 1)
+        ]
+        if url in self._playlist_ids:
+            self._drop_playlist(self._playlist_ids[url])
+        playlist_id = self._new_playlist_id()
+        session = PlaylistSession(playlist_id, url, info.get('title') or '', info.get('uploader'),
+                                  entries, now + self.ttl)
+        self._playlists[playlist_id] = session
+        self._playlist_ids[url] = playlist_id
+        self.save_playlist(session)
+        self._evict(now)
+        return session
+
+    def playlist(self, playlist_id: str) -> Optional[PlaylistSession]:
+        self._evict(time.time())
+        return self._playlists.get(playlist_id)
+
+    def playlist_for_url(self, url: str) -> Optional[PlaylistSession]:
+        playlist_id = self._playlist_ids.get(url)
+        return self.playlist(playlist_id) if playlist_id else None
+
+    def set_menu(self, user_id: int, url: str, formats: Optional[Dict[str, Any]] = None) -> None:
+        now = time.time()
+        self._menus.pop(user_id, None)
+        menu = self._menus[user_id] = MenuSession(url, formats, now + self.ttl)
+        self._save_menu(user_id, menu)
+        self._evict(now)
+
+    def update_menu_formats(self, user_id: int, url: str, formats: Dict[str, Any]) -> None:
+        """Swap in the full formats, unless the user has opened a menu for another URL meanwhile"""
+        menu = self._menus.get(user_id)
+        if menu is not None and menu.url == url:
+            menu.formats = formats
+            self._save_menu(user_id, menu)
+
+    def menu(self, user_id: int) -> Optional[MenuSession]:
+        self._evict(time.time())
+        return self._menus.get(user_id)
+
+    def __len__(self) -> int:
+        return len(self._playlists) + len(self._menus)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    data BLOB NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+"""
+
+
+class SQLitePersistence(BasePersistence):
+    """PTB persistence storing pickled user_data rows, plus session rows, in SQLite.
+
+    Only user_data rows whose pickled bytes changed since the last write are
+    written, so the periodic flush of idle users costs a pickle and a digest
+    comparison.
+
+    Menus, playlists and button tokens are not kept in bot_data itself: PTB
+    deep-copies bot_data on every flush, which for 10^5 tokens would block the
+    loop each interval. SessionStore and CallbackTokens instead report changed
+    and expired keys through ``put``/``delete``; the buffered changes are
+    written as one row per key, in a single transaction in an executor, when
+    PTB's periodic update calls ``update_bot_data`` (bot_data stays empty).
+    Chat data, callback data and conversations are unused and not stored.
+    """
+
+    def __init__(self, path: str, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        with self._conn:
+            # bot_data used to hold all sessions in one row
+            self._conn.execute("DELETE FROM state WHERE kind = 'bot'")
+        self._written: Dict[Tuple[str, str], bytes] = {}  # digests of the rows on disk
+        # (kind, key) -> (value, expires) to write, or None to delete
+        self._pending: Dict[Tuple[str, str], Optional[Tuple[Any, float]]] = {}
+
+    def load_sessions(self, kind: str, now: float) -> List[Tuple[str, Any, float]]:
+        """(key, value, expires) of the unexpired session rows of one kind, soonest expiry first"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE kind = ? AND expires <= ?", (kind, now))
+            rows = self._conn.execute(
+                "SELECT key, data, expires FROM sessions WHERE kind = ? ORDER BY expires", (kind,)
+            ).fetchall()
+        loaded = []
+        for key, data, expires in rows:
+            try:
+                loaded.append((key, pickle.loads(data), expires))
+            except Exception as e:
+                logger.warning(f"Dropping unreadable {kind} session {key!r}: {e}")
+        return loaded
+
+    def put(self, kind: str, key: str, value: Any, expires: float) -> None:
+        """Queue a session row for the next flush; a later put or delete of the same key replaces it"""
+        self._pending[(kind, key)] = (value, expires)
+
+    def delete(self, kind: str, key: str) -> None:
+        self._pending[(kind, key)] = None
+
+    def _write_sessions(self, rows: List[Tuple[str, str, Optional[bytes], float]]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM sessions WHERE kind = ? AND key = ?",
+                [(kind, key) for kind, key, data, _ in rows if data is None],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sessions (kind, key, data, expires) VALUES (?, ?, ?, ?)",
+                [row for row in rows if row[2] is not None],
+            )
+
+    async def flush_sessions(self) -> None:
+        """Write the queued session changes in one transaction off the event loop"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        # Pickled here, where the objects are mutated; only the SQLite work moves to the executor
+        rows = [
+            (kind, key, None, 0.0) if entry is None
+            else (kind, key, pickle.dumps(entry[0], protocol=pickle.HIGHEST_PROTOCOL), entry[1])
+            for (kind, key), entry in pending.items()
+        ]
+        await asyncio.get_running_loop().run_in_executor(None, self._write_sessions, rows)
+
+    def _load(self, kind: str) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, data FROM state WHERE kind = ?", (kind,)).fetchall()
+        loaded = {}
+        for key, data in rows:
+            try:
+                loaded[key] = pickle.loads(data)
+            except Exception as e:
+                logger.warning(f"Dropping unreadable {kind} state {key!r}: {e}")
+                continue
+            self._written[(kind, key)] = hashlib.sha1(data).digest()
+        return loaded
+
+    def _store(self, kind: str, key: str, value: Any) -> None:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = hashlib.sha1(data).digest()
+        if self._written.get((kind, key)) == digest:
+            return
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO state (kind, key, data) VALUES (?, ?, ?)", (kind, key, data))
+        self._written[(kind, key)] = digest
+
+    def _drop(self, kind: str, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM state WHERE kind = ? AND key = ?", (kind, key))
+        self._written.pop((kind, key), None)
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        return {int(key): value for key, value in self._load('user').items()}
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        self._store('user', str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        # Called on every periodic update and on shutdown: the point where session rows are written
+        await self.flush_sessions()
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._drop('user', str(user_id))
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def flush(self) -> None:
+        await self.flush_sessions()
+        with self._lock:
+            self._conn.close()
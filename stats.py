@@ -5,15 +5,34 @@ Bot Statistics Module
 import json
 import os
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
 class BotStats:
     def __init__(self, stats_file: str = "bot_stats.json"):
         self.stats_file = stats_file
-        self.stats = self.load_stats()
+        self._stats: Optional[Dict] = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def stats(self) -> Dict:
+        # Loaded on first use (or by preload at startup) so construction doesn't read the file
+        if self._stats is None:
+            self.preload()
+        return self._stats
+
+    @stats.setter
+    def stats(self, value: Dict) -> None:
+        self._stats = value
+
+    def preload(self) -> None:
+        """Read the stats file now; run from a background thread at startup"""
+        with self._load_lock:
+            if self._stats is None:
+                self._stats = self.load_stats()
     
     def load_stats(self) -> Dict:
         """Load statistics from file"""
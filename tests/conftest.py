@@ -0,0 +1,29 @@
+"""
+Shared fixtures: a controllable clock for the TTL, aging and token-bucket tests
+"""
+
+import pytest
+
+
+class Clock:
+    """Stands in for a module's ``time``: time() and monotonic() return a value the test advances"""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+    def sleep(self, seconds: float) -> None:
+        self.advance(seconds)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
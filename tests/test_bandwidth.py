@@ -0,0 +1,101 @@
+"""
+Tests for bandwidth shaping: token-bucket debt, weighted shares and unpaced admission
+"""
+
+import asyncio
+
+import pytest
+
+import bandwidth as bandwidth_module
+from bandwidth import EGRESS, INGRESS, BandwidthManager, TokenBucket
+
+
+@pytest.fixture
+def bandwidth_clock(monkeypatch, clock):
+    monkeypatch.setattr(bandwidth_module, 'time', clock)
+    return clock
+
+
+def test_bucket_allows_burst_then_charges_debt(bandwidth_clock):
+    bucket = TokenBucket(1000, burst_seconds=0.5)
+    assert bucket.reserve(500) == 0
+    assert bucket.reserve(1000) == pytest.approx(1.0)
+    # Waiting out the debt pays it off exactly
+    bandwidth_clock.advance(1.0)
+    assert bucket.reserve(0) == 0
+
+
+def test_bucket_refill_is_capped_at_burst(bandwidth_clock):
+    bucket = TokenBucket(1000, burst_seconds=0.5)
+    bandwidth_clock.advance(60)
+    assert bucket.reserve(500) == 0
+    assert bucket.reserve(100) == pytest.approx(0.1)
+
+
+def test_rate_change_settles_earlier_tokens_then_shrinks_the_burst(bandwidth_clock):
+    bucket = TokenBucket(1000, burst_seconds=1.0)
+    bucket.reserve(1500)
+    bandwidth_clock.advance(0.25)
+    bucket.set_rate(100)
+    # 250 of the 500 bytes of debt are paid at 1000 B/s, the rest at 100 B/s
+    assert bucket.reserve(0) == pytest.approx(2.5)
+    bandwidth_clock.advance(10)
+    # Idle time refills only up to the new 100-byte burst
+    assert bucket.reserve(1100) == pytest.approx(10.0)
+
+
+def test_shares_split_capacity_by_weight(bandwidth_clock):
+    manager = BandwidthManager(egress_bps=1000)
+    light = manager.open_share(EGRESS, weight=1)
+    heavy = manager.open_share(EGRESS, weight=3)
+    assert light.rate == pytest.approx(250)
+    assert heavy.rate == pytest.approx(750)
+    manager.close_share(heavy)
+    assert light.rate == pytest.approx(1000)
+
+
+def test_nearly_finished_share_is_boosted(bandwidth_clock):
+    manager = BandwidthManager(egress_bps=1000, boost_at=0.8, boost_weight=3.0)
+    finishing = manager.open_share(EGRESS)
+    other = manager.open_share(EGRESS)
+    finishing.update_progress(0.5)
+    assert finishing.rate == pytest.approx(500)
+    finishing.update_progress(0.9)
+    assert finishing.rate == pytest.approx(750)
+    assert other.rate == pytest.approx(250)
+
+
+def test_unlimited_direction_hands_out_no_shares():
+    manager = BandwidthManager(egress_bps=1000)
+    assert manager.limit(INGRESS) is None
+    with manager.share(INGRESS) as share:
+        assert share is None
+
+
+def test_progress_hook_counts_each_file_once(bandwidth_clock):
+    manager = BandwidthManager(ingress_bps=10_000)
+    with manager.share(INGRESS) as share:
+        for done in (100, 300, 300):
+            share.progress_hook({'status': 'downloading', 'filename': 'video.mp4', 'downloaded_bytes': done,
+                                 'total_bytes': 1000})
+        share.progress_hook({'status': 'downloading', 'filename': 'audio.m4a', 'downloaded_bytes': 50})
+        share.progress_hook({'status': 'finished', 'filename': 'video.mp4', 'downloaded_bytes': 1000})
+        assert share.bytes_total == 350
+        assert share.progress == pytest.approx(0.3)
+
+
+def test_progress_hook_paces_past_the_burst(bandwidth_clock):
+    manager = BandwidthManager(ingress_bps=1000)
+    with manager.share(INGRESS) as share:
+        started = bandwidth_clock.now
+        share.progress_hook({'status': 'downloading', 'filename': 'f', 'downloaded_bytes': 2500})
+        # 500 bytes of burst, the other 2000 at 1000 B/s
+        assert bandwidth_clock.now - started == pytest.approx(2.0)
+
+
+def test_admit_books_unpaced_bytes_against_the_pool(bandwidth_clock):
+    manager = BandwidthManager(egress_bps=1000)
+    asyncio.run(manager.admit(EGRESS, 2000))
+    # Paced shares now wait for the admitted upload to be paid off
+    assert manager.pools[EGRESS].bucket.reserve(0) == pytest.approx(1.5)
+    asyncio.run(BandwidthManager().admit(EGRESS, 10 ** 9))
@@ -0,0 +1,84 @@
+"""
+Tests for inline-button callback tokens: static actions, payload round-trips and expiry
+"""
+
+import pytest
+
+import callback_tokens as callback_tokens_module
+from callback_tokens import CALLBACK_DATA_MAX, TOKEN_PREFIX, CallbackTokens
+
+
+@pytest.fixture
+def tokens_clock(monkeypatch, clock):
+    monkeypatch.setattr(callback_tokens_module, 'time', clock)
+    return clock
+
+
+def test_static_action_is_its_own_callback_data(tokens_clock):
+    tokens = CallbackTokens(['help', 'cancel'])
+    assert tokens.data('help') == 'help'
+    assert tokens.resolve('help') == ('help', {})
+    assert len(tokens) == 0
+
+
+def test_action_without_payload_must_be_static(tokens_clock):
+    tokens = CallbackTokens(['help'])
+    with pytest.raises(ValueError):
+        tokens.data('download')
+
+
+def test_static_actions_are_validated():
+    with pytest.raises(ValueError):
+        CallbackTokens([TOKEN_PREFIX + 'help'])
+    with pytest.raises(ValueError):
+        CallbackTokens(['x' * (CALLBACK_DATA_MAX + 1)])
+
+
+def test_payload_round_trips_through_a_short_token(tokens_clock):
+    tokens = CallbackTokens(['help'])
+    url = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL' + 'x' * 200
+    data = tokens.data('download', url=url, format_type='video', format_id='137+140')
+    assert data.startswith(TOKEN_PREFIX)
+    assert len(data.encode()) <= CALLBACK_DATA_MAX
+    assert tokens.resolve(data) == ('download', {'url': url, 'format_type': 'video', 'format_id': '137+140'})
+
+
+def test_each_button_gets_its_own_token(tokens_clock):
+    tokens = CallbackTokens()
+    first = tokens.data('playlist_toggle', playlist_id='abc', index=1)
+    second = tokens.data('playlist_toggle', playlist_id='abc', index=2)
+    assert first != second
+    assert tokens.resolve(first)[1]['index'] == 1
+    assert tokens.resolve(second)[1]['index'] == 2
+
+
+def test_token_expires_after_ttl(tokens_clock):
+    tokens = CallbackTokens(ttl=60)
+    data = tokens.data('download', url='https://youtu.be/dQw4w9WgXcQ')
+    tokens_clock.advance(59)
+    assert tokens.resolve(data) is not None
+    tokens_clock.advance(2)
+    assert tokens.resolve(data) is None
+
+
+def test_expired_tokens_are_evicted_on_next_write(tokens_clock):
+    tokens = CallbackTokens(ttl=60)
+    tokens.data('download', url='https://youtu.be/a')
+    tokens_clock.advance(61)
+    tokens.data('download', url='https://youtu.be/b')
+    assert len(tokens) == 1
+
+
+def test_oldest_tokens_are_evicted_past_max_entries(tokens_clock):
+    tokens = CallbackTokens(max_entries=2)
+    data = [tokens.data('download', index=index) for index in range(1, 6)]
+    assert tokens.resolve(data[0]) is None
+    assert tokens.resolve(data[1]) is None
+    assert tokens.resolve(data[-1]) == ('download', {'index': 5})
+
+
+def test_unknown_callback_data_resolves_to_none(tokens_clock):
+    tokens = CallbackTokens(['help'])
+    assert tokens.resolve('download|https://example.com') is None
+    assert tokens.resolve(TOKEN_PREFIX + 'AAAAAAAA') is None
+    assert tokens.resolve('') is None
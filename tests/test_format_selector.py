@@ -0,0 +1,125 @@
+"""
+Tests for the quality-menu format ladder, run against recorded yt-dlp ``formats`` lists
+"""
+
+import json
+import os
+
+import pytest
+
+from format_selector import best_audio, build_ladder, estimated_size, quality_label
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def load_info(name):
+    with open(os.path.join(FIXTURES, f"{name}_formats.json"), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def ladder_for(name, **kwargs):
+    info = load_info(name)
+    return build_ladder(info['formats'], info['duration'], **kwargs)
+
+
+def by_quality(ladder):
+    return {option['quality']: option for option in ladder}
+
+
+def test_youtube_ladder_has_one_option_per_height_highest_first():
+    ladder = ladder_for('youtube')
+    assert [option['quality'] for option in ladder] == ['1080p', '720p', '480p', '360p', '240p', '144p']
+
+
+def test_youtube_pairs_h264_video_with_m4a_audio():
+    options = by_quality(ladder_for('youtube'))
+    assert options['1080p']['format_id'] == '137+140'
+    assert options['720p']['format_id'] == '136+140'
+    assert options['480p']['format_id'] == '135+140'
+    assert options['1080p']['ext'] == 'mp4'
+    assert options['1080p']['vcodec'].startswith('avc1')
+    assert options['1080p']['acodec'] == 'mp4a.40.2'
+
+
+def test_youtube_h264_beats_smaller_vp9_and_av1():
+    # 248 (VP9) and 399 (AV1) are smaller than 137 but stream worse inside MP4
+    option = by_quality(ladder_for('youtube'))['1080p']
+    assert option['format_id'] == '137+140'
+
+
+def test_youtube_progressive_wins_when_smaller_than_merge():
+    option = by_quality(ladder_for('youtube'))['360p']
+    assert option['format_id'] == '18'
+    assert option['acodec'] == 'mp4a.40.2'
+    assert option['filesize'] == 10711237  # filesize_approx of format 18
+
+
+def test_youtube_merged_size_and_bitrate_include_audio():
+    option = by_quality(ladder_for('youtube'))['1080p']
+    assert option['filesize'] == 66367598 + 3449168
+    assert option['tbr'] == pytest.approx(2492.6 + 129.5)
+
+
+def test_best_audio_prefers_mp4_compatible_codec_then_bitrate():
+    info = load_info('youtube')
+    assert best_audio(info['formats'])['format_id'] == '140'
+    without_aac = [f for f in info['formats'] if not (f.get('acodec') or '').startswith('mp4a')]
+    assert best_audio(without_aac)['format_id'] == '251'
+
+
+def test_storyboards_are_not_offered():
+    ladder = ladder_for('youtube')
+    assert all('sb0' not in option['format_id'] for option in ladder)
+
+
+def test_max_options_keeps_highest_heights():
+    ladder = ladder_for('youtube', max_options=2)
+    assert [option['format_id'] for option in ladder] == ['137+140', '136+140']
+
+
+def test_tiktok_progressive_only():
+    options = by_quality(ladder_for('tiktok'))
+    # Portrait videos are labelled by their width
+    assert list(options) == ['1080p', '720p', '576p']
+    assert options['1080p']['format_id'] == 'bytevc1_1080p_1493025-0'
+    assert options['1080p']['height'] == 1920
+    # H.264 wins over the smaller HEVC at the same height, then the smaller of the two H.264 files
+    assert options['576p']['format_id'] == 'h264_540p_1102399-0'
+    assert options['576p']['filesize'] == 3720521
+
+
+def test_instagram_dash_merge_sized_from_bitrate():
+    options = by_quality(ladder_for('instagram'))
+    option = options['720p']
+    assert option['format_id'] == 'dash-720245913512233v+dash-1434712417460862ad'
+    # No filesize in the manifest: (video tbr + audio tbr) kbit/s over the duration
+    assert option['filesize'] == int((1403.8 + 67.9) * 1000 / 8 * 14.9)
+    assert options['480p']['format_id'] == 'dash-1083620919507425v+dash-1434712417460862ad'
+
+
+def test_progressive_without_codec_info_is_kept_when_nothing_better():
+    info = load_info('instagram')
+    progressive = [f for f in info['formats'] if not f['format_id'].startswith('dash-')]
+    ladder = build_ladder(progressive, info['duration'])
+    assert [option['format_id'] for option in ladder] == ['2', '1']
+    assert all(option['filesize'] == 0 for option in ladder)  # size unknown
+
+
+def test_video_only_streams_without_audio_are_dropped():
+    info = load_info('youtube')
+    video_only = [f for f in info['formats'] if f.get('acodec') == 'none']
+    assert build_ladder(video_only, info['duration']) == []
+
+
+def test_quality_label_uses_short_side():
+    assert quality_label({'width': 1920, 'height': 1080}) == '1080p'
+    assert quality_label({'width': 1080, 'height': 1920}) == '1080p'
+    assert quality_label({'height': 720}) == '720p'
+
+
+def test_estimated_size_fallbacks():
+    assert estimated_size({'filesize': 1000, 'filesize_approx': 2000, 'tbr': 8}, 10) == 1000
+    assert estimated_size({'filesize_approx': 2000, 'tbr': 8}, 10) == 2000
+    assert estimated_size({'tbr': 8}, 10) == 10000
+    assert estimated_size({'tbr': 8}, None) is None
+    assert estimated_size({}, 10) is None
@@ -0,0 +1,151 @@
+"""
+Tests for the shortest-job-first download scheduler: ordering, aging, per-user limits and queue positions
+"""
+
+import asyncio
+
+import pytest
+
+import scheduler as scheduler_module
+from scheduler import MIB, JobScheduler, estimate_job_bytes
+
+
+@pytest.fixture
+def scheduler_clock(monkeypatch, clock):
+    # Only the scheduler's own module sees the fake clock; the event loop keeps the real one
+    monkeypatch.setattr(scheduler_module, 'time', clock)
+    return clock
+
+
+async def settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def start(scheduler, started, cost, user_id, label):
+    async def job():
+        await scheduler.acquire(cost, user_id, label)
+        started.append(label)
+    return asyncio.ensure_future(job())
+
+
+def test_cheapest_waiting_job_starts_first(scheduler_clock):
+    async def scenario():
+        scheduler = JobScheduler(slots=1, per_user=1, aging_bytes_per_second=2 * MIB)
+        started = []
+        start(scheduler, started, MIB, 1, 'running')
+        start(scheduler, started, 50 * MIB, 2, 'big')
+        start(scheduler, started, 5 * MIB, 3, 'small')
+        await settle()
+        assert started == ['running']
+        scheduler.release(1)
+        await settle()
+        assert started == ['running', 'small']
+        scheduler.release(3)
+        await settle()
+        assert started == ['running', 'small', 'big']
+    asyncio.run(scenario())
+
+
+def test_waiting_big_job_ages_past_new_small_one(scheduler_clock):
+    async def scenario():
+        scheduler = JobScheduler(slots=1, per_user=1, aging_bytes_per_second=2 * MIB)
+        started = []
+        start(scheduler, started, MIB, 1, 'running')
+        start(scheduler, started, 100 * MIB, 2, 'big')
+        await settle()
+        # 60s at 2 MiB/s is worth 120 MiB: the 99 MiB head start of the small job is gone
+        scheduler_clock.advance(60)
+        start(scheduler, started, MIB, 3, 'small')
+        await settle()
+        scheduler.release(1)
+        await settle()
+        assert started == ['running', 'big']
+    asyncio.run(scenario())
+
+
+def test_equal_cost_jobs_start_first_come_first_served(scheduler_clock):
+    async def scenario():
+        scheduler = JobScheduler(slots=1, per_user=3)
+        started = []
+        start(scheduler, started, MIB, 1, 'running')
+        await settle()
+        for label in ('a', 'b', 'c'):
+            start(scheduler, started, 10 * MIB, 1, label)
+            await settle()
+            scheduler_clock.advance(0.001)
+        for _ in range(3):
+            scheduler.release(1)
+            await settle()
+        assert started == ['running', 'a', 'b', 'c']
+    asyncio.run(scenario())
+
+
+def test_per_user_limit_leaves_slots_to_other_users(scheduler_clock):
+    async def scenario():
+        scheduler = JobScheduler(slots=3, per_user=2)
+        started = []
+        for label in ('a1', 'a2', 'a3'):
+            start(scheduler, started, MIB, 1, label)
+        await settle()
+        assert started == ['a1', 'a2']
+        assert scheduler.would_wait(1)
+        # The third slot is free, so another user's larger job runs right away
+        start(scheduler, started, 500 * MIB, 2, 'b1')
+        await settle()
+        assert started == ['a1', 'a2', 'b1']
+        assert scheduler.running_per_user == {1: 2, 2: 1}
+        scheduler.release(2)
+        await settle()
+        # A free slot still doesn't go to a user at their limit
+        assert started == ['a1', 'a2', 'b1']
+        scheduler.release(1)
+        await settle()
+        assert started == ['a1', 'a2', 'b1', 'a3']
+    asyncio.run(scenario())
+
+
+def test_position_is_looked_up_by_job_label(scheduler_clock):
+    async def scenario():
+        scheduler = JobScheduler(slots=1, per_user=3)
+        started = []
+        start(scheduler, started, MIB, 1, 'running')
+        start(scheduler, started, 20 * MIB, 2, 'first')
+        start(scheduler, started, 10 * MIB, 2, 'second')
+        await settle()
+        assert scheduler.position('second') == 1
+        assert scheduler.position('first') == 2
+        assert scheduler.position('running') == 0
+        assert scheduler.position('unknown') == 0
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue(scheduler_clock):
+    async def scenario():
+        scheduler = JobScheduler(slots=1, per_user=2)
+        started = []
+        start(scheduler, started, MIB, 1, 'running')
+        cancelled = start(scheduler, started, MIB, 2, 'cancelled')
+        start(scheduler, started, 50 * MIB, 3, 'next')
+        await settle()
+        cancelled.cancel()
+        await settle()
+        assert [waiter.label for waiter in scheduler.waiting] == ['next']
+        scheduler.release(1)
+        await settle()
+        assert started == ['running', 'next']
+        assert scheduler.running == 1
+    asyncio.run(scenario())
+
+
+def test_estimate_job_bytes_prefers_filesize_then_bitrate():
+    formats_info = {
+        'duration': 100,
+        'video_formats': [
+            {'format_id': '137+140', 'quality': '1080p', 'filesize': 70_000_000},
+            {'format_id': '18', 'quality': '360p', 'tbr': 800},
+        ],
+    }
+    assert estimate_job_bytes(formats_info, 'video', '137+140') == 70_000_000
+    assert estimate_job_bytes(formats_info, 'video', '18') == 100 * 800 * 1000 // 8
+    assert estimate_job_bytes(formats_info, 'audio', 'best') == 100 * 192_000 // 8
@@ -0,0 +1,97 @@
+"""
+Tests for the in-memory session store: menu and playlist TTLs, size caps and playlist selection
+"""
+
+import pytest
+
+import session_store as session_store_module
+from session_store import SessionStore
+
+PLAYLIST_URL = 'https://youtube.com/playlist?list=PL123'
+
+
+def playlist_info(count=3):
+    return {
+        'title': 'Playlist',
+        'uploader': 'Channel',
+        'entries': [{'title': f"Video {n}", 'duration': 60 * n, 'url': f"https://youtube.com/watch?v=video{n:05d}"}
+                    for n in range(1, count + 1)],
+    }
+
+
+@pytest.fixture
+def store_clock(monkeypatch, clock):
+    monkeypatch.setattr(session_store_module, 'time', clock)
+    return clock
+
+
+def test_menu_expires_after_ttl(store_clock):
+    store = SessionStore(ttl=60)
+    store.set_menu(1, 'https://youtu.be/a', {'title': 'A'})
+    store_clock.advance(59)
+    assert store.menu(1).formats == {'title': 'A'}
+    store_clock.advance(2)
+    assert store.menu(1) is None
+    assert len(store) == 0
+
+
+def test_new_menu_replaces_and_refreshes_the_old_one(store_clock):
+    store = SessionStore(ttl=60)
+    store.set_menu(1, 'https://youtu.be/a')
+    store_clock.advance(50)
+    store.set_menu(1, 'https://youtu.be/b')
+    store_clock.advance(50)
+    assert store.menu(1).url == 'https://youtu.be/b'
+
+
+def test_full_formats_only_update_the_matching_menu(store_clock):
+    store = SessionStore()
+    store.set_menu(1, 'https://youtu.be/a', {'partial': True})
+    store.update_menu_formats(1, 'https://youtu.be/a', {'title': 'full'})
+    assert store.menu(1).formats == {'title': 'full'}
+    store.set_menu(1, 'https://youtu.be/b', {'partial': True})
+    store.update_menu_formats(1, 'https://youtu.be/a', {'title': 'stale'})
+    assert store.menu(1).formats == {'partial': True}
+
+
+def test_oldest_menus_are_evicted_past_max_menus(store_clock):
+    store = SessionStore(max_menus=2)
+    for user_id in (1, 2, 3):
+        store.set_menu(user_id, f"https://youtu.be/{user_id}")
+        store_clock.advance(1)
+    assert store.menu(1) is None
+    assert store.menu(2) is not None and store.menu(3) is not None
+
+
+def test_playlist_expires_after_ttl(store_clock):
+    store = SessionStore(ttl=60)
+    session = store.put_playlist(PLAYLIST_URL, playlist_info())
+    assert store.playlist(session.playlist_id) is session
+    assert store.playlist_for_url(PLAYLIST_URL) is session
+    store_clock.advance(61)
+    assert store.playlist(session.playlist_id) is None
+    assert store.playlist_for_url(PLAYLIST_URL) is None
+
+
+def test_same_playlist_url_replaces_the_earlier_copy(store_clock):
+    store = SessionStore()
+    first = store.put_playlist(PLAYLIST_URL, playlist_info(2))
+    second = store.put_playlist(PLAYLIST_URL, playlist_info(3))
+    assert first.playlist_id != second.playlist_id
+    assert store.playlist(first.playlist_id) is None
+    assert store.playlist_for_url(PLAYLIST_URL) is second
+    assert len(second.entries) == 3
+
+
+def test_playlist_selection(store_clock):
+    store = SessionStore()
+    session = store.put_playlist(PLAYLIST_URL, playlist_info(3))
+    session.toggle(1)
+    session.toggle(3)
+    assert [entry.index for entry in session.selected_entries()] == [1, 3]
+    session.toggle(1)
+    assert not session.is_selected(1)
+    session.clear_selection()
+    assert session.selected_entries() == []
+    assert session.entry(2).title == 'Video 2'
+    assert session.entry(4) is None
@@ -0,0 +1,70 @@
+"""
+Tests for offline URL canonicalization and the platform host trie
+"""
+
+import pytest
+
+from url_canon import HostTrie, canonicalize, detect_platform, is_short_link
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    'https://m.youtube.com/watch?v=dQw4w9WgXcQ&t=10s&feature=share',
+    'https://youtu.be/dQw4w9WgXcQ?si=abcdef',
+    'https://youtube.com/shorts/dQw4w9WgXcQ',
+    'https://www.youtube.com/embed/dQw4w9WgXcQ',
+    'https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ',
+    'http://music.youtube.com/watch?feature=share&v=dQw4w9WgXcQ#t=5',
+])
+def test_youtube_variants_share_one_canonical_url(url):
+    assert canonicalize(url) == 'https://youtube.com/watch?v=dQw4w9WgXcQ'
+
+
+def test_youtube_keeps_playlist_id_in_fixed_order():
+    assert (canonicalize('https://www.youtube.com/watch?list=PL1&index=3&v=dQw4w9WgXcQ&v=other')
+            == 'https://youtube.com/watch?v=dQw4w9WgXcQ&list=PL1')
+
+
+def test_known_platform_drops_every_query_parameter():
+    assert (canonicalize('https://www.instagram.com/reel/Cabc123/?igsh=xyz&utm_source=ig')
+            == 'https://instagram.com/reel/Cabc123')
+    assert (canonicalize('https://www.tiktok.com/@user/video/7300000000000000000?is_from_webapp=1')
+            == 'https://tiktok.com/@user/video/7300000000000000000')
+
+
+def test_x_com_becomes_twitter_com():
+    assert canonicalize('https://x.com/user/status/123?s=20') == 'https://twitter.com/user/status/123'
+
+
+def test_unknown_platform_only_loses_tracking_parameters():
+    assert (canonicalize('https://example.com/video/?id=5&utm_source=x&fbclid=abc#top')
+            == 'https://example.com/video?id=5')
+
+
+def test_text_without_host_is_returned_stripped():
+    assert canonicalize('  not a url ') == 'not a url'
+
+
+def test_detect_platform_matches_subdomains_only_on_label_boundaries():
+    assert detect_platform('https://vm.tiktok.com/ZMabc/') == 'tiktok'
+    assert detect_platform('https://fb.watch/abc/') == 'facebook'
+    assert detect_platform('https://notyoutube.com/watch?v=x') == 'unknown'
+    assert detect_platform('https://youtube.com.evil.example/watch') == 'unknown'
+
+
+def test_short_links():
+    assert is_short_link('https://vm.tiktok.com/ZMabc/')
+    assert is_short_link('https://t.co/abc')
+    assert not is_short_link('https://www.tiktok.com/@user/video/1')
+
+
+def test_host_trie_returns_longest_registered_suffix():
+    trie = HostTrie()
+    trie.insert('example.com', 'site')
+    trie.insert('video.example.com', 'video')
+    assert trie.lookup('example.com') == 'site'
+    assert trie.lookup('www.example.com') == 'site'
+    assert trie.lookup('cdn.video.example.com') == 'video'
+    assert trie.lookup('VIDEO.Example.com.') == 'video'
+    assert trie.lookup('com') is None
+    assert trie.lookup('example.org') is None
@@ -0,0 +1,60 @@
+"""
+Tests for single-pass URL classification: platform, video vs playlist/channel, and ids
+"""
+
+import pytest
+
+from url_classifier import CHANNEL, PLAYLIST, VIDEO, classify_url, looks_like_url
+
+
+@pytest.mark.parametrize('url, platform, video_id', [
+    ('https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'youtube', 'dQw4w9WgXcQ'),
+    ('https://youtu.be/dQw4w9WgXcQ?si=abc', 'youtube', 'dQw4w9WgXcQ'),
+    ('https://youtube.com/shorts/dQw4w9WgXcQ', 'youtube', 'dQw4w9WgXcQ'),
+    ('https://www.tiktok.com/@user/video/7300000000000000000', 'tiktok', '7300000000000000000'),
+    ('https://www.instagram.com/reel/Cabc123/', 'instagram', 'Cabc123'),
+    ('https://www.facebook.com/watch/?v=1234567890', 'facebook', '1234567890'),
+    ('https://x.com/user/status/1700000000000000000', 'twitter', '1700000000000000000'),
+])
+def test_single_videos(url, platform, video_id):
+    result = classify_url(url)
+    assert result.valid
+    assert (result.platform, result.kind, result.video_id) == (platform, VIDEO, video_id)
+
+
+@pytest.mark.parametrize('url, collection_id', [
+    ('https://www.youtube.com/playlist?list=PLabc123', 'PLabc123'),
+    ('https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PLabc123', 'PLabc123'),
+])
+def test_youtube_playlists(url, collection_id):
+    result = classify_url(url)
+    assert (result.kind, result.collection_id) == (PLAYLIST, collection_id)
+
+
+@pytest.mark.parametrize('url, platform, collection_id', [
+    ('https://www.youtube.com/@channel', 'youtube', 'channel'),
+    ('https://www.youtube.com/@channel/videos', 'youtube', 'channel'),
+    ('https://www.youtube.com/channel/UC123', 'youtube', 'UC123'),
+    ('https://www.tiktok.com/@user', 'tiktok', 'user'),
+])
+def test_channels(url, platform, collection_id):
+    result = classify_url(url)
+    assert (result.platform, result.kind, result.collection_id) == (platform, CHANNEL, collection_id)
+
+
+def test_unsupported_host_is_valid_without_platform():
+    result = classify_url('https://example.com/video/1')
+    assert result.valid
+    assert result.platform is None
+
+
+def test_text_without_scheme_is_invalid():
+    assert not classify_url('youtube.com/watch?v=dQw4w9WgXcQ').valid
+    assert not classify_url('hello there').valid
+
+
+def test_looks_like_url():
+    assert looks_like_url('check https://youtu.be/x')
+    assert looks_like_url('www.example.org')
+    assert not looks_like_url('hello there')
+    assert not looks_like_url('')
@@ -0,0 +1,197 @@
+"""
+Lightweight per-request tracing with nested spans
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from config import TRACE_FILE, TRACE_MAX_TRACES
+
+logger = logging.getLogger(__name__)
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    def __init__(self, trace_id: str, name: str, parent_id: Optional[str] = None,
+                 start: Optional[float] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start if start is not None else time.time()
+        self.end: Optional[float] = None
+        self.attributes = attributes or {}
+
+    @property
+    def duration(self) -> float:
+        end = self.end if self.end is not None else time.time()
+        return max(0.0, end - self.start)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'end': round(self.end, 6) if self.end is not None else None,
+            'duration_ms': round(self.duration * 1000, 3),
+            'attributes': self.attributes,
+        }
+
+
+class Tracer:
+    def __init__(self, output_path: Optional[str] = None, max_traces: int = 200):
+        self.output_path = output_path
+        self.max_traces = max_traces
+        self._traces: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._output = None
+
+    def new_trace_id(self) -> str:
+        """Create a new trace id for a job"""
+        return uuid.uuid4().hex[:12]
+
+    def current_span(self) -> Optional[Span]:
+        """Return the span active in the current context, if any"""
+        return _current_span.get()
+
+    def current_trace_id(self) -> Optional[str]:
+        span = _current_span.get()
+        return span.trace_id if span else None
+
+    @contextmanager
+    def span(self, name: str, trace_id: Optional[str] = None, **attributes):
+        """Open a span nested under the current one.
+
+        Without an explicit trace_id and no active parent this is a no-op,
+        so library code can always emit spans without knowing whether the
+        caller is tracing.
+        """
+        parent = _current_span.get()
+        if trace_id is None and parent is None:
+            yield None
+            return
+
+        span = Span(
+            trace_id=trace_id or parent.trace_id,
+            name=name,
+            parent_id=parent.span_id if parent and (trace_id is None or trace_id == parent.trace_id) else None,
+            attributes=attributes,
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attributes['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end = time.time()
+            _current_span.reset(token)
+            self._record(span)
+
+    def record_span(self, parent: Optional[Span], name: str, start: float, end: float, **attributes) -> None:
+        """Record an already-finished span, e.g. one measured inside a worker thread"""
+        if parent is None:
+            return
+        span = Span(parent.trace_id, name, parent_id=parent.span_id, start=start, attributes=attributes)
+        span.end = end
+        self._record(span)
+
+    def _record(self, span: Span) -> None:
+        with self._lock:
+            spans = self._traces.get(span.trace_id)
+            if spans is None:
+                spans = self._traces[span.trace_id] = []
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            else:
+                self._traces.move_to_end(span.trace_id)
+            spans.append(span)
+            if self.output_path:
+                self._write(span)
+
+    def _write(self, span: Span) -> None:
+        try:
+            if self._output is None:
+                self._output = open(self.output_path, 'a', encoding='utf-8', buffering=1)
+            self._output.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + '\n')
+        except Exception as e:
+            logger.error(f"Error writing trace span: {e}")
+
+    def get_trace(self, trace_id: str) -> List[Span]:
+        with self._lock:
+            return list(self._traces.get(trace_id, []))
+
+    def recent_traces(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Summaries of the most recent traces, newest first"""
+        with self._lock:
+            items = list(self._traces.items())[-limit:]
+        summaries = []
+        for trace_id, spans in reversed(items):
+            roots = [s for s in spans if s.parent_id is None] or spans
+            start = min(s.start for s in spans)
+            end = max((s.end or s.start) for s in spans)
+            summaries.append({
+                'trace_id': trace_id,
+                'name': roots[0].name,
+                'duration': end - start,
+                'spans': len(spans),
+            })
+        return summaries
+
+    def format_trace(self, trace_id: str) -> Optional[str]:
+        """Render a trace as an indented stage breakdown"""
+        spans = self.get_trace(trace_id)
+        if not spans:
+            return None
+
+        children: Dict[Optional[str], List[Span]] = {}
+        known_ids = {s.span_id for s in spans}
+        for s in spans:
+            parent_id = s.parent_id if s.parent_id in known_ids else None
+            children.setdefault(parent_id, []).append(s)
+        for group in children.values():
+            group.sort(key=lambda s: s.start)
+
+        trace_start = min(s.start for s in spans)
+        trace_end = max((s.end or s.start) for s in spans)
+        lines = [f"🧭 Trace {trace_id} — {trace_end - trace_start:.2f}s"]
+
+        def _render(span: Span, depth: int) -> None:
+            offset = span.start - trace_start
+            line = f"{'  ' * depth}{span.name}: {span.duration:.2f}s (+{offset:.2f}s)"
+            if 'error' in span.attributes:
+                line += f" ❌ {span.attributes['error'][:60]}"
+            lines.append(line)
+            for child in children.get(span.span_id, []):
+                _render(child, depth + 1)
+
+        for root in children.get(None, []):
+            _render(root, 0)
+        return '\n'.join(lines)
+
+
+tracer = Tracer(output_path=TRACE_FILE, max_traces=TRACE_MAX_TRACES)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator wrapping an async function in a span named after it"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,162 @@
+"""
+Adaptive yt-dlp transfer tuning (fragment concurrency, chunk and buffer size)
+"""
+
+import logging
+import math
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MIB = 1024 * 1024
+
+
+def platform_key(url: str) -> str:
+    """Group URLs by site for throughput history (e.g. 'youtube.com')"""
+    try:
+        host = (urlparse(url).hostname or '').lower()
+    except ValueError:
+        return 'unknown'
+    for prefix in ('www.', 'm.', 'mobile.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    if host == 'youtu.be':
+        return 'youtube.com'
+    return host or 'unknown'
+
+
+class PlatformHistory:
+    """Exponentially weighted throughput estimates for one platform"""
+
+    def __init__(self):
+        self.connection_bps: Optional[float] = None  # throughput of a single connection/fragment stream
+        self.job_bps: Optional[float] = None
+        self.samples = 0
+
+    def update(self, job_bps: float, connections: int, alpha: float) -> None:
+        connection_bps = job_bps / max(1, connections)
+        if self.samples == 0:
+            self.job_bps = job_bps
+            self.connection_bps = connection_bps
+        else:
+            self.job_bps = alpha * job_bps + (1 - alpha) * self.job_bps
+            self.connection_bps = alpha * connection_bps + (1 - alpha) * self.connection_bps
+        self.samples += 1
+
+
+class TransferJob:
+    """One tuned download; its progress hook feeds speed back into the tuner"""
+
+    def __init__(self, platform: str, overrides: Dict[str, Any]):
+        self.platform = platform
+        self.overrides = overrides
+        self.fragments = overrides.get('concurrent_fragment_downloads', 1)
+        self.current_bps = 0.0
+        self.bytes_done = 0
+        # Seconds spent between 'downloading' hooks only, so extraction and ffmpeg time don't dilute throughput
+        self.transfer_seconds = 0.0
+        self.fragmented = False
+        self._file_bytes: Dict[str, int] = {}
+        self._last_downloading: Optional[float] = None
+
+    def progress_hook(self, d: Dict[str, Any]) -> None:
+        filename = d.get('filename') or ''
+        now = time.monotonic()
+        if self._last_downloading is not None:
+            self.transfer_seconds += now - self._last_downloading
+            self._last_downloading = None
+        if d.get('fragment_count'):
+            self.fragmented = True
+        if d.get('status') == 'downloading':
+            self.current_bps = d.get('speed') or 0.0
+            self._file_bytes[filename] = d.get('downloaded_bytes') or 0
+            self._last_downloading = now
+        elif d.get('status') == 'finished':
+            self.current_bps = 0.0
+            self._file_bytes[filename] = d.get('total_bytes') or d.get('downloaded_bytes') or 0
+        self.bytes_done = sum(self._file_bytes.values())
+
+
+class TransferTuner:
+    """Pick per-job fragment concurrency and chunk sizes.
+
+    Each platform keeps an EWMA of per-connection throughput measured from
+    finished jobs. A global fragment budget is shared between active jobs, and
+    when the link capacity is known, new jobs only get enough connections to
+    fill the remaining headroom.
+    """
+
+    def __init__(self, min_fragments: int = 1, max_fragments: int = 16,
+                 total_fragments: int = 32, link_capacity_bps: float = 0.0,
+                 default_buffersize: int = MIB, default_chunk_size: Optional[str] = None,
+                 alpha: float = 0.3):
+        self.min_fragments = min_fragments
+        self.max_fragments = max_fragments
+        self.total_fragments = total_fragments
+        self.link_capacity_bps = link_capacity_bps
+        self.default_buffersize = default_buffersize
+        self.default_chunk_size = default_chunk_size
+        self.alpha = alpha
+        self.history: Dict[str, PlatformHistory] = {}
+        self.active_jobs: Dict[int, TransferJob] = {}
+        self._lock = threading.Lock()
+
+    def global_bps(self) -> float:
+        """Current aggregate download throughput across active jobs"""
+        with self._lock:
+            return sum(job.current_bps for job in self.active_jobs.values())
+
+    def _choose(self, platform: str) -> Dict[str, Any]:
+        history = self.history.get(platform)
+        active = len(self.active_jobs)
+
+        # Fair share of the global fragment budget, counting the new job
+        share = max(self.min_fragments, self.total_fragments // (active + 1))
+        fragments = min(self.max_fragments, share)
+
+        if history and history.connection_bps:
+            if self.link_capacity_bps:
+                in_use = sum(job.current_bps for job in self.active_jobs.values())
+                headroom = max(self.link_capacity_bps - in_use, history.connection_bps)
+                fragments = min(fragments, math.ceil(headroom / history.connection_bps))
+
+        fragments = max(self.min_fragments, min(self.max_fragments, fragments))
+        overrides: Dict[str, Any] = {'concurrent_fragment_downloads': fragments}
+
+        if history and history.connection_bps:
+            # ~4s of transfer per HTTP chunk, ~250ms worth of data per read buffer
+            chunk = int(min(50 * MIB, max(MIB, history.connection_bps * 4)))
+            overrides['http_chunk_size'] = chunk
+            overrides['buffersize'] = int(min(4 * MIB, max(64 * 1024, history.connection_bps / 4)))
+        else:
+            overrides['buffersize'] = self.default_buffersize
+            if self.default_chunk_size:
+                overrides['http_chunk_size'] = self.default_chunk_size
+        return overrides
+
+    def start_job(self, url: str) -> TransferJob:
+        platform = platform_key(url)
+        with self._lock:
+            overrides = self._choose(platform)
+            job = TransferJob(platform, overrides)
+            self.active_jobs[id(job)] = job
+        metrics.set_gauge('transfer_active_jobs', len(self.active_jobs))
+        metrics.observe('transfer_fragments_chosen', job.fragments, platform=platform)
+        logger.info(f"Transfer tuning for {platform}: {overrides} ({len(self.active_jobs)} active)")
+        return job
+
+    def finish_job(self, job: TransferJob, success: bool = True) -> None:
+        elapsed = job.transfer_seconds
+        with self._lock:
+            self.active_jobs.pop(id(job), None)
+            if success and job.bytes_done and elapsed > 0.5:
+                job_bps = job.bytes_done / elapsed
+                history = self.history.setdefault(job.platform, PlatformHistory())
+                history.update(job_bps, job.fragments if job.fragmented else 1, self.alpha)
+                metrics.observe('download_throughput_bytes_per_second', job_bps, platform=job.platform)
+        metrics.set_gauge('transfer_active_jobs', len(self.active_jobs))
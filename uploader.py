@@ -1,8 +1,14 @@
 import asyncio
 import logging
-from typing import Optional
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
-from pyrogram import Client
+from bandwidth import bandwidth, EGRESS
+from metrics import metrics
+
+if TYPE_CHECKING:
+    from pyrogram import Client
 
 logger = logging.getLogger(__name__)
 
@@ -13,9 +19,12 @@ class PyrogramUploader:
         self.api_hash = api_hash
         self.bot_token = bot_token
         self.workers = workers
-        self._client: Optional[Client] = None
+        self._client: Optional['Client'] = None
+        self._start_lock = asyncio.Lock()
 
     async def start(self) -> None:
+        # Imported here: pyrogram is only needed once the first upload goes through it
+        from pyrogram import Client
         if self._client is None:
             self._client = Client(
                 name="bot_uploader",
@@ -27,9 +36,18 @@ class PyrogramUploader:
                 parse_mode=None,
             )
         if not self._client.is_connected:
+            started = time.perf_counter()
             await self._client.start()
+            metrics.observe('pyrogram_connect_seconds', time.perf_counter() - started)
             logger.info("Pyrogram client started for uploads")
 
+    async def _ensure_started(self) -> None:
+        """Connect on first use, so startup doesn't wait for the MTProto handshake"""
+        if self._client is not None and self._client.is_connected:
+            return
+        async with self._start_lock:
+            await self.start()
+
     async def stop(self) -> None:
         if self._client and self._client.is_connected:
             await self._client.stop()
@@ -37,27 +55,53 @@ class PyrogramUploader:
 
     async def send_video(self, chat_id: int, file_path: str, caption: Optional[str] = None,
                          duration: Optional[int] = None, width: Optional[int] = None,
-                         height: Optional[int] = None, parse_mode: Optional[str] = None) -> None:
-        if not self._client:
-            raise RuntimeError("Pyrogram client is not started")
-        await self._client.send_video(
+                         height: Optional[int] = None, parse_mode: Optional[str] = None,
+                         thumb: Optional[str] = None) -> None:
+        await self._ensure_started()
+        with bandwidth.share(EGRESS, label=file_path) as share:
+            await self._client.send_video(
+                chat_id=chat_id,
+                video=file_path,
+                caption=caption,
+                duration=duration,
+                width=width,
+                height=height,
+                thumb=thumb,
+                supports_streaming=True,
+                disable_notification=False,
+                progress=share.pyrogram_progress if share else None,
+            )
+
+    async def send_video_group(self, chat_id: int, parts: List[Tuple[str, Optional[str], Dict[str, Any]]]) -> None:
+        """Send up to 10 videos as one album; parts are (file path, caption, media info)"""
+        await self._ensure_started()
+        # send_media_group takes no progress callback, so each part is admitted like a Bot API upload
+        for file_path, _, _ in parts:
+            await bandwidth.admit(EGRESS, os.path.getsize(file_path))
+        from pyrogram.types import InputMediaVideo
+        await self._client.send_media_group(
             chat_id=chat_id,
-            video=file_path,
-            caption=caption,
-            duration=duration,
-            width=width,
-            height=height,
-            supports_streaming=True,
-            disable_notification=False,
+            media=[
+                InputMediaVideo(
+                    media=file_path,
+                    caption=caption or '',
+                    duration=info.get('duration') or 0,
+                    width=info.get('width') or 0,
+                    height=info.get('height') or 0,
+                    supports_streaming=True,
+                )
+                for file_path, caption, info in parts
+            ],
         )
 
     async def send_document(self, chat_id: int, file_path: str, caption: Optional[str] = None) -> None:
-        if not self._client:
-            raise RuntimeError("Pyrogram client is not started")
-        await self._client.send_document(
-            chat_id=chat_id,
-            document=file_path,
-            caption=caption,
-            disable_notification=False,
-        )
+        await self._ensure_started()
+        with bandwidth.share(EGRESS, label=file_path) as share:
+            await self._client.send_document(
+                chat_id=chat_id,
+                document=file_path,
+                caption=caption,
+                disable_notification=False,
+                progress=share.pyrogram_progress if share else None,
+            )
 
@@ -0,0 +1,232 @@
+"""
+URL canonicalization: platform detection, tracking-param stripping, short-link
+resolution and (extractor, id) mapping without a full extraction
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Registrable domains per platform (subdomains match too)
+PLATFORM_DOMAINS: Dict[str, List[str]] = {
+    'youtube': ['youtube.com', 'youtu.be', 'youtube-nocookie.com'],
+    'tiktok': ['tiktok.com'],
+    'instagram': ['instagram.com', 'instagr.am'],
+    'facebook': ['facebook.com', 'fb.watch', 'fb.com'],
+    'twitter': ['twitter.com', 'x.com', 't.co'],
+    'snapchat': ['snapchat.com'],
+}
+
+# Hosts that only redirect to the real URL
+SHORT_LINK_HOSTS = {'vm.tiktok.com', 'vt.tiktok.com', 'fb.watch', 't.co', 'instagr.am'}
+
+# Prefixes dropped from hosts so mobile/www variants compare equal
+_HOST_PREFIXES = ('www.', 'm.', 'mobile.', 'music.')
+
+# Query parameters that identify content; everything else is dropped for known platforms
+_KEPT_PARAMS: Dict[str, Tuple[str, ...]] = {
+    'youtube': ('v', 'list'),
+    'facebook': ('v', 'story_fbid', 'id'),
+}
+
+# Tracking parameters stripped from URLs of unknown platforms
+_TRACKING_PARAMS = {'fbclid', 'gclid', 'igshid', 'igsh', 'si', 'feature', 'ref', 'ref_src', 'ref_url',
+                    's', 't', 'share_id', 'is_from_webapp', 'sender_device', 'mibextid'}
+
+# yt-dlp extractors tried for each platform when mapping a URL to an id
+PLATFORM_EXTRACTORS: Dict[str, Tuple[str, ...]] = {
+    'youtube': ('Youtube',),
+    'tiktok': ('TikTok',),
+    'instagram': ('Instagram',),
+    'facebook': ('Facebook',),
+    'twitter': ('Twitter',),
+    'snapchat': ('SnapchatSpotlight',),
+}
+
+
+def _strip_host(host: str) -> str:
+    host = host.lower().rstrip('.')
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix):
+            return host[len(prefix):]
+    return host
+
+
+class HostTrie:
+    """Suffix trie over DNS labels: 'm.youtube.com' walks com -> youtube -> m and
+    returns the value of the longest registered suffix, in one pass over the host"""
+
+    def __init__(self):
+        self._root: Dict[str, Any] = {}
+
+    def insert(self, domain: str, value: str) -> None:
+        node = self._root
+        for label in reversed(domain.lower().split('.')):
+            node = node.setdefault(label, {})
+        node[''] = value
+
+    def lookup(self, host: str) -> Optional[str]:
+        node = self._root
+        found = None
+        for label in reversed(host.lower().rstrip('.').split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            found = node.get('', found)
+        return found
+
+
+_platform_trie = HostTrie()
+for _platform, _domains in PLATFORM_DOMAINS.items():
+    for _domain in _domains:
+        _platform_trie.insert(_domain, _platform)
+
+
+def platform_for_host(host: str) -> Optional[str]:
+    return _platform_trie.lookup(host)
+
+
+def detect_platform(url: str) -> str:
+    try:
+        host = urlparse(url.strip()).hostname or ''
+    except ValueError:
+        return 'unknown'
+    return platform_for_host(host) or 'unknown'
+
+
+def is_short_link(url: str) -> bool:
+    try:
+        host = (urlparse(url).hostname or '').lower()
+    except ValueError:
+        return False
+    return host in SHORT_LINK_HOSTS
+
+
+def canonicalize(url: str) -> str:
+    """Rewrite a URL to one canonical form per video without any network access.
+
+    youtu.be/X, m.youtube.com/watch?v=X&t=10 and youtube.com/shorts/X all become
+    https://youtube.com/watch?v=X; tracking parameters and fragments are dropped.
+    """
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return url.strip()
+    if not parsed.hostname:
+        return url.strip()
+
+    host = _strip_host(parsed.hostname)
+    platform = platform_for_host(host)
+    path = parsed.path or '/'
+    params = parse_qsl(parsed.query, keep_blank_values=False)
+
+    if platform == 'youtube':
+        if host == 'youtu.be' and path.strip('/'):
+            params = [('v', path.strip('/').split('/')[0])] + params
+            host, path = 'youtube.com', '/watch'
+        elif host == 'youtube-nocookie.com':
+            host = 'youtube.com'
+        for prefix in ('/shorts/', '/embed/', '/live/', '/v/'):
+            if path.startswith(prefix) and len(path) > len(prefix):
+                params = [('v', path[len(prefix):].split('/')[0])] + params
+                path = '/watch'
+                break
+    elif platform == 'twitter' and host == 'x.com':
+        host = 'twitter.com'
+
+    kept = _KEPT_PARAMS.get(platform)
+    if kept is not None:
+        # First occurrence of each identifying parameter, in a fixed order
+        first = {}
+        for k, v in params:
+            if k in kept:
+                first.setdefault(k, v)
+        params = [(k, first[k]) for k in kept if k in first]
+    elif platform:
+        params = []
+    else:
+        params = [(k, v) for k, v in params if k not in _TRACKING_PARAMS and not k.startswith('utm_')]
+
+    if len(path) > 1:
+        path = path.rstrip('/')
+    return urlunparse(('https', host, path, '', urlencode(params), ''))
+
+
+class ShortLinkResolver:
+    """Follow redirects of short links (vm.tiktok.com, fb.watch, t.co) with a TTL cache.
+
+    Concurrent requests for the same link share one HTTP request.
+    """
+
+    def __init__(self, ttl: float = 24 * 3600, max_entries: int = 10000, timeout: float = 10.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def _fetch(self, url: str) -> str:
+        with requests.get(url, allow_redirects=True, stream=True, timeout=self.timeout,
+                          headers={'User-Agent': 'Mozilla/5.0'}) as response:
+            return response.url
+
+    async def _resolve_uncached(self, url: str) -> str:
+        loop = asyncio.get_running_loop()
+        try:
+            resolved = await loop.run_in_executor(None, self._fetch, url)
+        except Exception as e:
+            logger.info(f"Could not resolve short link {url}: {e}")
+            return url
+        self._cache[url] = (resolved, time.monotonic() + self.ttl)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return resolved
+
+    async def resolve(self, url: str) -> str:
+        cached = self._cache.get(url)
+        if cached and cached[1] > time.monotonic():
+            self._cache.move_to_end(url)
+            return cached[0]
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._resolve_uncached(url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        return await asyncio.shield(task)
+
+
+resolver = ShortLinkResolver()
+
+
+async def normalize_url(url: str) -> str:
+    """Canonical URL, following short-link redirects (cached) when needed"""
+    if is_short_link(url):
+        url = await resolver.resolve(url.strip())
+    return canonicalize(url)
+
+
+@lru_cache(maxsize=4096)
+def match_id(url: str) -> Optional[Tuple[str, str]]:
+    """Map a URL to yt-dlp's (extractor key, video id) using the extractor's URL
+    pattern only, so cache lookups don't need a full extraction"""
+    platform = detect_platform(url)
+    names = PLATFORM_EXTRACTORS.get(platform)
+    if not names:
+        return None
+    from yt_dlp.extractor import get_info_extractor
+    for name in names:
+        try:
+            ie = get_info_extractor(name)
+            if ie.suitable(url):
+                return ie.ie_key(), str(ie._match_id(url))
+        except Exception:
+            continue
+    return None
@@ -0,0 +1,85 @@
+"""
+Single-pass URL classification: platform, single video vs playlist/channel, and video id
+"""
+
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from url_canon import platform_for_host
+
+VIDEO = 'video'
+PLAYLIST = 'playlist'
+CHANNEL = 'channel'
+
+# Cheap pre-filter for free text, replacing the keyword scan in handle_message
+_LOOKS_LIKE_URL_RE = re.compile(r'http|www|\.com|\.ly', re.IGNORECASE)
+
+# scheme://[userinfo@]host[:port]path[?query], split in one match instead of urlsplit + .hostname
+_URL_RE = re.compile(
+    r'^\s*(?P<scheme>[A-Za-z][A-Za-z0-9+.-]*)://(?:[^@/?#\s]*@)?(?P<host>[^:/?#\s]+)(?::\d*)?'
+    r'(?P<path>[^?#\s]*)(?:\?(?P<query>[^#\s]*))?'
+)
+
+# Collection URLs per platform, matched against path + '?' + query
+_COLLECTION_RES = {
+    'youtube': re.compile(
+        r'^/playlist\?(?:.*&)?list=(?P<playlist>[\w-]+)'
+        r'|^/watch\?(?:.*&)?list=(?P<watch_list>[\w-]+)'
+        r'|^/(?:channel/|c/|user/|@)(?P<channel>[^/?]+)/?(?:videos|shorts|streams)?/?(?:\?|$)'
+    ),
+    'tiktok': re.compile(r'^/@(?P<channel>[^/?]+)/?(?:\?|$)'),
+}
+
+# Video id per platform
+_VIDEO_ID_RES = {
+    'youtube': re.compile(r'(?:[?&]v=|^/(?:shorts|embed|live|v)/|^/)(?P<id>[\w-]{11})(?:[?&/#]|$)'),
+    'tiktok': re.compile(r'/(?:video|v)/(?P<id>\d+)'),
+    'instagram': re.compile(r'^/(?:[^/]+/)?(?:p|reels?|tv)/(?P<id>[\w-]+)'),
+    'facebook': re.compile(r'(?:[?&]v=|/videos/(?:[^/?]+/)?|/reel/)(?P<id>\d+)'),
+    'twitter': re.compile(r'/status(?:es)?/(?P<id>\d+)'),
+    'snapchat': re.compile(r'/spotlight/(?P<id>[\w-]+)'),
+}
+
+
+class UrlClass(NamedTuple):
+    valid: bool
+    platform: Optional[str]  # None when the host isn't a supported platform
+    kind: str  # VIDEO, PLAYLIST or CHANNEL
+    video_id: Optional[str]
+    collection_id: Optional[str]
+
+
+_INVALID = UrlClass(False, None, VIDEO, None, None)
+
+
+def looks_like_url(text: str) -> bool:
+    return bool(text) and _LOOKS_LIKE_URL_RE.search(text) is not None
+
+
+@lru_cache(maxsize=8192)
+def classify_url(url: str) -> UrlClass:
+    """Parse the URL once and classify it with the host trie and the platform's compiled patterns"""
+    parts = _URL_RE.match(url)
+    if parts is None:
+        return _INVALID
+    host, path, query = parts.group('host', 'path', 'query')
+
+    platform = platform_for_host(host)
+    if platform is None:
+        return UrlClass(True, None, VIDEO, None, None)
+
+    target = path + ('?' + query if query else '')
+    if host.endswith('youtu.be'):
+        target = '/watch?v=' + path.strip('/') + ('&' + query if query else '')
+
+    collection_re = _COLLECTION_RES.get(platform)
+    match = collection_re.search(target) if collection_re else None
+    if match:
+        groups = match.groupdict()
+        if groups.get('channel'):
+            return UrlClass(True, platform, CHANNEL, None, groups['channel'])
+        return UrlClass(True, platform, PLAYLIST, None, groups.get('playlist') or groups.get('watch_list'))
+
+    id_match = _VIDEO_ID_RES[platform].search(target)
+    return UrlClass(True, platform, VIDEO, id_match.group('id') if id_match else None, None)
@@ -3,13 +3,34 @@ User Statistics and Social Features Module
 """
 import json
 import os
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
 class UserStatsManager:
     def __init__(self, stats_file: str = "user_stats.json"):
         self.stats_file = stats_file
-        self.stats = self.load_stats()
+        self._stats: Optional[Dict] = None
+        self._load_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+
+    @property
+    def stats(self) -> Dict:
+        # Loaded on first use (or by preload at startup) so construction doesn't read the file
+        if self._stats is None:
+            self.preload()
+        return self._stats
+
+    @stats.setter
+    def stats(self, value: Dict) -> None:
+        self._stats = value
+
+    def preload(self) -> None:
+        """Read the stats file now; run from a background thread at startup"""
+        with self._load_lock:
+            if self._stats is None:
+                self._stats = self.load_stats()
     
     def load_stats(self) -> Dict:
         """Load user statistics from file"""
@@ -50,6 +71,26 @@ class UserStatsManager:
             }
         return self.stats[user_id]
     
+    def record_quality_preference(self, user_id: str, quality: str):
+        """Count a format menu choice in quality_preferences only; download counts, points and history are untouched"""
+        with self._save_lock:
+            prefs = self.get_user_stats(user_id)['quality_preferences']
+            prefs[quality] = prefs.get(quality, 0) + 1
+            self._dirty = True
+
+    def save_if_dirty(self):
+        """Save recorded preferences if any changed since the last save; safe to run in a worker thread"""
+        with self._save_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            payload = json.dumps(self.stats, indent=2, ensure_ascii=False)
+        try:
+            with open(self.stats_file, 'w', encoding='utf-8') as f:
+                f.write(payload)
+        except Exception as e:
+            print(f"Error saving stats: {e}")
+
     def update_download_stats(self, user_id: str, platform: str, format_type: str, quality: str = "unknown"):
         """Update user download statistics"""
         user_stats = self.get_user_stats(user_id)
@@ -9,6 +9,8 @@ import logging
 from urllib.parse import urlparse
 from typing import List
 
+from url_canon import detect_platform
+
 logger = logging.getLogger(__name__)
 
 def is_valid_url(url: str) -> bool:
@@ -74,17 +76,7 @@ def extract_urls_from_text(text: str) -> List[str]:
 
 def is_supported_platform(url: str) -> bool:
     """Check if URL is from a supported platform"""
-    supported_domains = [
-        'youtube.com', 'youtu.be', 'm.youtube.com',
-        'twitter.com', 'x.com', 'mobile.twitter.com',
-        'instagram.com', 'www.instagram.com',
-        'facebook.com', 'www.facebook.com', 'fb.watch', 'm.facebook.com',
-        'tiktok.com', 'www.tiktok.com', 'm.tiktok.com', 'vm.tiktok.com',
-        'snapchat.com', 'www.snapchat.com', 'story.snapchat.com', 'spotlight'
-    ]
-    
-    url_lower = url.lower()
-    return any(domain in url_lower for domain in supported_domains)
+    return detect_platform(url) != 'unknown'
 
 def format_duration(seconds: int) -> str:
     """Format duration in seconds to human readable format"""